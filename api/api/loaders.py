@@ -0,0 +1,171 @@
+from django.core.exceptions import ValidationError
+from django.db.models.query import ModelIterable
+from graphql import GraphQLID, get_named_type
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.utilities import value_from_ast
+from graphql_relay import from_global_id
+
+
+def _iter_root_fields(info, selection_set):
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            yield from _iter_root_fields(info, fragment.selection_set)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _iter_root_fields(info, selection.selection_set)
+
+
+def collect_node_lookups(info, node_type):
+    root_type = info.schema.get_root_type(info.operation.operation)
+    if root_type is None:
+        return []
+
+    lookups = []
+    for field_node in _iter_root_fields(info, info.operation.selection_set):
+        field = root_type.fields.get(field_node.name.value)
+        if field is None or 'id' not in field.args:
+            continue
+
+        if get_named_type(field.type).name != node_type._meta.name:
+            continue
+
+        for argument in field_node.arguments:
+            if argument.name.value != 'id':
+                continue
+
+            global_id = value_from_ast(argument.value, GraphQLID, info.variable_values)
+            if global_id is None:
+                continue
+
+            type_name, pk = from_global_id(global_id)
+            if type_name == node_type._meta.name:
+                lookups.append((pk, field_node))
+
+    return lookups
+
+
+# Batches lookups of one node type made during a single GraphQL execution,
+# root `id` arguments and forward relations alike, into one
+# permission-filtered `pk IN (...)` query.
+class NodeLoader:
+    def __init__(self, registry, node_type, info):
+        self.registry = registry
+        self.node_type = node_type
+        self.model = node_type._meta.model
+        self.missing = set()
+        self.queue = {}
+
+        for pk, field_node in collect_node_lookups(info, node_type):
+            self.enqueue(pk, [field_node])
+
+    def to_key(self, pk):
+        try:
+            return self.model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+
+    def get_cached(self, key):
+        return self.registry.instances.get((self.model._meta.concrete_model, key))
+
+    def is_loaded(self, key):
+        return key in self.missing or self.get_cached(key) is not None
+
+    def enqueue(self, pk, field_nodes=()):
+        key = self.to_key(pk)
+        if key is None or self.is_loaded(key):
+            return
+
+        self.queue.setdefault(key, []).extend(field_nodes)
+
+    def load(self, pk, info):
+        return self.load_many([pk], info)[0]
+
+    def load_many(self, pks, info):
+        keys = [self.to_key(pk) for pk in pks]
+
+        pending = {key for key in keys if key is not None and not self.is_loaded(key)}
+        if len(pending) > 0:
+            self.fetch(pending, info)
+
+        return [self.get_cached(key) if key is not None else None for key in keys]
+
+    def fetch(self, keys, info):
+        field_nodes = list(info.field_nodes)
+        for key in list(self.queue):
+            if self.is_loaded(key):
+                del self.queue[key]
+                continue
+
+            keys.add(key)
+            field_nodes.extend(self.queue.pop(key))
+
+        queryset = self.node_type.get_queryset(
+            self.model._default_manager.all(),
+            info._replace(field_nodes=field_nodes),
+        )
+        found = {instance.pk for instance in queryset.filter(pk__in=keys)}
+
+        self.missing.update(keys - found)
+
+
+# Per-request identity map of instances loaded through a node's
+# permission-filtered queryset, plus one NodeLoader per node type.
+class NodeRegistry:
+    def __init__(self):
+        self.instances = {}
+        self.peers = {}
+        self.loaders = {}
+
+        registry = self
+
+        class RegisteringModelIterable(ModelIterable):
+            def __iter__(self):
+                peers = []
+                for instance in super().__iter__():
+                    registry.add(instance, peers)
+                    yield instance
+
+        self.iterable_class = RegisteringModelIterable
+
+    # `peers` collects the instances one query loaded together, so a
+    # relation missed on one of them can be loaded for all of them.
+    def add(self, instance, peers=None):
+        key = (instance._meta.concrete_model, instance.pk)
+        self.instances[key] = instance
+        if peers is not None:
+            peers.append(instance)
+            self.peers[key] = peers
+
+    def get_peers(self, instance):
+        return self.peers.get((instance._meta.concrete_model, instance.pk), [instance])
+
+    def track(self, queryset):
+        if queryset._iterable_class is not ModelIterable:
+            return queryset
+
+        queryset = queryset._chain()
+        queryset._iterable_class = self.iterable_class
+        return queryset
+
+    def get_loader(self, node_type, info):
+        loader = self.loaders.get(node_type)
+        if loader is None:
+            loader = NodeLoader(self, node_type, info)
+            self.loaders[node_type] = loader
+
+        return loader
+
+
+def get_registry(info):
+    registry = getattr(info.context, 'node_registry', None)
+    if registry is None:
+        registry = NodeRegistry()
+        info.context.node_registry = registry
+
+    return registry
+
+
+def get_loader(info, node_type):
+    return get_registry(info).get_loader(node_type, info)
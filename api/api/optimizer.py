@@ -0,0 +1,280 @@
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from graphene import Dynamic, Field, List, NonNull
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.converter import convert_django_field, convert_field_to_djangomodel, get_django_field_description
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .loaders import get_loader, get_registry
+
+
+HEAVY_FIELD_TYPES = (
+    models.TextField,
+    models.JSONField,
+    models.BinaryField,
+    ArrayField,
+)
+
+
+def _iter_field_nodes(info, selection_set):
+    if selection_set is None:
+        return
+
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            yield from _iter_field_nodes(info, fragment.selection_set)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _iter_field_nodes(info, selection.selection_set)
+
+
+def collect_fields(info, field_nodes):
+    fields = {}
+    for field_node in field_nodes:
+        for child in _iter_field_nodes(info, field_node.selection_set):
+            fields.setdefault(child.name.value, []).append(child)
+
+    return fields
+
+
+def collect_node_fields(info):
+    fields = collect_fields(info, info.field_nodes)
+    if 'edges' not in fields:
+        return fields
+
+    edges = collect_fields(info, fields['edges'])
+    return collect_fields(info, edges.get('node', []))
+
+
+def get_nested_info(info, *path):
+    field_nodes = info.field_nodes
+    for name in path:
+        field_nodes = collect_fields(info, field_nodes).get(name, [])
+
+    return info._replace(field_nodes=field_nodes)
+
+
+def get_required_fields(selected, field_dependencies=None):
+    field_dependencies = field_dependencies or {}
+
+    required = set()
+    for name in selected:
+        name = to_snake_case(name)
+        required.update(field_dependencies.get(name, [name]))
+
+    return required
+
+
+# Dependencies may be callables taking (info, field_nodes), for fields
+# whose columns depend on the arguments they are selected with.
+def resolve_field_dependencies(info, fields, field_dependencies):
+    resolved = {}
+    for name, field_nodes in fields.items():
+        name = to_snake_case(name)
+        dependencies = field_dependencies.get(name)
+        if callable(dependencies):
+            dependencies = dependencies(info, field_nodes)
+
+        if dependencies is not None:
+            resolved[name] = dependencies
+
+    return resolved
+
+
+def get_deferred_fields(model, selected, field_dependencies=None):
+    required = get_required_fields(selected, field_dependencies)
+
+    return [
+        field.name
+        for field in model._meta.concrete_fields
+        if isinstance(field, HEAVY_FIELD_TYPES)
+        and not field.primary_key
+        and field.name not in required
+    ]
+
+
+# Single-valued relations that a selected field depends on, e.g. a field
+# resolved from a one-to-one companion row, are joined in.
+def get_related_dependencies(model, selected, field_dependencies=None):
+    related = []
+    for name in get_required_fields(selected, field_dependencies):
+        if name in selected:
+            continue
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if field.is_relation and (field.many_to_one or field.one_to_one):
+            related.append(name)
+
+    return sorted(related)
+
+
+def is_prefetched(queryset):
+    return isinstance(queryset, models.QuerySet) and queryset._result_cache is not None
+
+
+class OptimizedConnectionField(DjangoFilterConnectionField):
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        queryset = maybe_queryset(iterable)
+        is_filtered = any(args.get(k) is not None for k in filtering_args)
+        if is_prefetched(queryset) and not is_filtered:
+            return queryset
+
+        return super().resolve_queryset(
+            connection,
+            iterable,
+            info,
+            args,
+            filtering_args,
+            filterset_class,
+        )
+
+
+def _get_related_node(node_type, name):
+    field = node_type._meta.fields.get(name)
+    if isinstance(field, Dynamic):
+        field = field.get_type()
+
+    if field is None:
+        return None, None
+
+    if isinstance(field, OptimizedConnectionField):
+        return field, field.node_type
+
+    field_type = field.type
+    while isinstance(field_type, (NonNull, List)):
+        field_type = field_type.of_type
+
+    return field, field_type
+
+
+def get_prefetches(node_type, model, info, fields):
+    prefetches = []
+    for name, field_nodes in fields.items():
+        name = to_snake_case(name)
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if not model_field.is_relation:
+            continue
+
+        if any(len(field_node.arguments) > 0 for field_node in field_nodes):
+            continue
+
+        graphene_field, related_node = _get_related_node(node_type, name)
+        if not isinstance(related_node, type) or not issubclass(related_node, Optimized):
+            continue
+
+        is_to_many = model_field.one_to_many or model_field.many_to_many
+        if is_to_many and not isinstance(graphene_field, OptimizedConnectionField):
+            continue
+
+        related_model = related_node._meta.model
+        queryset = related_node.get_queryset(
+            related_model._default_manager.all(),
+            info._replace(field_nodes=field_nodes),
+        )
+        prefetches.append(Prefetch(name, queryset=queryset))
+
+    return prefetches
+
+
+class Optimized:
+    field_dependencies = {}
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        queryset = maybe_queryset(queryset)
+        if is_prefetched(queryset):
+            return queryset
+
+        queryset = maybe_queryset(super().get_queryset(queryset, info))
+
+        fields = collect_node_fields(info)
+        field_dependencies = resolve_field_dependencies(info, fields, cls.field_dependencies)
+        deferred = get_deferred_fields(
+            queryset.model,
+            fields,
+            field_dependencies,
+        )
+        if len(deferred) > 0:
+            queryset = queryset.defer(*deferred)
+
+        related = get_related_dependencies(
+            queryset.model,
+            [to_snake_case(name) for name in fields],
+            field_dependencies,
+        )
+        if len(related) > 0:
+            queryset = queryset.select_related(*related)
+
+        prefetches = get_prefetches(cls, queryset.model, info, fields)
+        if len(prefetches) > 0:
+            queryset = queryset.prefetch_related(*prefetches)
+
+        return get_registry(info).track(queryset)
+
+    @classmethod
+    def get_node(cls, info, id):
+        return get_loader(info, cls).load(id, info)
+
+
+# Forward relations to an Optimized node are resolved through its loader
+# from the FK column, instead of loading `root.<field>` and then calling
+# get_node. On a miss, the same relation of every instance loaded along
+# with `root` is queued too, so N pages cost one notebook query whether or
+# not the relation was prefetched.
+class LoadedNodeField(Field):
+    def __init__(self, node_type, model_field, **kwargs):
+        super().__init__(node_type, **kwargs)
+        self.node_type = node_type
+        self.attname = model_field.attname
+
+    def wrap_resolve(self, parent_resolver):
+        def resolve(root, info, **args):
+            pk = getattr(root, self.attname)
+            if pk is None:
+                return None
+
+            loader = get_loader(info, self.node_type)
+            key = loader.to_key(pk)
+            if key is not None and not loader.is_loaded(key):
+                for peer in get_registry(info).get_peers(root):
+                    loader.enqueue(getattr(peer, self.attname))
+
+            return loader.load(pk, info)
+
+        return resolve
+
+
+@convert_django_field.register(models.OneToOneField)
+@convert_django_field.register(models.ForeignKey)
+def convert_field_to_loaded_node(field, registry=None):
+    def dynamic_type():
+        node_type = registry.get_type_for_model(field.related_model)
+        if not node_type:
+            return
+
+        if not issubclass(node_type, Optimized):
+            return convert_field_to_djangomodel(field, registry).get_type()
+
+        return LoadedNodeField(
+            node_type,
+            field,
+            description=get_django_field_description(field),
+            required=not field.null,
+        )
+
+    return Dynamic(dynamic_type)
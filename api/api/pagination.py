@@ -0,0 +1,108 @@
+import json
+
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphene_django.utils import maybe_queryset
+from graphql_relay.utils import base64, unbase64
+
+from .optimizer import OptimizedConnectionField
+
+
+CURSOR_PREFIX = 'keyset:'
+
+
+def encode_cursor(instance, ordering):
+    values = [
+        instance._meta.get_field(name).value_to_string(instance)
+        for name in ordering
+    ]
+    return base64(CURSOR_PREFIX + json.dumps(values))
+
+
+def decode_cursor(model, cursor, ordering):
+    try:
+        raw = unbase64(cursor)
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError()
+
+        values = json.loads(raw[len(CURSOR_PREFIX):])
+        if len(values) != len(ordering):
+            raise ValueError()
+
+        return [
+            model._meta.get_field(name).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except Exception:
+        raise Exception(f'Invalid cursor: {cursor}')
+
+
+def keyset_filter(ordering, values, direction):
+    # Expands (a, b, c) > (x, y, z) as a >= x AND (a > x OR (b >= y AND ...)),
+    # which keeps the leading column usable as an index range condition.
+    name, value = ordering[-1], values[-1]
+    q = Q(**{f'{name}__{direction}': value})
+    for name, value in zip(reversed(ordering[:-1]), reversed(values[:-1])):
+        q = Q(**{f'{name}__{direction}e': value}) & (Q(**{f'{name}__{direction}': value}) | q)
+
+    return q
+
+
+class KeysetConnectionField(OptimizedConnectionField):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._base_args.pop('offset', None)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        queryset = maybe_queryset(iterable)
+        model = queryset.model
+        ordering = getattr(connection._meta.node, 'keyset_ordering', (model._meta.pk.name,))
+
+        first = args.get('first')
+        last = args.get('last')
+        if first is None and last is None:
+            first = max_limit
+
+        if args.get('after') is not None:
+            values = decode_cursor(model, args['after'], ordering)
+            queryset = queryset.filter(keyset_filter(ordering, values, 'gt'))
+
+        if args.get('before') is not None:
+            values = decode_cursor(model, args['before'], ordering)
+            queryset = queryset.filter(keyset_filter(ordering, values, 'lt'))
+
+        has_next_page = False
+        has_previous_page = False
+        if first is None and last is not None:
+            queryset = queryset.order_by(*[f'-{name}' for name in ordering])
+            nodes = list(queryset[:last + 1])
+            has_previous_page = len(nodes) > last
+            nodes = list(reversed(nodes[:last]))
+        else:
+            queryset = queryset.order_by(*ordering)
+            if first is None:
+                nodes = list(queryset)
+            else:
+                nodes = list(queryset[:first + 1])
+                has_next_page = len(nodes) > first
+                nodes = nodes[:first]
+
+            if last is not None and len(nodes) > last:
+                nodes = nodes[-last:]
+                has_previous_page = True
+
+        edges = [
+            connection.Edge(node=node, cursor=encode_cursor(node, ordering))
+            for node in nodes
+        ]
+
+        return connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if len(edges) > 0 else None,
+                end_cursor=edges[-1].cursor if len(edges) > 0 else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
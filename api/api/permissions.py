@@ -1,4 +1,5 @@
 import functools
+from django.db.models import Q
 
 
 def login_required(func):
@@ -25,3 +26,11 @@ class IsOwner:
     @login_required
     def get_queryset(cls, queryset, info):
         return queryset.filter(owner=info.context.user)
+
+
+class IsOwnerOrPublic:
+    public_lookup = 'is_public'
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        return queryset.filter(Q(owner=info.context.user) | Q(**{cls.public_lookup: True}))
@@ -125,6 +125,8 @@ DATABASES = {
     )
 }
 
+TEST_RUNNER = 'api.test_runner.TestRunner'
+
 #  GraphQL
 
 GRAPHENE = {
@@ -205,9 +207,83 @@ if not DEBUG:
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+BLOB_ROOT = os.path.join(MEDIA_ROOT, 'blobs')
+RASTER_ROOT = os.path.join(MEDIA_ROOT, 'tiles')
+EXPORT_ROOT = os.path.join(MEDIA_ROOT, 'exports')
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880
 
+
+# Elements
+
+# 'json' keeps the raw list of point dicts. 'packed' stores Element.points
+# as delta-encoded binary, rounded to 1/100th of a pixel and 1/1000th of
+# pressure, so it is lossy and opt-in.
+ELEMENT_POINTS_FORMAT = os.environ.get('ELEMENT_POINTS_FORMAT', 'json')
+
+# Opt-in: freehand strokes are simplified with Ramer-Douglas-Peucker on
+# write. The stroke as sent is kept in Element.raw_points, so point counts
+# and appends still follow it. Tolerances are in canvas pixels, keyed by
+# Tools name.
+ELEMENT_SIMPLIFY = os.environ.get('ELEMENT_SIMPLIFY', 'false') == 'true'
+ELEMENT_SIMPLIFY_TOLERANCE = {
+    'PEN': 0.35,
+    'MARKER': 0.5,
+    'HIGHLIGHTER': 0.75,
+}
+
+
+# Primary keys
+
+# Makes the uid of new rows. 'core.uuids.uuid7' keys are time-ordered
+# and carry their creation time, which anyone who sees a uid can read;
+# 'uuid.uuid4' gives the old random ones. Both kinds can share a table.
+UUID_GENERATOR = os.environ.get('UUID_GENERATOR', 'core.uuids.uuid7')
+
+
+# Page tiles
+
+# Zoom level RASTER_BASE_ZOOM renders one pixel per page unit; each level
+# above or below doubles or halves that, up to RASTER_MAX_ZOOM.
+RASTER_BASE_ZOOM = int(os.environ.get('RASTER_BASE_ZOOM', 2))
+RASTER_MAX_ZOOM = int(os.environ.get('RASTER_MAX_ZOOM', 4))
+
+# Pattern background tiles kept in memory per process, and the pixel
+# density and largest side of the PNG variant.
+PATTERN_CACHE_SIZE = int(os.environ.get('PATTERN_CACHE_SIZE', 256))
+PATTERN_PNG_SCALE = int(os.environ.get('PATTERN_PNG_SCALE', 2))
+PATTERN_PNG_MAX_SIZE = int(os.environ.get('PATTERN_PNG_MAX_SIZE', 1024))
+
+
+# Page compaction
+
+# Pages with more elements than this are marked for compaction, and
+# `manage.py compact_pages --pending` compacts them once nothing on them has
+# changed for COMPACTION_IDLE_SECONDS. 0 turns it off.
+COMPACTION_THRESHOLD = int(os.environ.get('COMPACTION_THRESHOLD', 0))
+COMPACTION_IDLE_SECONDS = int(os.environ.get('COMPACTION_IDLE_SECONDS', 300))
+# Pixel density of the bitmap erased strokes are baked into, and its
+# largest size; bigger regions are not baked.
+COMPACTION_BAKE_SCALE = int(os.environ.get('COMPACTION_BAKE_SCALE', 2))
+COMPACTION_MAX_BAKE_PIXELS = int(os.environ.get('COMPACTION_MAX_BAKE_PIXELS', 4096 * 4096))
+# Removed elements are copied into ArchivedElement instead of deleted, so
+# saves from clients still holding them can be told apart from saves of
+# elements that never existed.
+COMPACTION_ARCHIVE = os.environ.get('COMPACTION_ARCHIVE', 'true') == 'true'
+
+
+# Hidden element purge
+
+# Hidden elements untouched for this long are purged, in chunks. The purge
+# works for at most PURGE_DUTY_CYCLE of the time, sleeping in between, and
+# skips rows it would have to wait PURGE_LOCK_TIMEOUT_MS or more for.
+PURGE_RETENTION_DAYS = int(os.environ.get('PURGE_RETENTION_DAYS', 30))
+PURGE_CHUNK_SIZE = int(os.environ.get('PURGE_CHUNK_SIZE', 200))
+PURGE_DUTY_CYCLE = float(os.environ.get('PURGE_DUTY_CYCLE', 0.25))
+PURGE_LOCK_TIMEOUT_MS = int(os.environ.get('PURGE_LOCK_TIMEOUT_MS', 1000))
+PURGE_ARCHIVE = os.environ.get('PURGE_ARCHIVE', 'true') == 'true'
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from django.db.migrations.executor import MigrationExecutor
+from django.test.runner import DiscoverRunner
+
+
+# Seeds the default palettes, owned by the superadmin every deployment has.
+SEEDS_PALETTES = ('core', '0025_auto_20230106_0513')
+
+
+# Test databases start empty, so the superadmin is created right before
+# the palettes are seeded. Tests see the public default palettes like any
+# deployment does.
+class TestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        apply_migration = MigrationExecutor.apply_migration
+
+        def apply_with_superadmin(executor, state, migration, *args, **kwargs):
+            if (migration.app_label, migration.name) == SEEDS_PALETTES:
+                User = state.apps.get_model('users', 'User')
+                User.objects.using(executor.connection.alias).get_or_create(
+                    username='superadmin',
+                    defaults={'email': 'superadmin@fiary.app'},
+                )
+
+            return apply_migration(executor, state, migration, *args, **kwargs)
+
+        with mock.patch.object(MigrationExecutor, 'apply_migration', apply_with_superadmin):
+            return super().setup_databases(**kwargs)
@@ -16,15 +16,29 @@ Including another URLconf
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.views.decorators.csrf import csrf_exempt
 
 from graphene_django.views import GraphQLView
 
+from core.views import blob, page_svg, page_tile, pattern
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('blobs/<str:key>', blob, name='blob'),
+    re_path(
+        r'^tiles/(?P<uid>[0-9a-f-]{36})/(?P<version>[0-9a-f]{32})/(?P<z>\d+)/(?P<x>-?\d+)/(?P<y>-?\d+)\.png$',
+        page_tile,
+        name='page_tile'
+    ),
+    re_path(
+        r'^pages/(?P<uid>[0-9a-f-]{36})/(?P<version>[0-9a-f]{32})\.svg$',
+        page_svg,
+        name='page_svg'
+    ),
+    re_path(r'^patterns/(?P<spec>[0-9a-z._]+)\.(?P<extension>svg|png)$', pattern, name='pattern'),
 ]
 
 if settings.DEBUG:
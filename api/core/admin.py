@@ -1,11 +1,12 @@
 from django.contrib import admin
 
-from .models import Palette, PaletteCollection, PaletteSwatch, Room, Bookshelf, Notebook, Page, Element
+from .models import Palette, PaletteCollection, PaletteSwatch, Room, Bookshelf, Notebook, Page, Element, ArchivedElement
 
 admin.site.register(Room)
 admin.site.register(Bookshelf)
 admin.site.register(Page)
 admin.site.register(Element)
+admin.site.register(ArchivedElement)
 admin.site.register(PaletteCollection)
 
 
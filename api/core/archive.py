@@ -0,0 +1,36 @@
+import json
+
+from django.core import serializers
+
+from .models import ArchivedElement, Element
+
+
+CHUNK_SIZE = 500
+
+
+def _fields(element):
+    return json.loads(serializers.serialize('json', [element]))[0]['fields']
+
+
+# Deletes an owner's elements, copying them into ArchivedElement first when
+# `archive` is set. Page orders are left for the caller to update.
+def remove_elements(owner_id, uids, reason, archive=False):
+    uids = list(uids)
+    removed = 0
+    for i in range(0, len(uids), CHUNK_SIZE):
+        chunk = uids[i:i + CHUNK_SIZE]
+        if archive:
+            ArchivedElement.objects.bulk_create([
+                ArchivedElement(
+                    uid=element.uid,
+                    owner_id=element.owner_id,
+                    page_id=element.page_id,
+                    reason=reason,
+                    data=_fields(element),
+                )
+                for element in Element.objects.filter(owner_id=owner_id, uid__in=chunk)
+            ])
+
+        removed += Element.objects.filter(owner_id=owner_id, uid__in=chunk).delete()[0]
+
+    return removed
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+
+
+DATA_URL_RE = re.compile(r'^data:(?P<mime>[\w.+-]+/[\w.+-]+)?(?:;[^,;]*)*;base64,(?P<data>.*)$', re.DOTALL)
+KEY_RE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+BLOB_URL_RE = re.compile(r'/blobs/(?P<key>[0-9a-f]{64}\.[a-z0-9]+)$')
+
+EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/svg+xml': 'svg',
+}
+
+
+def is_key(value):
+    return isinstance(value, str) and KEY_RE.match(value) is not None
+
+
+def blob_path(key):
+    return Path(settings.BLOB_ROOT) / key[:2] / key
+
+
+# Readers never see a partially written file. `data` is bytes or an
+# iterable of byte chunks.
+def write_file(path, data):
+    if isinstance(data, bytes):
+        data = [data]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in data:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def store(data, mime='application/octet-stream'):
+    digest = hashlib.sha256(data).hexdigest()
+    key = f'{digest}.{EXTENSIONS.get(mime, "bin")}'
+
+    path = blob_path(key)
+    if path.exists():
+        return key
+
+    write_file(path, data)
+    return key
+
+
+def store_data_url(value):
+    match = DATA_URL_RE.match(value)
+    if match is None:
+        return None
+
+    try:
+        data = base64.b64decode(match.group('data'), validate=False)
+    except (binascii.Error, ValueError):
+        return None
+
+    return store(data, match.group('mime'))
+
+
+def to_key(value):
+    if value is None or is_key(value):
+        return value
+
+    if value.startswith('data:'):
+        return store_data_url(value) or value
+
+    match = BLOB_URL_RE.search(value.split('?', 1)[0])
+    if match is not None and blob_path(match.group('key')).exists():
+        return match.group('key')
+
+    return value
+
+
+# Inlines a stored blob, for documents that have to stand on their own
+# outside the API's origin, such as SVG exports. Missing blobs give None.
+def to_data_url(value):
+    if not is_key(value):
+        return value
+
+    try:
+        data = blob_path(value).read_bytes()
+    except FileNotFoundError:
+        return None
+
+    extension = value.rsplit('.', 1)[1]
+    mime = next((mime for mime, ext in EXTENSIONS.items() if ext == extension), 'application/octet-stream')
+    return f'data:{mime};base64,{base64.b64encode(data).decode()}'
+
+
+def to_url(value, request=None):
+    if not is_key(value):
+        return value
+
+    url = reverse('blob', args=[value])
+    if request is None:
+        return url
+
+    return request.build_absolute_uri(url)
@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+from django.db import models
+from django.db.models import F, Func, Value
+
+
+OUTER_KEYS = ('outerMinX', 'outerMinY', 'outerMaxX', 'outerMaxY')
+
+
+def box(min_x, min_y, max_x, max_y):
+    return Func(
+        Func(min_x, min_y, function='point'),
+        Func(max_x, max_y, function='point'),
+        function='box',
+    )
+
+
+# Must match the expression of the GiST index on Element for the
+# planner to use it.
+def element_box():
+    return box(F('min_x'), F('min_y'), F('max_x'), F('max_y'))
+
+
+def overlaps(min_x, min_y, max_x, max_y):
+    return Func(
+        element_box(),
+        box(*[Value(float(v)) for v in (min_x, min_y, max_x, max_y)]),
+        template='%(expressions)s',
+        arg_joiner=' && ',
+        output_field=models.BooleanField(),
+    )
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_pair(value):
+    return isinstance(value, (list, tuple)) and len(value) == 2 and all(_is_number(v) for v in value)
+
+
+def _points_bounds(points, canvas_settings):
+    if not isinstance(points, list) or len(points) == 0:
+        return None
+
+    try:
+        coords = np.array([[point['x'], point['y']] for point in points], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if not np.isfinite(coords).all():
+        return None
+
+    padding = 0
+    if isinstance(canvas_settings, dict) and _is_number(canvas_settings.get('lineSize')):
+        padding = canvas_settings['lineSize'] / 2
+
+    min_x, min_y = coords.min(axis=0) - padding
+    max_x, max_y = coords.max(axis=0) + padding
+
+    return [float(min_x), float(min_y), float(max_x), float(max_y)]
+
+
+def _parse_transform(transform):
+    if not isinstance(transform, dict):
+        return None
+
+    translate = transform.get('translate') or [0, 0]
+    scale = transform.get('scale') or [1, 1]
+    rotate = transform.get('rotate') or 0
+    if not (_is_pair(translate) and _is_pair(scale) and _is_number(rotate)):
+        return None
+
+    return list(translate), list(scale), rotate
+
+
+# CSS `translate() scale() rotate()` around the center of `bounds`.
+def transform_coords(coords, transform, bounds):
+    parsed = _parse_transform(transform)
+    if parsed is None:
+        return coords
+
+    translate, scale, rotate = parsed
+    min_x, min_y, max_x, max_y = bounds
+    center = np.array([(min_x + max_x) / 2, (min_y + max_y) / 2])
+
+    angle = math.radians(rotate)
+    rotation = np.array([
+        [math.cos(angle), -math.sin(angle)],
+        [math.sin(angle), math.cos(angle)],
+    ])
+
+    return ((coords - center) @ rotation.T) * scale + translate + center
+
+
+def _apply_transform(bounds, transform):
+    min_x, min_y, max_x, max_y = bounds
+    corners = np.array([
+        [min_x, min_y],
+        [max_x, min_y],
+        [max_x, max_y],
+        [min_x, max_y],
+    ], dtype=np.float64)
+    corners = transform_coords(corners, transform, bounds)
+
+    min_x, min_y = corners.min(axis=0)
+    max_x, max_y = corners.max(axis=0)
+
+    return [float(min_x), float(min_y), float(max_x), float(max_y)]
+
+
+# The element's extent before its transform is applied.
+def base_bounds(points, dimensions, canvas_settings):
+    if isinstance(dimensions, dict) and all(_is_number(dimensions.get(k)) for k in OUTER_KEYS):
+        return [float(dimensions[k]) for k in OUTER_KEYS]
+
+    return _points_bounds(points, canvas_settings)
+
+
+def element_bounds(points, dimensions, transform, canvas_settings, is_html_element):
+    # HTML elements are sized by the DOM, so their extent is unknown here;
+    # a null box keeps them in every viewport.
+    if is_html_element:
+        return None
+
+    bounds = base_bounds(points, dimensions, canvas_settings)
+    if bounds is None:
+        return None
+
+    return _apply_transform(bounds, transform)
@@ -50,3 +50,9 @@ class LineEndSides(models.IntegerChoices):
     NONE = 0, _('None'),
     ONE = 1, _('One'),
     BOTH = 2, _('Both'),
+
+
+class ArchiveReasons(models.IntegerChoices):
+    CLEARED = 1, _('Cleared'),
+    BAKED = 2, _('Baked'),
+    HIDDEN = 3, _('Hidden'),
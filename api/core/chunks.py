@@ -0,0 +1,15 @@
+# Walks a queryset in uid order, `chunk_size` rows at a time, so backfills
+# hold one chunk in memory and each query is a short index range scan.
+def iter_chunks(queryset, chunk_size=500):
+    last_uid = None
+    while True:
+        chunk = queryset.order_by('uid')
+        if last_uid is not None:
+            chunk = chunk.filter(uid__gt=last_uid)
+
+        chunk = list(chunk[:chunk_size])
+        if len(chunk) == 0:
+            return
+
+        last_uid = chunk[-1].uid
+        yield chunk
@@ -0,0 +1,33 @@
+import math
+
+
+def _channel(value):
+    return min(255, max(0, int(round(value))))
+
+
+# Swatch and canvas colors are `{r, g, b, a}` dicts, or lists of
+# `{color, percent}` stops for gradients. Gradients are flattened to their
+# first stop. Returns an RGBA tuple of 0-255 ints, or None when the color
+# is missing or fully transparent.
+def to_rgba(color, opacity=None):
+    if isinstance(color, list):
+        color = color[0].get('color') if len(color) > 0 and isinstance(color[0], dict) else None
+
+    if not isinstance(color, dict):
+        return None
+
+    try:
+        r, g, b = (float(color[k]) for k in ('r', 'g', 'b'))
+        a = float(color.get('a', 1))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if not all(math.isfinite(v) for v in (r, g, b, a)) or a <= 0:
+        return None
+
+    # Canvas elements are drawn with their opacity in place of the alpha,
+    # the same as `formatColor` on the client.
+    if opacity is not None:
+        a = opacity
+
+    return (_channel(r), _channel(g), _channel(b), _channel(a * 255))
@@ -0,0 +1,250 @@
+import io
+import math
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Func, IntegerField, Max
+from django.utils import timezone
+from PIL import Image
+
+from . import blobs, raster
+from .archive import remove_elements
+from .choices import ArchiveReasons, Tools
+from .models import Element, Page
+from .render import BASE_LAYER_SETTING, CLEAR, canvas_settings_of, get_composition, is_base_layer, order_elements
+
+
+# Tools the tile renderer draws closely enough for their pixels to be
+# baked in place of the elements.
+BAKED_TOOLS = [
+    Tools.PEN,
+    Tools.MARKER,
+    Tools.HIGHLIGHTER,
+    Tools.BLOB,
+    Tools.CIRCLE,
+    Tools.RECTANGLE,
+    Tools.TRIANGLE,
+    Tools.LINE,
+    Tools.ERASER,
+]
+
+Compaction = namedtuple('Compaction', ['cleared', 'baked', 'base_layer'])
+
+
+def _is_erasing(element):
+    return get_composition(element, canvas_settings_of(element)) == 'destination-out'
+
+
+# Everything up to and including the last visible CLEAR_ALL is wiped.
+def _cleared(elements):
+    for i in range(len(elements) - 1, -1, -1):
+        if elements[i].tool == Tools.CLEAR_ALL and not elements[i].is_hidden:
+            return elements[:i + 1]
+
+    return []
+
+
+def _box(element):
+    return element.min_x, element.min_y, element.max_x, element.max_y
+
+
+def _box_overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+# The elements an eraser reaches, directly or through what is baked above
+# them. The candidates are the longest run from the start of the page that
+# ends in an eraser and only holds elements the server can draw, with
+# known bounds. Walking back from its end, an element is baked when it
+# overlaps an eraser or an already baked element after it, the same test
+# as bounds.overlaps. Everything else stays an element: it touches nothing
+# that moves into the base layer, so drawing it above the base layer
+# looks the same. HTML elements are drawn by the browser above the canvas,
+# so they stay where they are.
+def _bakeable(elements):
+    end = 0
+    for i, element in enumerate(elements):
+        if element.is_hidden or element.is_html_element:
+            continue
+
+        if not (is_base_layer(element) or element.tool in BAKED_TOOLS) or element.min_x is None:
+            break
+
+        if _is_erasing(element):
+            end = i + 1
+
+    baked = []
+    boxes = []
+    for element in reversed(elements[:end]):
+        if element.is_hidden or element.is_html_element:
+            continue
+
+        box = _box(element)
+        if _is_erasing(element) or any(_box_overlaps(box, other) for other in boxes):
+            baked.append(element)
+            boxes.append(box)
+
+    return baked[::-1]
+
+
+def _drawn_bounds(elements):
+    boxes = [
+        _box(element)
+        for element in elements
+        if not element.is_hidden and not _is_erasing(element) and element.min_x is not None
+    ]
+    if len(boxes) == 0:
+        return None
+
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
+    )
+
+
+# Draws the elements, erasers included, into one bitmap cropped to what is
+# left of them. Returns the bitmap and its bounds on the page, or None when
+# nothing is left.
+def _bake(elements, bounds, scale):
+    min_x, min_y, max_x, max_y = bounds
+    size = (math.ceil((max_x - min_x) * scale), math.ceil((max_y - min_y) * scale))
+    canvas = Image.new('RGBA', size, CLEAR)
+    for element in elements:
+        if not element.is_hidden:
+            raster.draw_element(canvas, element, min_x, min_y, scale)
+
+    box = canvas.getchannel('A').getbbox()
+    if box is None:
+        return None
+
+    return canvas.crop(box), (
+        min_x + box[0] / scale,
+        min_y + box[1] / scale,
+        min_x + box[2] / scale,
+        min_y + box[3] / scale,
+    )
+
+
+# A cached image element, which the client draws straight from
+# `canvas_data_url` at its outer dimensions.
+def _base_layer(page, image, bounds):
+    output = io.BytesIO()
+    image.save(output, 'PNG', optimize=True)
+
+    min_x, min_y, max_x, max_y = bounds
+    width = max_x - min_x
+    height = max_y - min_y
+    return Element(
+        owner_id=page.owner_id,
+        page=page,
+        tool=Tools.IMAGE,
+        settings={
+            'image': None,
+            'imageRect': {'left': min_x, 'top': min_y, 'width': width, 'height': height},
+            BASE_LAYER_SETTING: True,
+        },
+        dimensions={
+            'minX': min_x,
+            'minY': min_y,
+            'maxX': max_x,
+            'maxY': max_y,
+            'width': width,
+            'height': height,
+            'outerMinX': min_x,
+            'outerMinY': min_y,
+            'outerMaxX': max_x,
+            'outerMaxY': max_y,
+            'outerWidth': width,
+            'outerHeight': height,
+            'lineLength': None,
+        },
+        canvas_settings={'composition': 'source-over', 'opacity': 1},
+        canvas_data_url=blobs.store(output.getvalue(), 'image/png'),
+        is_cached=True,
+    )
+
+
+# Removes what a page no longer shows: everything before its last
+# CLEAR_ALL, and the strokes before its last eraser, which are baked into
+# a single bitmap element at the start of the page. The page is locked
+# while this runs; clients still holding removed elements will fail to
+# save them, so it is meant for pages nobody is drawing on.
+def compact_page(page_uid, archive=None):
+    if archive is None:
+        archive = settings.COMPACTION_ARCHIVE
+
+    with transaction.atomic():
+        page = Page.objects \
+            .select_for_update() \
+            .only('uid', 'owner', 'element_order', 'needs_compaction') \
+            .get(uid=page_uid)
+
+        elements = Element.objects \
+            .filter(owner_id=page.owner_id, page=page, uid__in=page.element_order) \
+            .defer('raw_points', 'lod_points')
+        elements = order_elements(page, elements)
+
+        cleared = _cleared(elements)
+        baked = _bakeable(elements[len(cleared):])
+
+        base_layer = None
+        if len(baked) > 0:
+            scale = settings.COMPACTION_BAKE_SCALE
+            bounds = _drawn_bounds(baked)
+            if bounds is not None:
+                pixels = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) * scale * scale
+                if pixels > settings.COMPACTION_MAX_BAKE_PIXELS:
+                    baked = []
+                else:
+                    result = _bake(baked, bounds, scale)
+                    if result is not None:
+                        base_layer = _base_layer(page, *result)
+
+        if len(cleared) == 0 and len(baked) == 0:
+            if page.needs_compaction:
+                Page.objects.filter(pk=page.pk).update(needs_compaction=False)
+            return Compaction(0, 0, None)
+
+        remove_elements(page.owner_id, [element.uid for element in cleared], ArchiveReasons.CLEARED, archive)
+        remove_elements(page.owner_id, [element.uid for element in baked], ArchiveReasons.BAKED, archive)
+
+        removed = {element.uid for element in cleared + baked}
+        element_order = [uid for uid in page.element_order if uid not in removed]
+        if base_layer is not None:
+            base_layer.save()
+            element_order.insert(0, base_layer.uid)
+
+        Page.objects.filter(pk=page.pk).update(
+            element_order=element_order,
+            needs_compaction=False,
+            updated_at=timezone.now(),
+        )
+
+    return Compaction(len(cleared), len(baked), base_layer)
+
+
+# Background compaction, off unless COMPACTION_THRESHOLD is set. Saves mark
+# pages whose element order grows past the threshold, in the same
+# transaction. `compact_pages --pending`, run from cron, then compacts the
+# marked pages nothing has changed on for COMPACTION_IDLE_SECONDS.
+def mark_for_compaction(page_uids):
+    if settings.COMPACTION_THRESHOLD <= 0 or len(page_uids) == 0:
+        return
+
+    Page.objects \
+        .filter(uid__in=page_uids, needs_compaction=False) \
+        .alias(element_count=Func(F('element_order'), function='cardinality', output_field=IntegerField())) \
+        .filter(element_count__gt=settings.COMPACTION_THRESHOLD) \
+        .update(needs_compaction=True)
+
+
+def is_idle(page):
+    last_write = Element.objects \
+        .filter(owner_id=page.owner_id, page_id=page.uid) \
+        .aggregate(last_write=Max('updated_at'))['last_write']
+
+    return last_write is None or timezone.now() - last_write >= timedelta(seconds=settings.COMPACTION_IDLE_SECONDS)
@@ -0,0 +1,369 @@
+import json
+import math
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+from django.conf import settings
+from django.urls import reverse
+
+from . import blobs, colors, patterns
+from .bounds import base_bounds
+from .choices import Tools
+from .models import Element
+from .render import (
+    CLEAR,
+    LINE_TOOLS,
+    canvas_settings_of,
+    get_composition,
+    get_shapes,
+    order_elements,
+    page_version,
+    swatch_color,
+)
+
+
+# Bumped whenever the output changes, so cached exports are not reused.
+RENDERER_VERSION = 2
+
+# Space around the drawing, and the size of a page with nothing on it.
+PADDING = 16
+EMPTY_SIZE = 512
+
+# The Quill snow theme the textboxes are edited with.
+TEXT_FONT = 'Helvetica, Arial, sans-serif'
+TEXT_SIZE = 13
+TEXT_LINE_HEIGHT = 1.42
+TEXT_PADDING = (15, 12)
+
+BLEND_MODES = ['multiply', 'screen', 'overlay', 'darken', 'lighten', 'hue', 'saturation', 'color', 'luminosity']
+
+
+def get_version(page):
+    return page_version(page, f'svg:{RENDERER_VERSION}')
+
+
+def export_path(uid, version):
+    return Path(settings.EXPORT_ROOT) / str(uid) / f'{version}.svg'
+
+
+def export_url(page, request=None):
+    url = reverse('page_svg', kwargs={'uid': str(page.uid), 'version': get_version(page)})
+    if request is None:
+        return url
+
+    return request.build_absolute_uri(url)
+
+
+def _number(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def _paint(name, rgba):
+    if rgba is None:
+        return f' {name}="none"'
+
+    return (
+        f' {name}="rgb({rgba[0]},{rgba[1]},{rgba[2]})"'
+        f' {name}-opacity="{_number(rgba[3] / 255)}"'
+    )
+
+
+def _path_data(coords, closed, smooth):
+    points = [(_number(x), _number(y)) for x, y in coords]
+    if smooth and len(points) > 2:
+        # Quadratic curves through the midpoints, like `svgPathFromStroke`
+        # on the client.
+        parts = ['M', *points[0], 'Q']
+        for i, (x0, y0) in enumerate(coords):
+            x1, y1 = coords[(i + 1) % len(coords)]
+            parts.extend([*points[i], _number((x0 + x1) / 2), _number((y0 + y1) / 2)])
+        return ' '.join(parts + ['Z'])
+
+    d = 'M' + 'L'.join(f'{x} {y}' for x, y in points)
+    return d + 'Z' if closed else d
+
+
+def _signed_area(coords):
+    x, y = coords[:, 0], coords[:, 1]
+    return np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))
+
+
+def _shapes_svg(shapes, smooth, paint=None):
+    paths = []
+    for coords, fill, stroke, line_width, closed in shapes:
+        if fill == CLEAR:
+            # A clear fill punches the inside out of the previous shape. The
+            # paths are filled nonzero, so the hole winds the other way.
+            if len(paths) > 0:
+                outer = paths[-1][4]
+                if np.sign(_signed_area(coords)) == np.sign(_signed_area(outer)):
+                    coords = coords[::-1]
+                paths[-1][0].append(_path_data(coords, closed, smooth))
+            continue
+
+        d = _path_data(coords, closed, smooth)
+
+        if paint is not None:
+            fill = paint if fill is not None else None
+            stroke = paint if stroke is not None else None
+
+        paths.append(([d], fill, stroke, line_width, coords))
+
+    body = []
+    for d, fill, stroke, line_width, coords in paths:
+        attributes = _paint('fill', fill)
+        if stroke is not None and line_width > 0:
+            attributes += _paint('stroke', stroke)
+            attributes += f' stroke-width="{_number(line_width)}" stroke-linecap="round" stroke-linejoin="round"'
+
+        body.append(f'<path d="{" ".join(d)}"{attributes}/>')
+
+    return ''.join(body)
+
+
+def _css_transform(transform):
+    if not isinstance(transform, dict):
+        return ''
+
+    translate = transform.get('translate') or [0, 0]
+    scale = transform.get('scale') or [1, 1]
+    rotate = transform.get('rotate') or 0
+    try:
+        return (
+            f'translate({_number(translate[0])} {_number(translate[1])}) '
+            f'scale({_number(scale[0])} {_number(scale[1])}) '
+            f'rotate({_number(rotate)})'
+        )
+    except (TypeError, ValueError, IndexError):
+        return ''
+
+
+def _image_svg(element):
+    dimensions = element.dimensions if isinstance(element.dimensions, dict) else {}
+    bounds = base_bounds(None, dimensions, None)
+    # Inlined, so the exported file still shows its images once saved or
+    # opened away from the API.
+    href = blobs.to_data_url(element.canvas_data_url)
+    if bounds is None or not href:
+        return ''
+
+    min_x, min_y, max_x, max_y = bounds
+    center_x = (min_x + max_x) / 2
+    center_y = (min_y + max_y) / 2
+
+    transform = _css_transform(element.transform)
+    if transform:
+        # CSS transforms are around the element's center.
+        transform = (
+            f' transform="translate({_number(center_x)} {_number(center_y)}) {transform} '
+            f'translate({_number(-center_x)} {_number(-center_y)})"'
+        )
+
+    return (
+        f'<image x="{_number(min_x)}" y="{_number(min_y)}" width="{_number(max_x - min_x)}" '
+        f'height="{_number(max_y - min_y)}" preserveAspectRatio="none" href={quoteattr(href)}{transform}/>'
+    )
+
+
+def _text_lines(contents):
+    if isinstance(contents, str):
+        try:
+            contents = json.loads(contents)
+        except ValueError:
+            contents = {'ops': [{'insert': contents}]}
+
+    ops = contents.get('ops') if isinstance(contents, dict) else None
+    lines = [[]]
+    for op in ops if isinstance(ops, list) else []:
+        if not isinstance(op, dict) or not isinstance(op.get('insert'), str):
+            continue
+
+        attributes = op.get('attributes') if isinstance(op.get('attributes'), dict) else {}
+        for i, text in enumerate(op['insert'].split('\n')):
+            if i > 0:
+                lines.append([])
+            if text:
+                lines[-1].append((text, attributes))
+
+    if len(lines[-1]) == 0:
+        lines.pop()
+
+    return lines
+
+
+def _text_run(text, attributes):
+    style = ''
+    if attributes.get('bold'):
+        style += ' font-weight="bold"'
+    if attributes.get('italic'):
+        style += ' font-style="italic"'
+
+    decorations = [name for name in ('underline', 'strike') if attributes.get(name)]
+    if decorations:
+        style += ' text-decoration="' + ' '.join(
+            'line-through' if name == 'strike' else name for name in decorations
+        ) + '"'
+
+    if isinstance(attributes.get('color'), str):
+        style += f' fill={quoteattr(attributes["color"])}'
+
+    return f'<tspan{style}>{escape(text)}</tspan>'
+
+
+# Textboxes are laid out by the browser, so this is an approximation: one
+# <text> line per paragraph, with no wrapping.
+def _textbox_svg(element):
+    element_settings = element.settings if isinstance(element.settings, dict) else {}
+    lines = _text_lines(element_settings.get('textContents'))
+    if len(lines) == 0:
+        return ''
+
+    line_height = TEXT_SIZE * TEXT_LINE_HEIGHT
+    body = []
+    for i, line in enumerate(lines):
+        runs = ''.join(_text_run(text, attributes) for text, attributes in line)
+        body.append(
+            f'<tspan x="{TEXT_PADDING[0]}" y="{_number(TEXT_PADDING[1] + TEXT_SIZE + i * line_height)}">'
+            f'{runs}</tspan>'
+        )
+
+    transform = _css_transform(element.transform)
+    transform = f' transform="{transform}"' if transform else ''
+    return (
+        f'<text font-family="{TEXT_FONT}" font-size="{TEXT_SIZE}" xml:space="preserve"{transform}>'
+        f'{"".join(body)}</text>'
+    )
+
+
+def _element_svg(element):
+    if element.tool == Tools.TEXTBOX:
+        return _textbox_svg(element)
+
+    if element.is_html_element:
+        return ''
+
+    if element.tool == Tools.IMAGE:
+        return _image_svg(element)
+
+    body = _shapes_svg(get_shapes(element), element.tool in LINE_TOOLS)
+    if not body:
+        return ''
+
+    composition = get_composition(element, canvas_settings_of(element))
+    if composition in BLEND_MODES:
+        return f'<g style="mix-blend-mode:{composition}">{body}</g>'
+
+    return body
+
+
+def _is_erasing(element):
+    return (
+        not element.is_html_element
+        and get_composition(element, canvas_settings_of(element)) == 'destination-out'
+    )
+
+
+def _view_box(elements):
+    boxes = [
+        (element.min_x, element.min_y, element.max_x, element.max_y)
+        for element in elements
+        if element.min_x is not None
+    ]
+    for element in elements:
+        if element.tool == Tools.TEXTBOX and isinstance(element.transform, dict):
+            translate = element.transform.get('translate') or [0, 0]
+            if all(isinstance(v, (int, float)) and math.isfinite(v) for v in translate[:2]):
+                boxes.append((translate[0], translate[1], translate[0] + EMPTY_SIZE / 2, translate[1] + TEXT_SIZE * 2))
+
+    if len(boxes) == 0:
+        return 0, 0, EMPTY_SIZE, EMPTY_SIZE
+
+    min_x = min(box[0] for box in boxes) - PADDING
+    min_y = min(box[1] for box in boxes) - PADDING
+    max_x = max(box[2] for box in boxes) + PADDING
+    max_y = max(box[3] for box in boxes) + PADDING
+    return min_x, min_y, max_x - min_x, max_y - min_y
+
+
+def _background(page, view_box):
+    x, y, width, height = (_number(v) for v in view_box)
+    rect = f'x="{x}" y="{y}" width="{width}" height="{height}"'
+
+    paper = colors.to_rgba(swatch_color(page.paper_swatch))
+    body = f'<rect {rect}{_paint("fill", paper)}/>' if paper is not None else ''
+
+    spec = patterns.get_spec(
+        page.pattern_type,
+        page.pattern_options,
+        swatch_color(page.paper_swatch),
+        swatch_color(page.pattern_swatch),
+    )
+    if spec is not None and spec.color is not None:
+        body += f'<defs>{patterns.svg_pattern(spec, "page-pattern")}</defs>'
+        body += f'<rect {rect} fill="url(#page-pattern)"/>'
+
+    return body
+
+
+# Yields the page as SVG, in chunks. Erasers cut through everything drawn
+# before them, so each one masks a group around all earlier elements.
+def generate_svg(page):
+    elements = Element.objects \
+        .filter(owner_id=page.owner_id, page=page, is_hidden=False) \
+        .defer('raw_points', 'lod_points')
+    elements = order_elements(page, elements)
+    view_box = _view_box(elements)
+    x, y, width, height = (_number(v) for v in view_box)
+
+    yield (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="{x} {y} {width} {height}">'
+    ).encode()
+    yield _background(page, view_box).encode()
+
+    erasers = sum(1 for element in elements if _is_erasing(element))
+    yield ''.join(
+        f'<g mask="url(#erase-{i})">' for i in range(erasers, 0, -1)
+    ).encode()
+
+    erased = 0
+    for element in elements:
+        if _is_erasing(element):
+            erased += 1
+            mask = _shapes_svg(get_shapes(element), False, paint=(0, 0, 0, 255))
+            yield (
+                f'<mask id="erase-{erased}" maskUnits="userSpaceOnUse" x="{x}" y="{y}" '
+                f'width="{width}" height="{height}">'
+                f'<rect x="{x}" y="{y}" width="{width}" height="{height}" fill="white"/>'
+                f'{mask}</mask></g>'
+            ).encode()
+            continue
+
+        body = _element_svg(element)
+        if body:
+            yield body.encode()
+
+    yield b'</svg>'
+
+
+def _drop_old_versions(path):
+    for other in path.parent.glob('*.svg'):
+        if other != path:
+            other.unlink(missing_ok=True)
+
+
+# Writes the export into the cache, unless it is already there. Exports of
+# older versions of the page are removed.
+def store_svg(page, version):
+    path = export_path(page.uid, version)
+    if path.exists():
+        return path
+
+    blobs.write_file(path, generate_svg(page))
+    _drop_old_versions(path)
+    return path
+
+
+def get_svg(page):
+    return store_svg(page, get_version(page)).read_text()
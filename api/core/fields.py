@@ -0,0 +1,10 @@
+from django.db import models
+
+from . import blobs
+
+
+class BlobField(models.TextField):
+    def pre_save(self, model_instance, add):
+        value = blobs.to_key(getattr(model_instance, self.attname))
+        setattr(model_instance, self.attname, value)
+        return value
@@ -0,0 +1,349 @@
+import math
+
+import numpy as np
+
+
+# A port of `getStroke` from perfect-freehand 1.2, which the client uses to
+# turn freehand points into an outline polygon. The two passes are
+# recurrences (each point depends on the previous output), so they walk
+# the points one at a time; the caps and corners are built with NumPy.
+
+DEFAULT_PRESSURE = 0.5
+RATE_OF_PRESSURE_CHANGE = 0.275
+FIXED_PI = math.pi + 0.0001
+
+
+def _steps(start, step, end, inclusive):
+    # The same accumulated floats as the library's `t += step` loops, so
+    # the number of cap points matches.
+    values = []
+    t = start
+    while t <= end if inclusive else t < end:
+        values.append(t)
+        t += step
+    return np.array(values)
+
+
+CORNER_STEPS = _steps(0, 1 / 13, 1, True)
+START_CAP_STEPS = _steps(0, 1 / 13, 1, True)
+DOT_STEPS = _steps(1 / 13, 1 / 13, 1, True)
+END_CAP_STEPS = _steps(1 / 29, 1 / 29, 1, False)
+
+
+def _unit(x, y):
+    length = math.hypot(x, y)
+    return x / length, y / length
+
+
+def _rotate_around(point, center, angles):
+    angles = np.asarray(angles, dtype=np.float64)
+    px, py = point[0] - center[0], point[1] - center[1]
+    s, c = np.sin(angles), np.cos(angles)
+    return np.column_stack([px * c - py * s + center[0], px * s + py * c + center[1]])
+
+
+def _to_input(points):
+    pts = []
+    for point in points:
+        if isinstance(point, dict):
+            pressure = point.get('pressure', DEFAULT_PRESSURE)
+            pts.append((float(point['x']), float(point['y']), pressure))
+        else:
+            pts.append((float(point[0]), float(point[1]), point[2] if len(point) > 2 else None))
+    return pts
+
+
+def _pressure(value, default):
+    return value if isinstance(value, (int, float)) and value >= 0 else default
+
+
+# Returns (point, pressure, vector, distance, running_length) tuples.
+def get_stroke_points(points, options):
+    streamline = options.get('streamline', 0.5)
+    size = options.get('size', 16)
+    is_complete = bool(options.get('last', False))
+
+    if len(points) == 0:
+        return []
+
+    t = 0.15 + (1 - streamline) * 0.85
+    pts = _to_input(points)
+
+    # Extra points between the two help avoid "dash" lines for strokes
+    # with tapered starts and ends.
+    if len(pts) == 2:
+        (x0, y0, p0), (x1, y1, _) = pts
+        pts = [pts[0]] + [(x0 + (x1 - x0) * i / 4, y0 + (y1 - y0) * i / 4, None) for i in range(1, 5)]
+
+    if len(pts) == 1:
+        x, y, pressure = pts[0]
+        pts = [pts[0], (x + 1, y + 1, pressure)]
+
+    first = pts[0]
+    stroke_points = [[(first[0], first[1]), _pressure(first[2], 0.25), (1, 1), 0, 0]]
+
+    has_reached_minimum_length = False
+    running_length = 0
+    prev = stroke_points[0]
+    last_index = len(pts) - 1
+    for i in range(1, len(pts)):
+        x, y, pressure = pts[i]
+        if is_complete and i == last_index:
+            point = (x, y)
+        else:
+            px, py = prev[0]
+            point = (px + (x - px) * t, py + (y - py) * t)
+
+        if point == prev[0]:
+            continue
+
+        distance = math.hypot(point[0] - prev[0][0], point[1] - prev[0][1])
+        running_length += distance
+        if i < last_index and not has_reached_minimum_length:
+            if running_length < size:
+                continue
+            has_reached_minimum_length = True
+
+        vector = _unit(prev[0][0] - point[0], prev[0][1] - point[1])
+        prev = [point, _pressure(pressure, DEFAULT_PRESSURE), vector, distance, running_length]
+        stroke_points.append(prev)
+
+    stroke_points[0][2] = stroke_points[1][2] if len(stroke_points) > 1 else (0, 0)
+    return stroke_points
+
+
+def _stroke_radius(size, thinning, pressure):
+    return size * (0.5 - thinning * (0.5 - pressure))
+
+
+def _taper(value, size, total_length):
+    if value is True:
+        return max(size, total_length)
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+
+    return 0
+
+
+def _simulated_pressure(previous, distance, size):
+    sp = min(1, distance / size)
+    rp = min(1, 1 - sp)
+    return min(1, previous + (rp - previous) * (sp * RATE_OF_PRESSURE_CHANGE))
+
+
+def get_stroke_outline_points(points, options):
+    size = options.get('size', 16)
+    smoothing = options.get('smoothing', 0.5)
+    thinning = options.get('thinning', 0.5)
+    simulate_pressure = options.get('simulatePressure', True)
+    is_complete = bool(options.get('last', False))
+    start = options.get('start') if isinstance(options.get('start'), dict) else {}
+    end = options.get('end') if isinstance(options.get('end'), dict) else {}
+    cap_start = start.get('cap', True)
+    cap_end = end.get('cap', True)
+
+    if len(points) == 0 or size <= 0:
+        return np.zeros((0, 2))
+
+    total_length = points[-1][4]
+    taper_start = _taper(start.get('taper'), size, total_length)
+    taper_end = _taper(end.get('taper'), size, total_length)
+    min_distance = (size * smoothing) ** 2
+
+    left_points = []
+    right_points = []
+
+    prev_pressure = points[0][1]
+    for _, pressure, _, distance, _ in points[:10]:
+        if simulate_pressure:
+            pressure = _simulated_pressure(prev_pressure, distance, size)
+        prev_pressure = (prev_pressure + pressure) / 2
+
+    radius = _stroke_radius(size, thinning, points[-1][1])
+    first_radius = None
+    prev_vector = points[0][2]
+    pl = pr = tl = tr = points[0][0]
+    is_prev_point_sharp_corner = False
+
+    for i, (point, pressure, vector, distance, running_length) in enumerate(points):
+        is_last = i == len(points) - 1
+        # Points near the end are dropped, to avoid a messy end cap.
+        if not is_last and total_length - running_length < 3:
+            continue
+
+        if thinning:
+            if simulate_pressure:
+                pressure = _simulated_pressure(prev_pressure, distance, size)
+            radius = _stroke_radius(size, thinning, pressure)
+        else:
+            radius = size / 2
+
+        if first_radius is None:
+            first_radius = radius
+
+        ts = 1
+        if running_length < taper_start:
+            ts = running_length / taper_start
+            ts = ts * (2 - ts)
+
+        te = 1
+        if total_length - running_length < taper_end:
+            te = (total_length - running_length) / taper_end - 1
+            te = te * te * te + 1
+
+        radius = max(0.01, radius * min(ts, te))
+
+        next_vector = points[i + 1][2] if not is_last else vector
+        next_dpr = vector[0] * next_vector[0] + vector[1] * next_vector[1] if not is_last else 1.0
+        prev_dpr = vector[0] * prev_vector[0] + vector[1] * prev_vector[1]
+
+        is_point_sharp_corner = prev_dpr < 0 and not is_prev_point_sharp_corner
+        is_next_point_sharp_corner = next_dpr < 0
+
+        if is_point_sharp_corner or is_next_point_sharp_corner:
+            # Sharp corners are drawn as a half circle on both sides.
+            offset = (prev_vector[1] * radius, -prev_vector[0] * radius)
+            left = _rotate_around((point[0] - offset[0], point[1] - offset[1]), point, FIXED_PI * CORNER_STEPS)
+            right = _rotate_around((point[0] + offset[0], point[1] + offset[1]), point, -FIXED_PI * CORNER_STEPS)
+            left_points.extend(map(tuple, left))
+            right_points.extend(map(tuple, right))
+            pl = tl = left_points[-1]
+            pr = tr = right_points[-1]
+            if is_next_point_sharp_corner:
+                is_prev_point_sharp_corner = True
+            continue
+
+        is_prev_point_sharp_corner = False
+
+        if is_last:
+            offset = (vector[1] * radius, -vector[0] * radius)
+            left_points.append((point[0] - offset[0], point[1] - offset[1]))
+            right_points.append((point[0] + offset[0], point[1] + offset[1]))
+            continue
+
+        lx = next_vector[0] + (vector[0] - next_vector[0]) * next_dpr
+        ly = next_vector[1] + (vector[1] - next_vector[1]) * next_dpr
+        offset = (ly * radius, -lx * radius)
+
+        tl = (point[0] - offset[0], point[1] - offset[1])
+        if i <= 1 or (pl[0] - tl[0]) ** 2 + (pl[1] - tl[1]) ** 2 > min_distance:
+            left_points.append(tl)
+            pl = tl
+
+        tr = (point[0] + offset[0], point[1] + offset[1])
+        if i <= 1 or (pr[0] - tr[0]) ** 2 + (pr[1] - tr[1]) ** 2 > min_distance:
+            right_points.append(tr)
+            pr = tr
+
+        prev_pressure = pressure
+        prev_vector = vector
+
+    first_point = points[0][0]
+    if len(points) > 1:
+        last_point = points[-1][0]
+    else:
+        last_point = (first_point[0] + 1, first_point[1] + 1)
+
+    start_cap = np.zeros((0, 2))
+    end_cap = np.zeros((0, 2))
+
+    if len(points) == 1:
+        if not (taper_start or taper_end) or is_complete:
+            # A dot.
+            ux, uy = _unit(first_point[1] - last_point[1], -(first_point[0] - last_point[0]))
+            r = -(first_radius or radius)
+            start = (first_point[0] + ux * r, first_point[1] + uy * r)
+            return _rotate_around(start, first_point, FIXED_PI * 2 * DOT_STEPS)
+    else:
+        # A tapered start already narrows to a point through the radius, so
+        # it gets no cap.
+        if not taper_start:
+            if cap_start:
+                start_cap = _rotate_around(right_points[0], first_point, FIXED_PI * START_CAP_STEPS)
+            else:
+                cx = left_points[0][0] - right_points[0][0]
+                cy = left_points[0][1] - right_points[0][1]
+                start_cap = np.array([
+                    (first_point[0] - cx * 0.5, first_point[1] - cy * 0.5),
+                    (first_point[0] - cx * 0.51, first_point[1] - cy * 0.51),
+                    (first_point[0] + cx * 0.51, first_point[1] + cy * 0.51),
+                    (first_point[0] + cx * 0.5, first_point[1] + cy * 0.5),
+                ])
+
+        last_vector = points[-1][2]
+        direction = (-last_vector[1], last_vector[0])
+        if taper_end:
+            end_cap = np.array([last_point])
+        elif cap_end:
+            start = (last_point[0] + direction[0] * radius, last_point[1] + direction[1] * radius)
+            end_cap = _rotate_around(start, last_point, FIXED_PI * 3 * END_CAP_STEPS)
+        else:
+            end_cap = np.array([
+                (last_point[0] + direction[0] * radius, last_point[1] + direction[1] * radius),
+                (last_point[0] + direction[0] * radius * 0.99, last_point[1] + direction[1] * radius * 0.99),
+                (last_point[0] - direction[0] * radius * 0.99, last_point[1] - direction[1] * radius * 0.99),
+                (last_point[0] - direction[0] * radius, last_point[1] - direction[1] * radius),
+            ])
+
+    parts = [
+        np.array(left_points).reshape(-1, 2),
+        end_cap.reshape(-1, 2),
+        np.array(right_points[::-1]).reshape(-1, 2),
+        start_cap.reshape(-1, 2),
+    ]
+    return np.concatenate(parts)
+
+
+def get_stroke(points, options):
+    return get_stroke_outline_points(get_stroke_points(points, options), options)
+
+
+def _number(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+# `svgPathFromStroke` from the client: quadratic curves through the
+# midpoints of the outline.
+def svg_path(outline):
+    if len(outline) == 0:
+        return ''
+
+    midpoints = (outline + np.roll(outline, -1, axis=0)) / 2
+    values = np.column_stack([outline, midpoints]).ravel()
+    return ' '.join(['M', _number(outline[0][0]), _number(outline[0][1]), 'Q', *map(_number, values), 'Z'])
+
+
+# The two outlines a freehand element is drawn with: a wider `stroke`
+# filled with the stroke color, and the `path` inside it filled with the
+# fill color. Returns None when the element has no freehand options.
+def outline_points(points, canvas_settings):
+    options = canvas_settings.get('freehandOptions') if isinstance(canvas_settings, dict) else None
+    if not isinstance(options, dict) or not isinstance(points, list) or len(points) == 0:
+        return None
+
+    size = options.get('size', 16)
+    thinning = options.get('thinning', 0.5)
+    if not isinstance(size, (int, float)) or not isinstance(thinning, (int, float)):
+        return None
+
+    try:
+        stroke = get_stroke(points, {**options, 'size': size * 1.5, 'thinning': thinning / 1.5})
+        path = get_stroke(points, options)
+    except (KeyError, IndexError, TypeError, ValueError, ZeroDivisionError):
+        return None
+
+    if not (np.isfinite(stroke).all() and np.isfinite(path).all()):
+        return None
+
+    return stroke, path
+
+
+# The outlines as SVG path data, as stored on the element.
+def element_outlines(points, canvas_settings):
+    outlines = outline_points(points, canvas_settings)
+    if outlines is None:
+        return None
+
+    stroke, path = outlines
+    return svg_path(stroke), svg_path(path)
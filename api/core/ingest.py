@@ -0,0 +1,214 @@
+import json
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import blobs
+from .compaction import mark_for_compaction
+from .choices import ArchiveReasons
+from .models import ArchivedElement, Element, Page
+from .ordering import append_to_order
+
+
+ELEMENT_FIELDS = [
+    'tool',
+    'points',
+    'settings',
+    'transform',
+    'dimensions',
+    'canvas_settings',
+    'canvas_data_url',
+    'is_cached',
+    'is_html_element',
+    'is_hidden',
+]
+
+
+# Saves new and changed elements. Returns the saved elements in input
+# order; updates of elements removed by compaction are skipped.
+def batch_save_elements(owner, input_elements):
+    now = timezone.now()
+
+    to_create = []
+    to_update = []
+    for input_element in input_elements:
+        if input_element.get('uid', None) is not None:
+            to_update.append(input_element)
+        else:
+            to_create.append(input_element)
+
+    with transaction.atomic():
+        page_uids = {input_element['page_uid'] for input_element in to_create}
+        pages = Page.objects.filter(owner=owner).only('uid').in_bulk(page_uids)
+
+        update_uids = [input_element['uid'] for input_element in to_update]
+        # Scoped to the owner, which also lets Postgres prune the element
+        # partitions.
+        existing = Element.objects.filter(owner=owner).in_bulk(update_uids)
+        compacted = _compacted_uids(owner, [uid for uid in map(_to_uuid, update_uids) if uid not in existing])
+
+        elements_by_input = {}
+        update_fields = set()
+        updated = []
+        for input_element in to_update:
+            element = existing.get(_to_uuid(input_element['uid']))
+            if element is None:
+                if _to_uuid(input_element['uid']) in compacted:
+                    continue
+
+                raise Element.DoesNotExist(
+                    f'Element {input_element["uid"]} does not exist.'
+                )
+
+            changed = set()
+            for k, v in input_element.items():
+                if k not in ELEMENT_FIELDS:
+                    continue
+
+                setattr(element, k, v)
+                changed.add(k)
+
+            update_fields.update(changed)
+            update_fields.update(element.update_derived(changed))
+
+            if 'canvas_data_url' in input_element:
+                element.canvas_data_url = blobs.to_key(element.canvas_data_url)
+
+            element.updated_at = now
+            elements_by_input[id(input_element)] = element
+            updated.append(element)
+
+        created = []
+        for input_element in to_create:
+            page = pages.get(_to_uuid(input_element['page_uid']))
+            if page is None:
+                raise Page.DoesNotExist(
+                    f'Page {input_element["page_uid"]} does not exist.'
+                )
+
+            element = Element(owner=owner, page=page)
+            for k, v in input_element.items():
+                if k not in ELEMENT_FIELDS:
+                    continue
+
+                setattr(element, k, v)
+
+            element.update_derived(['points'])
+            created.append(element)
+            elements_by_input[id(input_element)] = element
+
+        if len(updated) > 0:
+            Element.objects.bulk_update(
+                updated,
+                fields=sorted(update_fields) + ['updated_at'],
+                batch_size=500,
+            )
+
+        if len(created) > 0:
+            Element.objects.bulk_create(created, batch_size=500)
+
+            new_uids_by_page = {}
+            for element in created:
+                new_uids_by_page.setdefault(element.page_id, []).append(element.uid)
+
+            for page_uid, new_uids in new_uids_by_page.items():
+                append_to_order(Page, page_uid, 'element_order', *new_uids)
+
+            mark_for_compaction(list(new_uids_by_page))
+
+    return [
+        elements_by_input[id(input_element)]
+        for input_element in input_elements
+        if id(input_element) in elements_by_input
+    ]
+
+
+def _to_uuid(value):
+    return Element._meta.pk.to_python(value)
+
+
+# Elements removed by page compaction. Clients that still hold them may
+# keep saving them until they reload the page; those saves are dropped.
+def _compacted_uids(owner, uids):
+    if len(uids) == 0:
+        return set()
+
+    return set(
+        ArchivedElement.objects
+        .filter(owner=owner, uid__in=uids, reason__in=[ArchiveReasons.CLEARED, ArchiveReasons.BAKED])
+        .values_list('uid', flat=True)
+    )
+
+
+# Columns derived from `points`. Appends clear them instead of rebuilding
+# them over the whole stroke every time.
+STALE_FIELDS = ['raw_points', 'packed_points', 'lod_points', *Element.BOUNDS_FIELDS, *Element.OUTLINE_FIELDS]
+
+APPEND_SQL = (
+    f'UPDATE {Element._meta.db_table} SET points = points || %s::jsonb, is_stale = true, updated_at = %s, '
+    + ', '.join(f'{field} = NULL' for field in STALE_FIELDS) + ' '
+    'WHERE uid = %s AND owner_id = %s '
+    "AND raw_points IS NULL AND packed_points IS NULL AND jsonb_typeof(points) = 'array' "
+    'AND jsonb_array_length(points) = %s '
+    'RETURNING jsonb_array_length(points)'
+)
+
+
+# Appends a chunk of points to a stroke being drawn. `from_index` is the
+# number of points the client believes are stored, counted before any
+# simplification, so a retried or out-of-order chunk is rejected instead of
+# applied twice.
+#
+# The chunk is appended in SQL without reading the stroke back, so each
+# append costs the same however long the stroke is. Bounds, outlines, LOD
+# levels, simplification and packing are cleared and the element is marked
+# stale; readers fall back to the full points until they are rebuilt, once,
+# by `is_final` or the element's next save. A stroke stored packed or
+# simplified is unpacked once first. Returns the new point count.
+def append_element_points(owner, uid, points, from_index, is_final=False):
+    if not isinstance(points, list) or len(points) == 0:
+        raise Exception('points must be a non-empty list.')
+
+    for point in points:
+        try:
+            float(point['x'])
+            float(point['y'])
+        except (KeyError, TypeError, ValueError):
+            raise Exception('Each point needs numeric x and y values.')
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(APPEND_SQL, [json.dumps(points), timezone.now(), str(uid), owner.pk, from_index])
+            row = cursor.fetchone()
+
+        if row is not None:
+            count = row[0]
+        else:
+            count = _append_unpacked(owner, uid, points, from_index)
+
+        if is_final:
+            Element.objects.get(uid=uid, owner=owner).save()
+
+    return count
+
+
+def _append_unpacked(owner, uid, points, from_index):
+    element = Element.objects \
+        .select_for_update() \
+        .only('uid', 'owner_id', 'points', 'raw_points', 'packed_points') \
+        .get(uid=uid, owner=owner)
+
+    current = element.get_raw_points() or []
+    if len(current) != from_index:
+        raise Exception(
+            f'Conflict: element {uid} has {len(current)} points, not {from_index}.'
+        )
+
+    Element.objects.filter(uid=uid, owner=owner).update(
+        points=current + points,
+        is_stale=True,
+        updated_at=timezone.now(),
+        **{field: None for field in STALE_FIELDS},
+    )
+
+    return len(current) + len(points)
@@ -0,0 +1,95 @@
+import struct
+
+import numpy as np
+
+from . import points as points_codec
+from .simplify import segment_distances
+
+
+MAGIC = b'FL'
+VERSION = 1
+
+# Level n keeps 1 / DENSITIES[n - 1] of a stroke's points.
+DENSITIES = (4, 16)
+
+HEADER = struct.Struct('<2sBB')
+LEVEL_HEADER = struct.Struct('<I')
+
+
+# Ranks points by the Ramer–Douglas–Peucker tolerance at which they stop
+# being kept. A point never outranks the point that split its segment, so
+# the top-k points of any k form a nested RDP simplification.
+def importance(coords):
+    ranks = np.zeros(len(coords), dtype=np.float64)
+    ranks[0] = ranks[-1] = np.inf
+
+    stack = [(0, len(coords) - 1, np.inf)]
+    while len(stack) > 0:
+        start, end, ceiling = stack.pop()
+        if end - start < 2:
+            continue
+
+        distances = segment_distances(coords, start, end)
+        i = int(np.argmax(distances))
+        split = start + 1 + i
+        ranks[split] = min(distances[i], ceiling)
+        stack.append((start, split, ranks[split]))
+        stack.append((split, end, ranks[split]))
+
+    return ranks
+
+
+# Every row gets LOD levels, so reading a level never needs the points
+# columns. Points that cannot be ranked (none, or without numeric x and y)
+# are stored as they are at every level.
+def build(points):
+    levels = _levels(points)
+    if levels is None:
+        levels = [points_codec.encode_raw(points)] * len(DENSITIES)
+
+    return HEADER.pack(MAGIC, VERSION, len(levels)) + b''.join(
+        LEVEL_HEADER.pack(len(level)) + level for level in levels
+    )
+
+
+def _levels(points):
+    if not isinstance(points, list) or len(points) == 0:
+        return None
+
+    try:
+        coords = np.array([[point['x'], point['y']] for point in points], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if not np.isfinite(coords).all():
+        return None
+
+    order = np.argsort(-importance(coords), kind='stable')
+
+    levels = []
+    for density in DENSITIES:
+        count = max(min(2, len(points)), -(-len(points) // density))
+        keep = np.sort(order[:count])
+        level = [points[i] for i in keep.tolist()]
+        # Points with extra keys do not pack; they are kept as JSON.
+        levels.append(points_codec.encode(level) or points_codec.encode_raw(level))
+
+    return levels
+
+
+def decode(data, level):
+    data = bytes(data)
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Unknown LOD points format.')
+
+    level = min(level, count)
+    offset = HEADER.size
+    for _ in range(level - 1):
+        size, = LEVEL_HEADER.unpack_from(data, offset)
+        offset += LEVEL_HEADER.size + size
+
+    size, = LEVEL_HEADER.unpack_from(data, offset)
+    offset += LEVEL_HEADER.size
+
+    return points_codec.decode_raw(data[offset:offset + size])
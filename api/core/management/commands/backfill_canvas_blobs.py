@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import blobs
+from core.chunks import iter_chunks
+from core.models import Element, Page
+
+
+class Command(BaseCommand):
+    help = 'Moves inline canvas_data_url data URLs into the blob store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        for model in (Page, Element):
+            moved, failed = self.backfill(model, options['chunk_size'])
+            self.stdout.write(f'{model.__name__}: moved {moved} canvas data urls, {failed} could not be decoded')
+
+    # Data URLs that don't decode are left inline and counted as failed.
+    def backfill(self, model, chunk_size):
+        queryset = model.objects \
+            .filter(canvas_data_url__startswith='data:') \
+            .only('uid', 'canvas_data_url')
+
+        moved = 0
+        failed = 0
+        for chunk in iter_chunks(queryset, chunk_size):
+            stored = []
+            for instance in chunk:
+                key = blobs.to_key(instance.canvas_data_url)
+                if not blobs.is_key(key):
+                    failed += 1
+                    continue
+
+                instance.canvas_data_url = key
+                stored.append(instance)
+
+            with transaction.atomic():
+                model.objects.bulk_update(stored, ['canvas_data_url'])
+
+            moved += len(stored)
+
+        return moved, failed
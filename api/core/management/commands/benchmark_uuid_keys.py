@@ -0,0 +1,177 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.choices import Tools
+from core.models import Element
+from core.uuids import uuid7
+
+
+GENERATORS = {
+    'uuid4': uuid.uuid4,
+    'uuid7': uuid7,
+}
+
+TABLE = 'benchmark_uuid_keys'
+SOURCE = Element._meta.db_table
+
+# Rows are spread over this many owners and pages, like on the real table.
+OWNERS = 100
+PAGES = 1000
+
+# Two runs with the defaults (200k rows, batches of 5000) against a local
+# PostgreSQL 16 with default settings, on the core_element shape of
+# migration 0044: 16 hash partitions, every index, and 120-point pen
+# strokes with their LOD levels and outlines (about 9 kB a row).
+#
+#   generator      rows/s    pkey MB  indexes MB   table MB     WAL MB
+#   uuid4            8357       12.9        98.0     1841.4     2011.5
+#   uuid7            9709        9.8       104.4     1841.4     1987.4
+#   uuid7            8605        9.8       103.8     1841.4     1986.2
+#   uuid4            8442       12.3       100.8     1841.4     2013.3
+#
+# The primary key is about a quarter smaller with uuid7, but rows this
+# wide are dominated by their TOASTed points: throughput is within noise
+# and WAL only drops about 1%. The gap grows once the primary key no
+# longer fits in memory, which these runs do not reach.
+
+
+# A typical pen stroke, as batch_save_elements would store it.
+def _template_element():
+    points = [
+        {'x': 100 + i * 2.5, 'y': 100 + 40 * ((i % 20) / 20), 'pressure': 0.5}
+        for i in range(120)
+    ]
+    canvas_settings = {
+        'lineSize': 3,
+        'strokeColor': {'r': 0, 'g': 0, 'b': 0},
+        'freehandOptions': {'size': 3, 'thinning': 0.5, 'smoothing': 0.5},
+    }
+    element = Element(
+        tool=Tools.PEN,
+        points=points,
+        settings={},
+        transform={},
+        dimensions={},
+        canvas_settings=canvas_settings,
+    )
+    element.update_lod()
+    element.update_bounds()
+    element.update_outline()
+    element.pack_points()
+    return element
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares insert throughput, index size and WAL volume of uuid4 and uuid7 keys '
+        'on a scratch copy of the element table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--generators', nargs='+', choices=list(GENERATORS), default=list(GENERATORS))
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"generator":<10} {"rows/s":>10} {"pkey MB":>10} {"indexes MB":>11} {"table MB":>10} {"WAL MB":>10}'
+        )
+        for name in options['generators']:
+            rate, sizes, wal = self.run(GENERATORS[name], options['rows'], options['batch_size'])
+            pkey_size, index_size, table_size = (size / 2 ** 20 for size in sizes)
+            self.stdout.write(
+                f'{name:<10} {rate:>10.0f} {pkey_size:>10.1f} {index_size:>11.1f} '
+                f'{table_size:>10.1f} {wal / 2 ** 20:>10.1f}'
+            )
+
+    # A table with the columns, defaults, indexes and hash partitions of
+    # the element table, without its foreign keys.
+    def create_table(self, cursor):
+        cursor.execute(
+            'SELECT count(*) FROM pg_inherits WHERE inhparent = %s::regclass',
+            [SOURCE],
+        )
+        partitions = cursor.fetchone()[0]
+
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        if partitions == 0:
+            cursor.execute(f'CREATE TABLE {TABLE} (LIKE {SOURCE} INCLUDING ALL)')
+            return
+
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {SOURCE} INCLUDING ALL) PARTITION BY HASH (owner_id)')
+        for i in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{i} PARTITION OF {TABLE} '
+                f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})'
+            )
+
+    # One prepared row whose columns every inserted row copies, apart from
+    # its key, owner and page.
+    def create_template(self, cursor):
+        element = _template_element()
+        fields = [
+            field for field in Element._meta.concrete_fields
+            if field.attname not in ('uid', 'owner_id', 'page_id')
+        ]
+        columns = [field.column for field in fields]
+        values = [field.get_db_prep_save(field.pre_save(element, True), connection) for field in fields]
+
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}_template')
+        cursor.execute(f'CREATE TEMPORARY TABLE {TABLE}_template AS SELECT {", ".join(columns)} FROM {SOURCE} LIMIT 0')
+        cursor.execute(
+            f'INSERT INTO {TABLE}_template ({", ".join(columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})',
+            values,
+        )
+        return columns
+
+    # Inserts `rows` rows, one transaction per batch. Only the inserts are
+    # timed, not making the keys.
+    def run(self, generate, rows, batch_size):
+        owners = [str(uuid.uuid4()) for _ in range(OWNERS)]
+        pages = [str(uuid.uuid4()) for _ in range(PAGES)]
+        with connection.cursor() as cursor:
+            self.create_table(cursor)
+            columns = self.create_template(cursor)
+            cursor.execute('CHECKPOINT')
+            cursor.execute('SELECT pg_current_wal_lsn()')
+            start_lsn = cursor.fetchone()[0]
+
+        insert = (
+            f'INSERT INTO {TABLE} (uid, owner_id, page_id, {", ".join(columns)}) '
+            f'SELECT key, (%s::uuid[])[1 + n %% {OWNERS}], (%s::uuid[])[1 + n %% {PAGES}], '
+            f'{", ".join(f"t.{column}" for column in columns)} '
+            f'FROM {TABLE}_template t, unnest(%s::uuid[]) WITH ORDINALITY AS keys(key, n)'
+        )
+
+        elapsed = 0
+        try:
+            for offset in range(0, rows, batch_size):
+                keys = [str(generate()) for _ in range(min(batch_size, rows - offset))]
+
+                started = time.monotonic()
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(insert, [owners, pages, keys])
+                elapsed += time.monotonic() - started
+
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)', [start_lsn])
+                wal = cursor.fetchone()[0]
+                # Sizes are summed over the partitions.
+                cursor.execute(
+                    'SELECT '
+                    '(SELECT sum(pg_relation_size(relid)) FROM pg_partition_tree(%s)), '
+                    '(SELECT sum(pg_indexes_size(relid)) FROM pg_partition_tree(%s)), '
+                    '(SELECT sum(pg_table_size(relid)) FROM pg_partition_tree(%s))',
+                    [f'{TABLE}_pkey', TABLE, TABLE],
+                )
+                sizes = [float(size or 0) for size in cursor.fetchone()]
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+                cursor.execute(f'DROP TABLE IF EXISTS {TABLE}_template')
+
+        return rows / elapsed, sizes, float(wal)
@@ -0,0 +1,53 @@
+import argparse
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.compaction import compact_page, is_idle
+from core.models import Page
+
+
+class Command(BaseCommand):
+    help = 'Removes elements wiped by CLEAR_ALL and bakes erased strokes into a bitmap.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', help='Page uids. All pages when none are given.')
+        parser.add_argument('--min-elements', type=int, default=0)
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only pages marked for compaction that have been idle for COMPACTION_IDLE_SECONDS.',
+        )
+        parser.add_argument(
+            '--archive',
+            action=argparse.BooleanOptionalAction,
+            default=None,
+            help='Defaults to COMPACTION_ARCHIVE.',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Page.objects.only('uid', 'owner_id').order_by('uid')
+        if len(options['pages']) > 0:
+            queryset = queryset.filter(uid__in=options['pages'])
+
+        if options['pending']:
+            queryset = queryset.filter(needs_compaction=True)
+
+        if options['min_elements'] > 0:
+            queryset = queryset \
+                .annotate(element_count=Count('elements')) \
+                .filter(element_count__gte=options['min_elements'])
+
+        cleared = baked = 0
+        for page in queryset.iterator():
+            # Pages still being drawn on stay marked for a later run.
+            if options['pending'] and not is_idle(page):
+                continue
+
+            result = compact_page(page.uid, archive=options['archive'])
+            cleared += result.cleared
+            baked += result.baked
+            if result.cleared or result.baked:
+                self.stdout.write(f'{page.uid}: cleared {result.cleared}, baked {result.baked}')
+
+        self.stdout.write(f'Removed {cleared} cleared and {baked} baked elements')
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.purge import purge_hidden_elements
+
+
+class Command(BaseCommand):
+    help = 'Archives and removes hidden elements older than the retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--duty-cycle', type=float, default=None)
+        parser.add_argument('--after', default=None, help='Resume after this element uid.')
+        archive = parser.add_mutually_exclusive_group()
+        archive.add_argument('--archive', dest='archive', action='store_true', default=None)
+        archive.add_argument('--no-archive', dest='archive', action='store_false')
+
+    def handle(self, *args, **options):
+        retention = None
+        if options['retention_days'] is not None:
+            retention = timedelta(days=options['retention_days'])
+
+        total = 0
+        for chunk in purge_hidden_elements(
+            retention=retention,
+            chunk_size=options['chunk_size'],
+            duty_cycle=options['duty_cycle'],
+            archive=options['archive'],
+            after=options['after'],
+        ):
+            total += chunk.removed
+            self.stdout.write(f'removed {total} elements, last uid {chunk.last_uid}')
+
+        self.stdout.write(f'Removed {total} hidden elements')
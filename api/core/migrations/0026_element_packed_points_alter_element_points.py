@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_auto_20230106_0513"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="element",
+            name="packed_points",
+            field=models.BinaryField(blank=True, default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name="element",
+            name="points",
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
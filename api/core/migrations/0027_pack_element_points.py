@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import migrations, transaction
+
+from core import points as points_codec
+from core.chunks import iter_chunks
+
+
+def pack_points(apps, schema_editor):
+    if settings.ELEMENT_POINTS_FORMAT != "packed":
+        return
+
+    Element = apps.get_model("core", "Element")
+    queryset = Element.objects.filter(
+        packed_points__isnull=True,
+        points__isnull=False,
+    ).only("uid", "points")
+
+    for chunk in iter_chunks(queryset):
+        packed = []
+        for element in chunk:
+            packed_points = points_codec.encode(element.points)
+            if packed_points is None:
+                continue
+
+            element.packed_points = packed_points
+            element.points = None
+            packed.append(element)
+
+        with transaction.atomic():
+            Element.objects.bulk_update(packed, ["points", "packed_points"])
+
+
+def unpack_points(apps, schema_editor):
+    Element = apps.get_model("core", "Element")
+    queryset = Element.objects.filter(
+        packed_points__isnull=False,
+    ).only("uid", "packed_points")
+
+    for chunk in iter_chunks(queryset):
+        for element in chunk:
+            element.points = points_codec.decode(element.packed_points)
+            element.packed_points = None
+
+        with transaction.atomic():
+            Element.objects.bulk_update(chunk, ["points", "packed_points"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0026_element_packed_points_alter_element_points"),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_points, unpack_points),
+    ]
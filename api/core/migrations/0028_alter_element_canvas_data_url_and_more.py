@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 11:51
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0027_pack_element_points"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="element",
+            name="canvas_data_url",
+            field=core.fields.BlobField(blank=True, default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name="page",
+            name="canvas_data_url",
+            field=core.fields.BlobField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.4 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0028_alter_element_canvas_data_url_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="element",
+            index=models.Index(
+                fields=["page", "created_at", "uid"], name="element_page_keyset_idx"
+            ),
+        ),
+    ]
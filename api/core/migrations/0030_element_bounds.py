@@ -0,0 +1,61 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0029_element_element_page_keyset_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="element",
+            name="max_x",
+            field=models.FloatField(
+                blank=True, default=None, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="element",
+            name="max_y",
+            field=models.FloatField(
+                blank=True, default=None, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="element",
+            name="min_x",
+            field=models.FloatField(
+                blank=True, default=None, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="element",
+            name="min_y",
+            field=models.FloatField(
+                blank=True, default=None, editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="element",
+            index=django.contrib.postgres.indexes.GistIndex(
+                models.Func(
+                    models.Func(models.F("min_x"), models.F("min_y"), function="point"),
+                    models.Func(models.F("max_x"), models.F("max_y"), function="point"),
+                    function="box",
+                ),
+                name="element_bounds_gist_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="element",
+            index=models.Index(
+                condition=models.Q(("min_x__isnull", True)),
+                fields=["page"],
+                name="element_unbounded_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, transaction
+
+from core import points as points_codec
+from core.bounds import element_bounds
+from core.chunks import iter_chunks
+
+
+BOUNDS_FIELDS = ["min_x", "min_y", "max_x", "max_y"]
+
+
+def backfill_bounds(apps, schema_editor):
+    Element = apps.get_model("core", "Element")
+    queryset = Element.objects.filter(
+        min_x__isnull=True,
+        is_html_element=False,
+    ).only(
+        "uid",
+        "points",
+        "packed_points",
+        "transform",
+        "dimensions",
+        "canvas_settings",
+        "is_html_element",
+    )
+
+    for chunk in iter_chunks(queryset):
+        bounded = []
+        for element in chunk:
+            points = element.points
+            if element.packed_points is not None:
+                points = points_codec.decode(element.packed_points)
+
+            bounds = element_bounds(
+                points,
+                element.dimensions,
+                element.transform,
+                element.canvas_settings,
+                element.is_html_element,
+            )
+            if bounds is None:
+                continue
+
+            element.min_x, element.min_y, element.max_x, element.max_y = bounds
+            bounded.append(element)
+
+        with transaction.atomic():
+            Element.objects.bulk_update(bounded, BOUNDS_FIELDS)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0030_element_bounds"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_bounds, migrations.RunPython.noop),
+    ]
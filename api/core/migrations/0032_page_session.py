@@ -0,0 +1,163 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:04
+
+import core.tracking
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SESSION_COLUMNS = """
+    selected_tool, selected_tool_size, selected_line_end_style, selected_line_end_side,
+    is_debug_mode, is_paste_mode, is_add_image_mode, is_interactive_edit_mode,
+    is_textbox_edit_mode, is_ruler_mode
+"""
+
+COPY_TO_SESSIONS = f"""
+INSERT INTO core_pagesession (page_id, owner_id, updated_at, {SESSION_COLUMNS})
+SELECT uid, owner_id, updated_at, {SESSION_COLUMNS}
+FROM core_page
+"""
+
+COPY_TO_PAGES = """
+UPDATE core_page AS page SET
+    selected_tool = session.selected_tool,
+    selected_tool_size = session.selected_tool_size,
+    selected_line_end_style = session.selected_line_end_style,
+    selected_line_end_side = session.selected_line_end_side,
+    is_debug_mode = session.is_debug_mode,
+    is_paste_mode = session.is_paste_mode,
+    is_add_image_mode = session.is_add_image_mode,
+    is_interactive_edit_mode = session.is_interactive_edit_mode,
+    is_textbox_edit_mode = session.is_textbox_edit_mode,
+    is_ruler_mode = session.is_ruler_mode
+FROM core_pagesession AS session
+WHERE session.page_id = page.uid
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("core", "0031_backfill_element_bounds"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageSession",
+            fields=[
+                (
+                    "page",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="session",
+                        serialize=False,
+                        to="core.page",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "selected_tool",
+                    models.IntegerField(
+                        choices=[
+                            (10, "Eraser"),
+                            (12, "Clear All"),
+                            (20, "Pen"),
+                            (21, "Marker"),
+                            (22, "Highlighter"),
+                            (30, "Blob"),
+                            (40, "Circle"),
+                            (41, "Rectangle"),
+                            (42, "Triangle"),
+                            (43, "Line"),
+                            (50, "Cut"),
+                            (51, "Paste"),
+                            (60, "Image"),
+                            (70, "Checkbox"),
+                            (81, "Textbox"),
+                        ],
+                        default=20,
+                    ),
+                ),
+                ("selected_tool_size", models.IntegerField(default=1)),
+                (
+                    "selected_line_end_style",
+                    models.IntegerField(
+                        choices=[
+                            (0, "None"),
+                            (1, "Arrow"),
+                            (2, "Circle"),
+                            (3, "Square"),
+                        ],
+                        default=0,
+                    ),
+                ),
+                (
+                    "selected_line_end_side",
+                    models.IntegerField(
+                        choices=[(0, "None"), (1, "One"), (2, "Both")], default=0
+                    ),
+                ),
+                ("is_debug_mode", models.BooleanField(default=False)),
+                ("is_paste_mode", models.BooleanField(default=False)),
+                ("is_add_image_mode", models.BooleanField(default=False)),
+                ("is_interactive_edit_mode", models.BooleanField(default=False)),
+                ("is_textbox_edit_mode", models.BooleanField(default=False)),
+                ("is_ruler_mode", models.BooleanField(default=False)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="page_sessions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            bases=(core.tracking.Tracked, models.Model),
+        ),
+        migrations.RunSQL(
+            COPY_TO_SESSIONS,
+            COPY_TO_PAGES,
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="is_add_image_mode",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="is_debug_mode",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="is_interactive_edit_mode",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="is_paste_mode",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="is_ruler_mode",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="is_textbox_edit_mode",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="selected_line_end_side",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="selected_line_end_style",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="selected_tool",
+        ),
+        migrations.RemoveField(
+            model_name="page",
+            name="selected_tool_size",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0032_page_session"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="element",
+            name="raw_points",
+            field=models.BinaryField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0033_element_raw_points"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="element",
+            name="lod_points",
+            field=models.BinaryField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, transaction
+
+from core import lod as lod_codec
+from core import points as points_codec
+from core.chunks import iter_chunks
+
+
+def build_lod_points(apps, schema_editor):
+    Element = apps.get_model("core", "Element")
+    queryset = Element.objects.filter(
+        lod_points__isnull=True,
+    ).only("uid", "points", "packed_points")
+
+    for chunk in iter_chunks(queryset):
+        for element in chunk:
+            points = element.points
+            if element.packed_points is not None:
+                points = points_codec.decode(element.packed_points)
+
+            element.lod_points = lod_codec.build(points)
+
+        with transaction.atomic():
+            Element.objects.bulk_update(chunk, ["lod_points"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0034_element_lod_points"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_lod_points, migrations.RunPython.noop),
+    ]
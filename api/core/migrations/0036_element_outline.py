@@ -0,0 +1,23 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0035_backfill_element_lod_points"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="element",
+            name="path_svg_path",
+            field=models.TextField(blank=True, default=None, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="element",
+            name="stroke_svg_path",
+            field=models.TextField(blank=True, default=None, editable=False, null=True),
+        ),
+    ]
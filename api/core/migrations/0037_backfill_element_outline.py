@@ -0,0 +1,44 @@
+from django.db import migrations, transaction
+
+from core import freehand
+from core import points as points_codec
+from core.chunks import iter_chunks
+
+
+# Tools.PEN, Tools.MARKER and Tools.HIGHLIGHTER.
+FREEHAND_TOOLS = [20, 21, 22]
+
+
+def build_outlines(apps, schema_editor):
+    Element = apps.get_model("core", "Element")
+    queryset = Element.objects.filter(
+        tool__in=FREEHAND_TOOLS,
+        stroke_svg_path__isnull=True,
+    ).only("uid", "points", "packed_points", "canvas_settings")
+
+    for chunk in iter_chunks(queryset):
+        built = []
+        for element in chunk:
+            points = element.points
+            if element.packed_points is not None:
+                points = points_codec.decode(element.packed_points)
+
+            outlines = freehand.element_outlines(points, element.canvas_settings)
+            if outlines is not None:
+                element.stroke_svg_path, element.path_svg_path = outlines
+                built.append(element)
+
+        with transaction.atomic():
+            Element.objects.bulk_update(built, ["stroke_svg_path", "path_svg_path"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0036_element_outline"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_outlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("core", "0037_backfill_element_outline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedElement",
+            fields=[
+                (
+                    "uid",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("reason", models.IntegerField(choices=[(1, "Cleared"), (2, "Baked")])),
+                ("data", models.JSONField()),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_elements",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_elements",
+                        to="core.page",
+                    ),
+                ),
+            ],
+        ),
+    ]
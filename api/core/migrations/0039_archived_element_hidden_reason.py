@@ -0,0 +1,20 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0038_archived_element"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedelement",
+            name="reason",
+            field=models.IntegerField(
+                choices=[(1, "Cleared"), (2, "Baked"), (3, "Hidden")]
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:30
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("core", "0039_archived_element_hidden_reason"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="element",
+            index=models.Index(
+                condition=models.Q(("is_hidden", False)),
+                fields=["page", "created_at", "uid"],
+                name="element_visible_keyset_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="element",
+            index=models.Index(
+                fields=["page", "is_html_element", "created_at", "uid"],
+                name="element_html_keyset_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="element",
+            index=models.Index(
+                fields=["owner", "page", "created_at", "uid"],
+                name="element_owner_keyset_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="element",
+            index=models.Index(
+                condition=models.Q(("is_hidden", True)),
+                fields=["uid"],
+                name="element_hidden_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="palette",
+            index=models.Index(
+                condition=models.Q(("is_public", True)),
+                fields=["uid"],
+                name="palette_public_idx",
+            ),
+        ),
+    ]
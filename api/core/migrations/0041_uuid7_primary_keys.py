@@ -0,0 +1,94 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:31
+
+import core.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0040_element_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bookshelf",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="element",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notebook",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="page",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="palette",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="palettecollection",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="paletteswatch",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="room",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,188 @@
+import re
+
+from django.db import migrations, transaction
+
+
+TABLE = "core_element"
+
+# Fixed for the life of the table; changing it means rebuilding again.
+PARTITIONS = 16
+
+# Rows copied per transaction.
+BATCH_SIZE = 5000
+
+
+def _indexes(cursor):
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+        [TABLE],
+    )
+    return [(name, sql) for name, sql in cursor.fetchall() if name != f"{TABLE}_pkey"]
+
+
+def _foreign_keys(cursor):
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    return cursor.fetchall()
+
+
+# Keeps the new table in step with every write made to the old one while
+# the rows are copied. An update deletes the old copy and inserts the new
+# row, which also covers a changed owner_id.
+SYNC_FUNCTION = """
+CREATE FUNCTION {new}_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {new} WHERE uid = OLD.uid AND owner_id = OLD.owner_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {new} SELECT NEW.*;
+    END IF;
+    RETURN NULL;
+END;
+$$
+"""
+
+
+# Anything left by an interrupted run is dropped, so the copy starts over.
+def _create(connection, create_sql, primary_key, new):
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {new}_sync ON {TABLE}")
+        cursor.execute(f"DROP FUNCTION IF EXISTS {new}_sync()")
+        cursor.execute(f"DROP TABLE IF EXISTS {new}")
+
+        cursor.execute(create_sql.format(table=new, like=TABLE))
+        cursor.execute(f"ALTER TABLE {new} ADD CONSTRAINT {new}_pkey PRIMARY KEY ({primary_key})")
+        for name, definition in _foreign_keys(cursor):
+            cursor.execute(f"ALTER TABLE {new} ADD CONSTRAINT {name} {definition}")
+
+        cursor.execute(SYNC_FUNCTION.format(new=new))
+        cursor.execute(
+            f"CREATE TRIGGER {new}_sync AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {new}_sync()"
+        )
+
+
+# Copies the rows in uid order, one short transaction per batch. The
+# source rows are share-locked, so a concurrent update or delete either
+# lands before the batch reads the row or waits and is mirrored by the
+# trigger afterwards. Rows the trigger already wrote are left alone.
+def _copy(connection, new):
+    last = None
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            after, params = ("uid > %s", [last]) if last is not None else ("TRUE", [])
+            cursor.execute(
+                f"SELECT uid FROM (SELECT uid FROM {TABLE} WHERE {after} ORDER BY uid LIMIT %s) batch "
+                f"ORDER BY uid DESC LIMIT 1",
+                params + [BATCH_SIZE],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return
+
+            upper = row[0]
+
+            cursor.execute(
+                f"INSERT INTO {new} SELECT * FROM {TABLE} WHERE {after} AND uid <= %s FOR SHARE "
+                f"ON CONFLICT DO NOTHING",
+                params + [upper],
+            )
+            last = upper
+
+
+# Secondary indexes are built once the rows are in, under temporary names,
+# while the old table is still in use.
+def _create_indexes(connection, indexes, new):
+    with connection.cursor() as cursor:
+        for name, sql in indexes:
+            sql = sql.replace(f"INDEX {name} ON ", f"INDEX {name[:59]}_new ON ", 1)
+            cursor.execute(re.sub(r" ON (ONLY )?\S+ USING ", f" ON {new} USING ", sql, count=1))
+
+
+# The only step that blocks the table: renames, so it is short whatever
+# the row count.
+def _swap(connection, indexes, new):
+    old = f"{TABLE}_old"
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"DROP TRIGGER {new}_sync ON {TABLE}")
+        cursor.execute(f"DROP FUNCTION {new}_sync()")
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        cursor.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {TABLE}_pkey TO {old}_pkey")
+        for name, sql in indexes:
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {name[:59]}_old")
+
+        cursor.execute(f"ALTER TABLE {new} RENAME TO {TABLE}")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {new}_pkey TO {TABLE}_pkey")
+        for name, sql in indexes:
+            cursor.execute(f"ALTER INDEX {name[:59]}_new RENAME TO {name}")
+        cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass", [TABLE])
+        for (partition,) in cursor.fetchall():
+            cursor.execute("SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass", [partition])
+            for (index,) in cursor.fetchall():
+                cursor.execute(f"ALTER INDEX {index} RENAME TO {TABLE}{index[len(new):]}")
+            cursor.execute(f"ALTER TABLE {partition} RENAME TO {TABLE}{partition[len(new):]}")
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {old}")
+        cursor.execute(f"ANALYZE {TABLE}")
+
+
+# Moves the rows into a new table made by `create_sql`, keeping the column
+# order, defaults, index and foreign key names of the old one. Writes keep
+# going while the rows are copied; only the final swap takes a lock.
+def _rebuild(schema_editor, create_sql, primary_key):
+    connection = schema_editor.connection
+    new = f"{TABLE}_new"
+    with connection.cursor() as cursor:
+        indexes = _indexes(cursor)
+
+    _create(connection, create_sql, primary_key, new)
+    _copy(connection, new)
+    _create_indexes(connection, indexes, new)
+    _swap(connection, indexes, new)
+
+
+# A partitioned table's primary key has to hold the partition key, so it
+# becomes (uid, owner_id) and Postgres no longer enforces that uid alone is
+# unique. Django still treats uid as the primary key. Uids are only ever
+# made server-side, as uuid7, so a clash across owners is not a practical
+# concern; an element is always looked up with its owner as well.
+def partition(apps, schema_editor):
+    partitions = "; ".join(
+        f"CREATE TABLE {{table}}_p{i} PARTITION OF {{table}} FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {i})"
+        for i in range(PARTITIONS)
+    )
+    _rebuild(
+        schema_editor,
+        "CREATE TABLE {table} (LIKE {like} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+        "PARTITION BY HASH (owner_id); " + partitions,
+        "uid, owner_id",
+    )
+
+
+def unpartition(apps, schema_editor):
+    _rebuild(
+        schema_editor,
+        "CREATE TABLE {table} (LIKE {like} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)",
+        "uid",
+    )
+
+
+class Migration(migrations.Migration):
+
+    # Each step commits on its own, so the table is never locked for the
+    # whole copy.
+    atomic = False
+
+    dependencies = [
+        ("core", "0041_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
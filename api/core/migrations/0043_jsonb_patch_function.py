@@ -0,0 +1,74 @@
+from django.db import migrations
+
+
+# Applies one RFC 6902 operation (plus `merge`) to the jsonb column
+# `field`. `path` is the pointer below the column, split into tokens. An
+# array index inserts on add. A missing parent, or a missing target for
+# replace and remove, raises instead of being skipped.
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION core_jsonb_patch(target jsonb, op text, field text, path text[], value jsonb)
+RETURNS jsonb LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    depth int := cardinality(path);
+    parent jsonb;
+    key text;
+    length int;
+BEGIN
+    IF depth = 0 THEN
+        IF op = 'merge' THEN
+            RETURN COALESCE(target, '{}'::jsonb) || value;
+        END IF;
+        RETURN value;
+    END IF;
+
+    target := COALESCE(target, '{}'::jsonb);
+    parent := target #> path[1:depth - 1];
+    key := path[depth];
+
+    IF jsonb_typeof(parent) = 'object' THEN
+        IF op = 'add' THEN
+            RETURN jsonb_set(target, path, value, true);
+        ELSIF op = 'merge' THEN
+            RETURN jsonb_set(target, path, COALESCE(parent -> key, '{}'::jsonb) || value, true);
+        ELSIF parent ? key THEN
+            IF op = 'remove' THEN
+                RETURN target #- path;
+            END IF;
+            RETURN jsonb_set(target, path, value, false);
+        END IF;
+    ELSIF jsonb_typeof(parent) = 'array' THEN
+        length := jsonb_array_length(parent);
+        IF op = 'add' AND key = '-' THEN
+            RETURN jsonb_insert(target, path[1:depth - 1] || length::text, value, false);
+        ELSIF key ~ '^(0|[1-9][0-9]{0,8})$' THEN
+            IF op = 'add' AND key::int <= length THEN
+                RETURN jsonb_insert(target, path, value, false);
+            ELSIF key::int < length THEN
+                IF op = 'remove' THEN
+                    RETURN target #- path;
+                ELSIF op = 'merge' THEN
+                    RETURN jsonb_set(target, path, (parent -> key::int) || value, false);
+                END IF;
+                RETURN jsonb_set(target, path, value, false);
+            END IF;
+        END IF;
+    END IF;
+
+    RAISE EXCEPTION 'Path /%/% does not exist.', field, array_to_string(path, '/')
+        USING ERRCODE = 'invalid_parameter_value';
+END;
+$$
+"""
+
+DROP_FUNCTION = "DROP FUNCTION IF EXISTS core_jsonb_patch(jsonb, text, text, text[], jsonb)"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0042_partition_element_by_owner"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_FUNCTION, DROP_FUNCTION),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_backfill_missing_lod_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='element',
+            name='is_stale',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.4 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_element_is_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='needs_compaction',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='page',
+            index=models.Index(condition=models.Q(('needs_compaction', True)), fields=['uid'], name='page_needs_compaction_idx'),
+        ),
+    ]
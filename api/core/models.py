@@ -1,12 +1,22 @@
-import uuid
+from django.conf import settings
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GistIndex
 from django.dispatch import receiver
-from .choices import LineEndSides, LineEndStyles, PaletteTypes, PatternTypes, SwatchDefaultUsages, Tools
-
-
-class Room(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+from . import freehand
+from . import lod as lod_codec
+from . import points as points_codec
+from . import simplify
+from .bounds import element_bounds, element_box
+from .choices import ArchiveReasons, LineEndSides, LineEndStyles, PaletteTypes, PatternTypes, SwatchDefaultUsages, Tools
+from .fields import BlobField
+from .ordering import append_to_order
+from .tracking import Tracked
+from .uuids import new_uuid
+
+
+class Room(Tracked, models.Model):
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -31,12 +41,11 @@ def setup_room(sender, instance, created, **kwargs):
         return
 
     room = instance
-    bookshelf = Bookshelf.objects.create(owner=room.owner, room=room)
-    bookshelf.save()
+    Bookshelf.objects.create(owner=room.owner, room=room)
 
 
-class Bookshelf(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class Bookshelf(Tracked, models.Model):
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -66,13 +75,11 @@ def setup_bookshelf(sender, instance, created, **kwargs):
         return
 
     bookshelf = instance
-    room = bookshelf.room
-    room.bookshelf_order.append(bookshelf.uid)
-    room.save()
+    append_to_order(Room, bookshelf.room_id, 'bookshelf_order', bookshelf.uid)
 
 
-class Notebook(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class Notebook(Tracked, models.Model):
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -109,13 +116,11 @@ def setup_notebook(sender, instance, created, **kwargs):
         return
 
     notebook = instance
-    bookshelf = notebook.bookshelf
-    bookshelf.notebook_order.append(notebook.uid)
-    bookshelf.save()
+    append_to_order(Bookshelf, notebook.bookshelf_id, 'notebook_order', notebook.uid)
 
 
-class Page(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class Page(Tracked, models.Model):
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -135,7 +140,7 @@ class Page(models.Model):
         blank=True
     )
 
-    canvas_data_url = models.TextField(
+    canvas_data_url = BlobField(
         default=None,
         null=True,
         blank=True
@@ -182,6 +187,64 @@ class Page(models.Model):
         blank=True,
         null=True
     )
+
+    # Set once the page grows past COMPACTION_THRESHOLD elements, and
+    # cleared when it is compacted.
+    needs_compaction = models.BooleanField(
+        default=False,
+        editable=False
+    )
+
+    class Meta:
+        indexes = [
+            # compact_pages --pending.
+            models.Index(
+                fields=['uid'],
+                condition=models.Q(needs_compaction=True),
+                name='page_needs_compaction_idx'
+            ),
+        ]
+
+    def get_session(self):
+        try:
+            return self.session
+        except PageSession.DoesNotExist:
+            return PageSession(page=self, owner_id=self.owner_id)
+
+    def __str__(self):
+        return f"{self.owner.username}'s page {self.uid}"
+
+
+@receiver(models.signals.post_save, sender=Page)
+def setup_page(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    page = instance
+    append_to_order(Notebook, page.notebook_id, 'page_order', page.uid)
+    PageSession.objects.create(page=page, owner_id=page.owner_id)
+
+    def __str__(self):
+        return f"page settings {self.uid}"
+
+
+# Per-page toolbar and mode state. It changes on every toolbar toggle, so it
+# lives in a narrow row apart from the page's content.
+class PageSession(Tracked, models.Model):
+    page = models.OneToOneField(
+        Page,
+        primary_key=True,
+        related_name='session',
+        on_delete=models.CASCADE
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    owner = models.ForeignKey(
+        'users.User',
+        related_name='page_sessions',
+        on_delete=models.CASCADE
+    )
+
     selected_tool = models.IntegerField(
         choices=Tools.choices,
         default=Tools.PEN
@@ -216,26 +279,30 @@ class Page(models.Model):
         default=False
     )
 
-    def __str__(self):
-        return f"{self.owner.username}'s page {self.uid}"
-
-
-@receiver(models.signals.post_save, sender=Page)
-def setup_page(sender, instance, created, **kwargs):
-    if not created:
-        return
-
-    page = instance
-    notebook = page.notebook
-    notebook.page_order.append(page.uid)
-    notebook.save()
+    FIELDS = [
+        'selected_tool',
+        'selected_tool_size',
+        'selected_line_end_style',
+        'selected_line_end_side',
+        'is_debug_mode',
+        'is_paste_mode',
+        'is_add_image_mode',
+        'is_interactive_edit_mode',
+        'is_textbox_edit_mode',
+        'is_ruler_mode',
+    ]
 
     def __str__(self):
-        return f"page settings {self.uid}"
+        return f"page session {self.page_id}"
 
 
-class Element(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class Element(Tracked, models.Model):
+    # The table is partitioned by owner (migration 0042), so its real
+    # primary key is (uid, owner_id) and uid alone is only unique because
+    # it is always made here. Filter on owner too wherever it is known,
+    # which lets Postgres skip the other partitions. Saves and deletes by
+    # uid alone still look the row up in every partition's primary key.
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -252,7 +319,41 @@ class Element(models.Model):
     tool = models.IntegerField(
         choices=Tools.choices,
     )
-    points = models.JSONField()
+    points = models.JSONField(
+        default=None,
+        null=True,
+        blank=True
+    )
+    packed_points = models.BinaryField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    raw_points = models.BinaryField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    lod_points = models.BinaryField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    stroke_svg_path = models.TextField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    path_svg_path = models.TextField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
     settings = models.JSONField(
         default=None,
         null=True,
@@ -273,7 +374,7 @@ class Element(models.Model):
         null=True,
         blank=True
     )
-    canvas_data_url = models.TextField(
+    canvas_data_url = BlobField(
         default=None,
         null=True,
         blank=True
@@ -287,10 +388,197 @@ class Element(models.Model):
     is_hidden = models.BooleanField(
         default=False
     )
+    # Set by appendElementPoints, which appends to `points` in SQL and
+    # clears the columns derived from it. The next save rebuilds them.
+    is_stale = models.BooleanField(
+        default=False,
+        editable=False
+    )
+    min_x = models.FloatField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    min_y = models.FloatField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    max_x = models.FloatField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    max_y = models.FloatField(
+        default=None,
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    # Fields the bounding box is computed from.
+    GEOMETRY_FIELDS = ['points', 'transform', 'dimensions', 'canvas_settings', 'is_html_element']
+    BOUNDS_FIELDS = ['min_x', 'min_y', 'max_x', 'max_y']
+
+    # Freehand outlines are computed from these, for these tools.
+    OUTLINE_SOURCE_FIELDS = ['tool', 'points', 'canvas_settings']
+    OUTLINE_FIELDS = ['stroke_svg_path', 'path_svg_path']
+    FREEHAND_TOOLS = [Tools.PEN, Tools.MARKER, Tools.HIGHLIGHTER]
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['page', 'created_at', 'uid'],
+                name='element_page_keyset_idx'
+            ),
+            GistIndex(
+                element_box(),
+                name='element_bounds_gist_idx'
+            ),
+            models.Index(
+                fields=['page'],
+                condition=models.Q(min_x__isnull=True),
+                name='element_unbounded_idx'
+            ),
+            # myElements and the viewport query, matched to their filters
+            # and keyset ordering.
+            models.Index(
+                fields=['page', 'created_at', 'uid'],
+                condition=models.Q(is_hidden=False),
+                name='element_visible_keyset_idx'
+            ),
+            models.Index(
+                fields=['page', 'is_html_element', 'created_at', 'uid'],
+                name='element_html_keyset_idx'
+            ),
+            models.Index(
+                fields=['owner', 'page', 'created_at', 'uid'],
+                name='element_owner_keyset_idx'
+            ),
+            # The hidden element purge.
+            models.Index(
+                fields=['uid'],
+                condition=models.Q(is_hidden=True),
+                name='element_hidden_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.uid}'
 
+    def get_points(self, lod=0):
+        if lod > 0 and self.lod_points is not None:
+            return lod_codec.decode(self.lod_points, lod)
+
+        if self.packed_points is not None:
+            return points_codec.decode(self.packed_points)
+
+        return self.points
+
+    # The stroke as the client sent it, before simplification. Point
+    # indexes such as appendElementPoints' fromIndex count these.
+    def get_raw_points(self):
+        if self.raw_points is not None:
+            return points_codec.decode_raw(self.raw_points)
+
+        return self.get_points()
+
+    def pack_points(self):
+        if self.points is None:
+            return
+
+        self.packed_points = None
+        if settings.ELEMENT_POINTS_FORMAT != 'packed':
+            return
+
+        packed_points = points_codec.encode(self.points)
+        if packed_points is None:
+            return
+
+        self.packed_points = packed_points
+        self.points = None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        changed = set(update_fields if update_fields is not None else self.get_dirty_fields())
+
+        derived = self.update_derived(changed)
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields).union(derived)
+
+        super().save(*args, **kwargs)
+
+    # Rebuilds the columns derived from the `changed` fields and returns
+    # their names. New points are simplified first; LOD levels, bounds and
+    # outlines are built from the simplified points, and packing comes last.
+    def update_derived(self, changed):
+        changed = set(changed)
+        derived = []
+        if self.is_stale:
+            self.is_stale = False
+            changed.add('points')
+            derived.extend(['points', 'is_stale'])
+
+        if 'points' in changed:
+            self.simplify_points()
+            self.update_lod()
+            self.update_bounds()
+            self.update_outline()
+            self.pack_points()
+            derived.extend(['raw_points', 'lod_points', *self.BOUNDS_FIELDS, *self.OUTLINE_FIELDS, 'packed_points'])
+            return derived
+
+        if not changed.isdisjoint(self.GEOMETRY_FIELDS):
+            self.update_bounds()
+            derived.extend(self.BOUNDS_FIELDS)
+
+        if not changed.isdisjoint(self.OUTLINE_SOURCE_FIELDS):
+            self.update_outline()
+            derived.extend(self.OUTLINE_FIELDS)
+
+        return derived
+
+    # Simplifies freehand strokes in place, keeping the stroke as sent in
+    # raw_points. Runs whenever points change, so raw_points always does.
+    def simplify_points(self):
+        self.raw_points = None
+        simplified = simplify.simplify_points(self.tool, self.points)
+        if simplified is not None:
+            self.raw_points = points_codec.encode_raw(self.points)
+            self.points = simplified
+
+    def update_lod(self):
+        points = self.points if self.points is not None else self.get_points()
+        self.lod_points = lod_codec.build(points)
+
+    # Precomputes the perfect-freehand outlines the client would otherwise
+    # build with `getStroke` on every render.
+    def update_outline(self):
+        self.stroke_svg_path = self.path_svg_path = None
+        if self.tool not in self.FREEHAND_TOOLS:
+            return
+
+        points = self.points if self.points is not None else self.get_points()
+        outlines = freehand.element_outlines(points, self.canvas_settings)
+        if outlines is not None:
+            self.stroke_svg_path, self.path_svg_path = outlines
+
+    def update_bounds(self):
+        # Freshly assigned points win over a stale packed copy.
+        bounds = element_bounds(
+            self.points if self.points is not None else self.get_points(),
+            self.dimensions,
+            self.transform,
+            self.canvas_settings,
+            self.is_html_element,
+        )
+        if bounds is None:
+            bounds = [None] * 4
+
+        self.min_x, self.min_y, self.max_x, self.max_y = bounds
 
 
 @receiver(models.signals.post_save, sender=Element)
@@ -299,13 +587,36 @@ def setup_element(sender, instance, created, **kwargs):
         return
 
     element = instance
-    page = element.page
-    page.element_order.append(element.uid)
-    page.save()
+    append_to_order(Page, element.page_id, 'element_order', element.uid)
+
+
+# Elements taken out of a page (e.g. by compaction), with their serialized
+# fields kept so they can be inspected or restored by hand.
+class ArchivedElement(models.Model):
+    uid = models.UUIDField(primary_key=True, editable=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    owner = models.ForeignKey(
+        'users.User',
+        related_name='archived_elements',
+        on_delete=models.CASCADE
+    )
+    page = models.ForeignKey(
+        Page,
+        related_name='archived_elements',
+        on_delete=models.CASCADE
+    )
+    reason = models.IntegerField(
+        choices=ArchiveReasons.choices,
+    )
+    data = models.JSONField()
+
+    def __str__(self):
+        return f'archived {self.uid}'
 
 
 class PaletteCollection(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -326,7 +637,7 @@ class PaletteCollection(models.Model):
 
 
 class Palette(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -358,6 +669,16 @@ class Palette(models.Model):
         default=PaletteTypes.GENERAL
     )
 
+    class Meta:
+        indexes = [
+            # The public side of `owner = ... OR is_public`.
+            models.Index(
+                fields=['uid'],
+                condition=models.Q(is_public=True),
+                name='palette_public_idx'
+            ),
+        ]
+
     def __str__(self):
         return f'{self.title}'
 
@@ -381,8 +702,8 @@ def teardown_palette(sender, instance, **kwargs):
             collection.save()
 
 
-class PaletteSwatch(models.Model):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class PaletteSwatch(Tracked, models.Model):
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
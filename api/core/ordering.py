@@ -0,0 +1,70 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+from django.db.models import F, Func, Value
+from django.utils import timezone
+
+
+# Order arrays are edited in place with a single UPDATE, so concurrent
+# writers never overwrite each other's changes and the rest of the parent
+# row is left alone.
+
+def _order_field(model, field):
+    return model._meta.get_field(field)
+
+
+def append_to_order(model, pk, field, *uids):
+    if len(uids) == 0:
+        return 0
+
+    order_field = _order_field(model, field)
+    if len(uids) == 1:
+        value = Value(uids[0], output_field=order_field.base_field)
+        function = 'array_append'
+    else:
+        value = Value(list(uids), output_field=ArrayField(order_field.base_field))
+        function = 'array_cat'
+
+    return model.objects.filter(pk=pk).update(**{
+        field: Func(F(field), value, function=function, output_field=order_field),
+        'updated_at': timezone.now(),
+    })
+
+
+def remove_from_order(model, pk, field, uid):
+    order_field = _order_field(model, field)
+    return model.objects.filter(pk=pk).update(**{
+        field: Func(
+            F(field),
+            Value(uid, output_field=order_field.base_field),
+            function='array_remove',
+            output_field=order_field,
+        ),
+        'updated_at': timezone.now(),
+    })
+
+
+# Postgres' array_remove takes a single value.
+class ArrayRemoveAll(Func):
+    def as_sql(self, compiler, connection, **extra_context):
+        array_sql, array_params = compiler.compile(self.source_expressions[0])
+        values_sql, values_params = compiler.compile(self.source_expressions[1])
+        sql = (
+            f'ARRAY(SELECT item FROM unnest({array_sql}) WITH ORDINALITY AS t(item, i) '
+            f'WHERE item <> ALL({values_sql}) ORDER BY i)'
+        )
+        return sql, (*array_params, *values_params)
+
+
+def remove_many_from_order(model, pk, field, uids):
+    if len(uids) == 0:
+        return 0
+
+    order_field = _order_field(model, field)
+    return model.objects.filter(pk=pk).update(**{
+        field: ArrayRemoveAll(
+            F(field),
+            Value(list(uids), output_field=ArrayField(order_field.base_field)),
+            output_field=order_field,
+        ),
+        'updated_at': timezone.now(),
+    })
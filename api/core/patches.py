@@ -0,0 +1,196 @@
+import json
+
+from django.db import DataError, connection, transaction
+from django.utils import timezone
+
+from .models import Element
+
+
+PATCHABLE_FIELDS = ['settings', 'transform', 'dimensions', 'canvas_settings']
+
+OPS = ['add', 'replace', 'remove', 'merge']
+
+TRANSLATE_PATHS = [['translate'], ['translate', '0'], ['translate', '1']]
+
+
+def _parse_pointer(pointer):
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise Exception(f'Invalid JSON pointer: {pointer}')
+
+    tokens = [
+        token.replace('~1', '/').replace('~0', '~')
+        for token in pointer[1:].split('/')
+    ]
+    if tokens[0] not in PATCHABLE_FIELDS:
+        raise Exception(f'Field {tokens[0]} cannot be patched.')
+
+    return tokens[0], tokens[1:]
+
+
+# Accepts RFC 6902 `add`/`replace`/`remove` operations whose path starts
+# with the element field, e.g. `/transform/translate/0`, plus `merge`,
+# which shallow-merges an object into the value at `path`. As in RFC 6902,
+# `add` at an array index inserts, and any operation on a path whose
+# parent does not exist fails.
+def parse_operations(operations):
+    if not isinstance(operations, list) or len(operations) == 0:
+        raise Exception('operations must be a non-empty list.')
+
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in OPS:
+            raise Exception(f'Unsupported patch operation: {operation}')
+
+        field, path = _parse_pointer(operation.get('path'))
+        if operation['op'] != 'remove' and 'value' not in operation:
+            raise Exception(f'Patch operation is missing a value: {operation}')
+
+        if operation['op'] == 'remove' and len(path) == 0:
+            raise Exception('Remove the whole field with replace and a null value.')
+
+        if operation['op'] == 'merge' and not isinstance(operation['value'], dict):
+            raise Exception('merge needs an object value.')
+
+        parsed.append((operation['op'], field, path, operation.get('value')))
+
+    return parsed
+
+
+# The SQL function is created by migration 0043. It raises on a path that
+# does not exist, which rolls back the whole patch.
+def _operation_sql(expression, field, op, path, value_column):
+    sql, params = expression
+    return (
+        f'core_jsonb_patch({sql}, %s, %s, %s::text[], {value_column})',
+        params + [op, field, path],
+    )
+
+
+# Folds a field's operations into one nested SQL expression.
+def _field_sql(field, operations):
+    expression = (field, [])
+    for op, path, value_column in operations:
+        expression = _operation_sql(expression, field, op, path, value_column)
+
+    return expression
+
+
+def _is_translate_only(operations):
+    return all(
+        field != 'transform' or (op in ('add', 'replace') and path in TRANSLATE_PATHS)
+        for op, field, path, value in operations
+    )
+
+
+def _shape(operations):
+    return tuple((op, field, tuple(path)) for op, field, path, value in operations)
+
+
+def _patch_group(owner, shape, patches, now):
+    by_field = {}
+    value_columns = []
+    for i, (op, field, path) in enumerate(shape):
+        value_column = f'p.v{i}'
+        value_columns.append(f'v{i}')
+        by_field.setdefault(field, []).append((op, list(path), value_column))
+
+    assignments = []
+    params = []
+    new_expressions = {}
+    for field, operations in by_field.items():
+        expression, expression_params = _field_sql(field, operations)
+        new_expressions[field] = (expression, expression_params)
+        assignments.append(f'{field} = {expression}')
+        params.extend(expression_params)
+
+    geometry = {field for op, field, path in shape}.intersection(Element.GEOMETRY_FIELDS)
+    shape_operations = [(op, field, list(path), None) for op, field, path in shape]
+    shift_bounds = geometry == {'transform'} and _is_translate_only(shape_operations)
+    if shift_bounds:
+        # Translation adds straight onto the bounding box, so the box can be
+        # moved by the difference between the new and old translation.
+        expression, expression_params = new_expressions['transform']
+        for axis, index in (('x', 0), ('y', 1)):
+            delta = (
+                f"(COALESCE(({expression})->'translate'->>{index}, '0')::float"
+                f" - COALESCE(transform->'translate'->>{index}, '0')::float)"
+            )
+            for bound in (f'min_{axis}', f'max_{axis}'):
+                assignments.append(f'{bound} = {bound} + {delta}')
+                params.extend(expression_params)
+
+    assignments.append('updated_at = %s')
+    params.append(now)
+
+    rows = []
+    for uid, operations in patches:
+        rows.append('(' + ', '.join(['%s::uuid'] + ['%s::jsonb'] * len(shape)) + ')')
+        params.append(str(uid))
+        params.extend(
+            json.dumps(value) if op != 'remove' else 'null'
+            for op, field, path, value in operations
+        )
+
+    params.append(owner.pk)
+
+    sql = (
+        f'UPDATE {Element._meta.db_table} SET {", ".join(assignments)} '
+        f'FROM (VALUES {", ".join(rows)}) AS p(uid, {", ".join(value_columns)}) '
+        f'WHERE {Element._meta.db_table}.uid = p.uid AND owner_id = %s '
+        f'RETURNING {Element._meta.db_table}.uid'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        uids = [row[0] for row in cursor.fetchall()]
+
+    if len(geometry) > 0 and not shift_bounds:
+        _refresh_bounds(owner, uids)
+
+    if any(field in Element.OUTLINE_SOURCE_FIELDS for op, field, path in shape):
+        _refresh_outlines(owner, uids)
+
+    return uids
+
+
+def _refresh_bounds(owner, uids):
+    elements = Element.objects \
+        .filter(owner=owner, uid__in=uids) \
+        .only('uid', 'points', 'packed_points', *Element.GEOMETRY_FIELDS)
+
+    for element in elements:
+        element.update_bounds()
+
+    Element.objects.bulk_update(elements, Element.BOUNDS_FIELDS, batch_size=500)
+
+
+def _refresh_outlines(owner, uids):
+    elements = Element.objects \
+        .filter(owner=owner, uid__in=uids, tool__in=Element.FREEHAND_TOOLS) \
+        .only('uid', 'points', 'packed_points', *Element.OUTLINE_SOURCE_FIELDS)
+
+    for element in elements:
+        element.update_outline()
+
+    Element.objects.bulk_update(elements, Element.OUTLINE_FIELDS, batch_size=500)
+
+
+# Applies JSON patches to many elements. Patches with the same operations
+# (ops and paths, not values) are applied together in one UPDATE.
+def patch_elements(owner, patches):
+    now = timezone.now()
+
+    groups = {}
+    for uid, operations in patches:
+        operations = parse_operations(operations)
+        groups.setdefault(_shape(operations), []).append((uid, operations))
+
+    uids = []
+    try:
+        with transaction.atomic():
+            for shape, group in groups.items():
+                uids.extend(_patch_group(owner, shape, group, now))
+    except DataError as e:
+        raise Exception(e.__cause__.diag.message_primary)
+
+    return uids
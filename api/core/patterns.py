@@ -0,0 +1,355 @@
+import functools
+import hashlib
+import io
+import math
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image, ImageDraw
+
+from . import colors
+from .choices import PatternTypes
+
+
+# Bumped whenever the rendering changes, so cached tiles are not reused.
+RENDERER_VERSION = 1
+
+# Spacing is clamped to this, so a cell is never too small to draw.
+MIN_SPACING = 4
+MAX_SPACING = 1000
+
+# Past this many cells in one image, the pattern is filled in as a flat
+# color of the same coverage instead of drawn cell by cell.
+MAX_CELLS = 16384
+
+HEX_RE = re.compile(r'^[0-9a-f]{8}$')
+
+Spec = namedtuple('Spec', ['pattern_type', 'spacing', 'line_size', 'opacity', 'paper', 'color'])
+
+DEFAULT_OPTIONS = {
+    PatternTypes.DOTS: {'spacing': 30, 'lineSize': 3, 'opacity': 50},
+    PatternTypes.SQUARES: {'spacing': 30, 'lineSize': 1, 'opacity': 50},
+    PatternTypes.LINES: {'spacing': 30, 'lineSize': 1, 'opacity': 50},
+    PatternTypes.ISOMETRIC: {'spacing': 30, 'lineSize': 1, 'opacity': 50},
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+# `pattern_options` is keyed by pattern type and only holds what the user
+# changed from the defaults.
+def get_options(pattern_type, pattern_options):
+    options = dict(DEFAULT_OPTIONS.get(pattern_type, {}))
+
+    stored = None
+    if isinstance(pattern_options, dict):
+        stored = pattern_options.get(str(pattern_type))
+
+    if isinstance(stored, dict):
+        options.update({
+            key: value
+            for key, value in stored.items()
+            if key in options and _is_number(value)
+        })
+
+    return options
+
+
+# One repeat of the pattern, as (width, height, shapes). Shapes are
+# `('rect', x, y, width, height, radius)` or
+# `('line', x0, y0, x1, y1, line_width)`. Mirrors the SVG <pattern>s in
+# app/src/components/PagePatterns.
+def get_cell(pattern_type, spacing, line_size):
+    if pattern_type == PatternTypes.DOTS:
+        return spacing, spacing, [
+            ('rect', 0, 0, line_size, line_size, line_size / 2),
+        ]
+
+    if pattern_type == PatternTypes.SQUARES:
+        return spacing, spacing, [
+            ('rect', 0, 0, spacing, line_size, 0),
+            ('rect', 0, 0, line_size, spacing, 0),
+        ]
+
+    if pattern_type == PatternTypes.LINES:
+        return spacing, spacing, [
+            ('rect', 0, spacing - line_size, spacing, line_size, 0),
+        ]
+
+    if pattern_type == PatternTypes.ISOMETRIC:
+        width = spacing * 2
+        edge = line_size / 2
+        return width, spacing, [
+            ('rect', 0, 0, edge, spacing, 0),
+            ('rect', spacing - edge, 0, line_size, spacing, 0),
+            ('rect', width - edge, 0, edge, spacing, 0),
+            ('line', 0, 0, width, spacing, line_size),
+            ('line', 0, spacing, width, 0, line_size),
+        ]
+
+    return None
+
+
+def _draw_shape(draw, shape, x, y, scale, fill):
+    if shape[0] == 'rect':
+        _, sx, sy, width, height, radius = shape
+        x0 = (x + sx) * scale
+        y0 = (y + sy) * scale
+        # Pillow fills both end pixels, so a rect is never thinner than 1px.
+        x1 = max(x0, x0 + width * scale - 1)
+        y1 = max(y0, y0 + height * scale - 1)
+        if radius > 0:
+            draw.rounded_rectangle([x0, y0, x1, y1], radius=radius * scale, fill=fill)
+        else:
+            draw.rectangle([x0, y0, x1, y1], fill=fill)
+    else:
+        _, x0, y0, x1, y1, line_width = shape
+        draw.line(
+            [((x + x0) * scale, (y + y0) * scale), ((x + x1) * scale, (y + y1) * scale)],
+            fill=fill,
+            width=max(1, round(line_width * scale)),
+        )
+
+
+def _area(shape):
+    if shape[0] == 'rect':
+        return shape[3] * shape[4]
+
+    _, x0, y0, x1, y1, line_width = shape
+    return math.hypot(x1 - x0, y1 - y0) * line_width
+
+
+def _svg_color(rgba):
+    return f'rgb({rgba[0]},{rgba[1]},{rgba[2]})', _number(rgba[3] / 255)
+
+
+def _number(value):
+    return f'{value:.3f}'.rstrip('0').rstrip('.')
+
+
+def _hex(rgba):
+    return 'none' if rgba is None else bytes(rgba).hex()
+
+
+def _parse_hex(value):
+    if value == 'none':
+        return None
+
+    if not HEX_RE.match(value):
+        raise ValueError(value)
+
+    return tuple(bytes.fromhex(value))
+
+
+# Everything a pattern tile depends on, with options resolved against the
+# defaults so equal-looking pages share one tile. Returns None for pages
+# without a pattern.
+def get_spec(pattern_type, pattern_options, paper_color, pattern_color):
+    options = get_options(pattern_type, pattern_options)
+    if len(options) == 0:
+        return None
+
+    spec = Spec(
+        int(pattern_type),
+        round(float(max(MIN_SPACING, options['spacing'])), 3),
+        round(float(options['lineSize']), 3),
+        round(float(min(100, max(0, options['opacity']))), 3),
+        colors.to_rgba(paper_color),
+        colors.to_rgba(pattern_color),
+    )
+    return spec if _is_valid(spec) else None
+
+
+def _is_valid(spec):
+    return (
+        spec.pattern_type in DEFAULT_OPTIONS
+        and all(math.isfinite(v) for v in (spec.spacing, spec.line_size, spec.opacity))
+        and MIN_SPACING <= spec.spacing <= MAX_SPACING
+        and 0 <= spec.line_size <= spec.spacing
+        and 0 <= spec.opacity <= 100
+    )
+
+
+def to_string(spec):
+    return '_'.join([
+        str(spec.pattern_type),
+        _number(spec.spacing),
+        _number(spec.line_size),
+        _number(spec.opacity),
+        _hex(spec.paper),
+        _hex(spec.color),
+    ])
+
+
+def parse(value):
+    parts = value.split('_')
+    if len(parts) != 6:
+        return None
+
+    try:
+        spec = Spec(
+            int(parts[0]),
+            float(parts[1]),
+            float(parts[2]),
+            float(parts[3]),
+            _parse_hex(parts[4]),
+            _parse_hex(parts[5]),
+        )
+    except ValueError:
+        return None
+
+    # Only the canonical spelling is accepted, so each tile has one URL.
+    if not _is_valid(spec) or to_string(spec) != value:
+        return None
+
+    return spec
+
+
+def to_url(spec, extension, request=None):
+    url = reverse('pattern', kwargs={'spec': to_string(spec), 'extension': extension})
+    if request is None:
+        return url
+
+    return request.build_absolute_uri(url)
+
+
+def get_key(spec):
+    value = f'{RENDERER_VERSION}:{to_string(spec)}'
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def _svg_shapes(spec, shapes):
+    color, color_opacity = _svg_color(spec.color)
+    body = [
+        f'<g fill="{color}" stroke="{color}" fill-opacity="{color_opacity}" '
+        f'stroke-opacity="{color_opacity}" opacity="{_number(spec.opacity / 100)}">'
+    ]
+    for shape in shapes:
+        if shape[0] == 'rect':
+            _, x, y, w, h, radius = shape
+            rx = f' rx="{_number(radius)}"' if radius > 0 else ''
+            body.append(
+                f'<rect x="{_number(x)}" y="{_number(y)}" width="{_number(w)}" '
+                f'height="{_number(h)}"{rx} stroke="none"/>'
+            )
+        else:
+            _, x0, y0, x1, y1, line_width = shape
+            body.append(
+                f'<path d="M{_number(x0)} {_number(y0)}L{_number(x1)} {_number(y1)}" '
+                f'stroke-width="{_number(line_width)}"/>'
+            )
+    body.append('</g>')
+
+    return ''.join(body)
+
+
+# An SVG <pattern> of the shapes alone, for embedding in other documents.
+def svg_pattern(spec, pattern_id):
+    if spec.color is None:
+        return ''
+
+    width, height, shapes = get_cell(spec.pattern_type, spec.spacing, spec.line_size)
+    return (
+        f'<pattern id="{pattern_id}" x="0" y="0" width="{_number(width)}" '
+        f'height="{_number(height)}" patternUnits="userSpaceOnUse">'
+        f'{_svg_shapes(spec, shapes)}</pattern>'
+    )
+
+
+def render_svg(spec):
+    width, height, shapes = get_cell(spec.pattern_type, spec.spacing, spec.line_size)
+
+    body = []
+    if spec.paper is not None:
+        fill, fill_opacity = _svg_color(spec.paper)
+        body.append(
+            f'<rect width="{_number(width)}" height="{_number(height)}" '
+            f'fill="{fill}" fill-opacity="{fill_opacity}"/>'
+        )
+
+    if spec.color is not None:
+        body.append(_svg_shapes(spec, shapes))
+
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_number(width)}" '
+        f'height="{_number(height)}" viewBox="0 0 {_number(width)} {_number(height)}">'
+        f'{"".join(body)}</svg>'
+    )
+    return svg.encode()
+
+
+# One repeat of the pattern at PATTERN_PNG_SCALE, for use as a repeating
+# background image sized to the cell. Large cells are drawn at a lower
+# density, so no image is over PATTERN_PNG_MAX_SIZE pixels a side.
+def render_png(spec):
+    width, height, shapes = get_cell(spec.pattern_type, spec.spacing, spec.line_size)
+    scale = min(settings.PATTERN_PNG_SCALE, settings.PATTERN_PNG_MAX_SIZE / max(width, height))
+
+    image = Image.new(
+        'RGBA',
+        (max(1, round(width * scale)), max(1, round(height * scale))),
+        spec.paper or (0, 0, 0, 0),
+    )
+    draw(image, 0, 0, image.width / width, spec)
+
+    output = io.BytesIO()
+    image.save(output, 'PNG', optimize=True)
+    return output.getvalue()
+
+
+RENDERERS = {
+    'svg': render_svg,
+    'png': render_png,
+}
+
+
+def _load(value, extension):
+    return RENDERERS[extension](parse(value))
+
+
+# Pattern URLs are served without a login, so anyone can ask for any spec.
+# A tile is one small cell and quick to draw, so nothing is written to
+# disk: the most used tiles are kept in a bounded in-memory LRU, and
+# browsers and proxies cache the rest by URL. Most pages use one of a few
+# default patterns.
+_load_cached = functools.lru_cache(maxsize=settings.PATTERN_CACHE_SIZE)(_load)
+
+
+def get_pattern(value, extension):
+    if extension not in RENDERERS or parse(value) is None:
+        return None
+
+    return _load_cached(value, extension)
+
+
+# Draws the pattern over `image`, whose top left corner is at page
+# coordinates (`left`, `top`) and which is `scale` pixels per page unit.
+def draw(image, left, top, scale, spec):
+    if spec.color is None:
+        return image
+
+    width, height, shapes = get_cell(spec.pattern_type, spec.spacing, spec.line_size)
+
+    layer = Image.new('RGBA', image.size, (0, 0, 0, 0))
+    layer_draw = ImageDraw.Draw(layer)
+    fill = spec.color[:3] + (round(spec.color[3] * spec.opacity / 100),)
+
+    right = left + image.width / scale
+    bottom = top + image.height / scale
+    columns = range(math.floor(left / width), math.ceil(right / width))
+    rows = range(math.floor(top / height), math.ceil(bottom / height))
+    if len(columns) * len(rows) > MAX_CELLS:
+        coverage = min(1, sum(_area(shape) for shape in shapes) / (width * height))
+        layer.paste(fill[:3] + (round(fill[3] * coverage),), (0, 0, *image.size))
+    else:
+        for i in columns:
+            for j in rows:
+                for shape in shapes:
+                    _draw_shape(layer_draw, shape, i * width - left, j * height - top, scale, fill)
+
+    image.alpha_composite(layer)
+    return image
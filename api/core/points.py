@@ -0,0 +1,88 @@
+import json
+import struct
+import zlib
+
+import numpy as np
+
+
+MAGIC = b'FP'
+VERSION = 1
+
+HAS_PRESSURE = 0b1
+
+XY_KEYS = ('x', 'y')
+XY_PRESSURE_KEYS = ('x', 'y', 'pressure')
+
+# Coordinates are stored in 1/100th of a pixel, pressure in 1/1000ths.
+SCALES = np.array([100, 100, 1000], dtype=np.float64)
+
+HEADER = struct.Struct('<2sBBI')
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def encode(points):
+    if not isinstance(points, list) or len(points) == 0:
+        return None
+
+    first = points[0]
+    if not isinstance(first, dict):
+        return None
+
+    has_pressure = 'pressure' in first
+    keys = XY_PRESSURE_KEYS if has_pressure else XY_KEYS
+
+    try:
+        if any(len(point) != len(keys) for point in points):
+            return None
+
+        coords = np.array(
+            [[point[k] for k in keys] for point in points],
+            dtype=np.float64
+        )
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+    if not np.isfinite(coords).all():
+        return None
+
+    quantized = np.rint(coords * SCALES[:len(keys)]).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=0)
+    if np.abs(deltas).max() > INT32_MAX:
+        return None
+
+    flags = HAS_PRESSURE if has_pressure else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, len(points))
+    body = deltas.T.astype('<i4').tobytes()
+
+    return header + zlib.compress(body)
+
+
+def decode(data):
+    data = bytes(data)
+    magic, version, flags, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Unknown packed points format.')
+
+    keys = XY_PRESSURE_KEYS if flags & HAS_PRESSURE else XY_KEYS
+
+    deltas = np.frombuffer(
+        zlib.decompress(data[HEADER.size:]),
+        dtype='<i4'
+    ).reshape(len(keys), count)
+    coords = np.cumsum(deltas, axis=1, dtype=np.int64) / SCALES[:len(keys), None]
+
+    return [dict(zip(keys, row)) for row in coords.T.tolist()]
+
+
+# Lossless storage for strokes that must come back exactly as sent, such
+# as Element.raw_points. Rows written with `encode` are still read.
+def encode_raw(points):
+    return zlib.compress(json.dumps(points, separators=(',', ':')).encode())
+
+
+def decode_raw(data):
+    data = bytes(data)
+    if data[:len(MAGIC)] == MAGIC:
+        return decode(data)
+
+    return json.loads(zlib.decompress(data))
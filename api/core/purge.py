@@ -0,0 +1,101 @@
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from .archive import remove_elements
+from .choices import ArchiveReasons
+from .models import Element, Page
+from .ordering import remove_many_from_order
+
+
+# Attempts at a chunk that keeps hitting the lock timeout before the
+# purge gives up.
+MAX_ATTEMPTS = 3
+
+Chunk = namedtuple('Chunk', ['removed', 'last_uid'])
+
+
+def _purge_chunk(cutoff, after, chunk_size, archive):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL lock_timeout = %s', [f'{settings.PURGE_LOCK_TIMEOUT_MS}ms'])
+
+        # Rows someone else has locked are being written to, so they are
+        # left for a later run. This spans every owner, so it cannot be
+        # pruned to one partition: each chunk merges a scan of
+        # element_hidden_idx from all of them, which only index hidden rows.
+        queryset = Element.objects \
+            .filter(is_hidden=True, updated_at__lt=cutoff) \
+            .select_for_update(skip_locked=True) \
+            .only('uid', 'owner_id', 'page_id') \
+            .order_by('uid')
+        if after is not None:
+            queryset = queryset.filter(uid__gt=after)
+
+        elements = list(queryset[:chunk_size])
+        if len(elements) == 0:
+            return Chunk(0, None)
+
+        uids_by_page = {}
+        for element in elements:
+            uids_by_page.setdefault(element.page_id, []).append(element.uid)
+
+        for page_uid, uids in uids_by_page.items():
+            remove_many_from_order(Page, page_uid, 'element_order', uids)
+
+        uids_by_owner = {}
+        for element in elements:
+            uids_by_owner.setdefault(element.owner_id, []).append(element.uid)
+
+        removed = 0
+        for owner_id, uids in uids_by_owner.items():
+            removed += remove_elements(owner_id, uids, ArchiveReasons.HIDDEN, archive)
+
+    return Chunk(removed, elements[-1].uid)
+
+
+# Removes hidden elements that have not changed for `retention`, in chunks
+# of one transaction each, yielding every chunk as it is done. Each chunk
+# is followed by a sleep long enough to keep the purge busy for only
+# `duty_cycle` of the time. Progress is keyed on uid, so an interrupted run
+# picks up where it left off when given the last uid it reported.
+def purge_hidden_elements(retention=None, chunk_size=None, duty_cycle=None, archive=None, after=None):
+    if retention is None:
+        retention = timedelta(days=settings.PURGE_RETENTION_DAYS)
+    if chunk_size is None:
+        chunk_size = settings.PURGE_CHUNK_SIZE
+    if duty_cycle is None:
+        duty_cycle = settings.PURGE_DUTY_CYCLE
+    if archive is None:
+        archive = settings.PURGE_ARCHIVE
+
+    if not 0 < duty_cycle <= 1:
+        raise Exception('duty_cycle must be greater than 0 and at most 1.')
+
+    cutoff = timezone.now() - retention
+    attempts = 0
+    while True:
+        started = time.monotonic()
+        try:
+            chunk = _purge_chunk(cutoff, after, chunk_size, archive)
+        except OperationalError:
+            # Most likely the lock timeout; back off and try again.
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                raise
+
+            time.sleep((time.monotonic() - started) * (1 - duty_cycle) / duty_cycle)
+            continue
+
+        attempts = 0
+        if chunk.last_uid is None:
+            return
+
+        after = chunk.last_uid
+        yield chunk
+
+        time.sleep((time.monotonic() - started) * (1 - duty_cycle) / duty_cycle)
@@ -0,0 +1,299 @@
+import io
+import math
+import shutil
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.urls import reverse
+from PIL import Image, ImageDraw
+
+from . import blobs, colors, patterns
+from .bounds import base_bounds, overlaps
+from .models import Element
+from .render import (
+    CLEAR,
+    WHITE,
+    canvas_settings_of,
+    get_composition,
+    get_shapes,
+    is_base_layer,
+    order_elements,
+    page_version,
+    swatch_color,
+)
+
+
+TILE_SIZE = 256
+
+# Tiles are drawn this many times larger and scaled down, for antialiasing.
+SUPERSAMPLE = 2
+
+# Bumped whenever the rendering changes, so cached tiles are not reused.
+RENDERER_VERSION = 2
+
+# Zoom level `RASTER_BASE_ZOOM` is one pixel per page unit; every level
+# above doubles it.
+def get_scale(z):
+    return 2.0 ** (z - settings.RASTER_BASE_ZOOM)
+
+
+def is_zoom(z):
+    return 0 <= z <= settings.RASTER_MAX_ZOOM
+
+
+def get_version(page):
+    return page_version(page, f'raster:{RENDERER_VERSION}')
+
+
+def tile_path(uid, version, z, x, y):
+    return Path(settings.RASTER_ROOT) / str(uid) / version / str(z) / f'{x}_{y}.png'
+
+
+# A URL template with `{z}`, `{x}` and `{y}` placeholders.
+def tile_url(page, request=None):
+    url = reverse('page_tile', kwargs={
+        'uid': str(page.uid),
+        'version': get_version(page),
+        'z': '0',
+        'x': '0',
+        'y': '0',
+    })
+    url = url.rsplit('/', 3)[0] + '/{z}/{x}/{y}.png'
+    if request is None:
+        return url
+
+    return request.build_absolute_uri(url)
+
+
+# A polygon mask with the nonzero fill rule, which canvas and SVG use by
+# default. PIL fills even-odd, which leaves holes where a freehand outline
+# crosses itself (e.g. in its round caps). Pixels are in the polygon when
+# their center is.
+def _nonzero_mask(coords, size):
+    width, height = size
+    start = np.asarray(coords, dtype=np.float64)
+    end = np.roll(start, -1, axis=0)
+    edges = start[:, 1] != end[:, 1]
+    start, end = start[edges], end[edges]
+
+    # The rows whose centers each edge crosses.
+    low = np.minimum(start[:, 1], end[:, 1])
+    high = np.maximum(start[:, 1], end[:, 1])
+    first = np.clip(np.ceil(low - 0.5), 0, height).astype(int)
+    last = np.clip(np.ceil(high - 0.5), 0, height).astype(int)
+    counts = last - first
+
+    mask = np.zeros((height, width + 1), dtype=np.int32)
+    if counts.sum() == 0:
+        return Image.new('L', size, 0)
+
+    edge = np.repeat(np.arange(len(start)), counts)
+    rows = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[edge]
+    centers = rows + 0.5
+    x0, y0 = start[edge, 0], start[edge, 1]
+    x1, y1 = end[edge, 0], end[edge, 1]
+    xs = x0 + (centers - y0) * (x1 - x0) / (y1 - y0)
+    winding = np.where(y1 > y0, 1, -1)
+
+    # Every row's crossings add up to zero, so the running total over the
+    # sorted crossings is the winding number to the right of each one.
+    order = np.lexsort((xs, rows))
+    rows, xs, winding = rows[order], xs[order], np.cumsum(winding[order])
+
+    inside = winding[:-1] != 0
+    span_rows = rows[:-1][inside]
+    span_start = np.clip(np.ceil(xs[:-1][inside] - 0.5), 0, width).astype(int)
+    span_end = np.clip(np.ceil(xs[1:][inside] - 0.5), 0, width).astype(int)
+    np.add.at(mask, (span_rows, span_start), 1)
+    np.add.at(mask, (span_rows, span_end), -1)
+
+    filled = np.cumsum(mask, axis=1)[:, :width] > 0
+    return Image.fromarray(filled.astype(np.uint8) * 255, 'L')
+
+
+def _draw_shape(layer, draw, coords, fill, stroke, line_width, closed):
+    xy = [tuple(point) for point in coords]
+    if fill is not None and len(xy) >= 3:
+        # Pasting (rather than compositing) also lets a clear fill punch
+        # a hole.
+        layer.paste(fill, (0, 0), _nonzero_mask(coords, layer.size))
+
+    if stroke is None or line_width <= 0:
+        return
+
+    width = max(1, round(line_width))
+    if closed and len(xy) >= 2:
+        xy = xy + [xy[0]]
+
+    if len(xy) >= 2:
+        draw.line(xy, fill=stroke, width=width, joint='curve')
+
+    if not closed:
+        # Round caps.
+        radius = width / 2
+        for x, y in (xy[0], xy[-1]):
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=stroke)
+
+
+def _blend(canvas, layer, box, composition):
+    if composition == 'destination-out':
+        region = np.asarray(canvas.crop(box), dtype=np.float32)
+        alpha = np.asarray(layer, dtype=np.float32)[..., 3:] / 255
+        region[..., 3:] *= 1 - alpha
+        canvas.paste(Image.fromarray(region.round().astype(np.uint8), 'RGBA'), box[:2])
+        return
+
+    if composition != 'multiply':
+        # Other modes (e.g. the highlighter's `hue`) are drawn normally.
+        canvas.alpha_composite(layer, dest=box[:2])
+        return
+
+    region = np.asarray(canvas.crop(box), dtype=np.float32) / 255
+    source = np.asarray(layer, dtype=np.float32) / 255
+    cb, ab = region[..., :3], region[..., 3:]
+    cs, a_s = source[..., :3], source[..., 3:]
+
+    # Canvas `multiply`: blend the source with the backdrop where it
+    # exists, then composite source-over.
+    mixed = (1 - ab) * cs + ab * cb * cs
+    ao = a_s + ab * (1 - a_s)
+    co = np.where(ao > 0, (a_s * mixed + ab * cb * (1 - a_s)) / np.maximum(ao, 1e-6), 0)
+
+    result = np.concatenate([co, ao], axis=-1) * 255
+    canvas.paste(Image.fromarray(result.round().astype(np.uint8), 'RGBA'), box[:2])
+
+
+def _draw_element(canvas, element, left, top, scale):
+    shapes = get_shapes(element)
+    if len(shapes) == 0:
+        return
+
+    pixel_shapes = []
+    for coords, fill, stroke, line_width, closed in shapes:
+        coords = (coords - [left, top]) * scale
+        pixel_shapes.append((coords, fill, stroke, line_width * scale, closed))
+
+    padding = max(line_width for coords, fill, stroke, line_width, closed in pixel_shapes) + 2
+    all_coords = np.concatenate([coords for coords, *rest in pixel_shapes])
+    x0, y0 = np.floor(all_coords.min(axis=0) - padding).astype(int)
+    x1, y1 = np.ceil(all_coords.max(axis=0) + padding).astype(int)
+    box = (max(0, x0), max(0, y0), min(canvas.width, x1), min(canvas.height, y1))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return
+
+    # Each element is drawn on its own layer, cropped to where it lands on
+    # the tile, and then blended in.
+    layer = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]), CLEAR)
+    draw = ImageDraw.Draw(layer)
+    for coords, fill, stroke, line_width, closed in pixel_shapes:
+        _draw_shape(layer, draw, coords - box[:2], fill, stroke, line_width, closed)
+
+    _blend(canvas, layer, box, get_composition(element, canvas_settings_of(element)))
+
+
+# Draws a cached bitmap stretched over its bounds.
+def _draw_bitmap(canvas, element, left, top, scale):
+    bounds = base_bounds(None, element.dimensions, None)
+    if bounds is None or not blobs.is_key(element.canvas_data_url):
+        return
+
+    path = blobs.blob_path(element.canvas_data_url)
+    if not path.exists():
+        return
+
+    min_x, min_y, max_x, max_y = ((value - offset) * scale for value, offset in zip(bounds, (left, top, left, top)))
+    if max_x <= min_x or max_y <= min_y:
+        return
+
+    box = (
+        max(0, math.floor(min_x)),
+        max(0, math.floor(min_y)),
+        min(canvas.width, math.ceil(max_x)),
+        min(canvas.height, math.ceil(max_y)),
+    )
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return
+
+    with Image.open(path) as bitmap:
+        bitmap = bitmap.convert('RGBA')
+        sx = bitmap.width / (max_x - min_x)
+        sy = bitmap.height / (max_y - min_y)
+        source = (
+            (box[0] - min_x) * sx,
+            (box[1] - min_y) * sy,
+            (box[2] - min_x) * sx,
+            (box[3] - min_y) * sy,
+        )
+        layer = bitmap.resize((box[2] - box[0], box[3] - box[1]), Image.Resampling.BILINEAR, box=source)
+
+    _blend(canvas, layer, box, get_composition(element, canvas_settings_of(element)))
+
+
+# Draws an element onto `canvas`, whose top left corner is at (`left`,
+# `top`) on the page, at `scale` pixels per page unit.
+def draw_element(canvas, element, left, top, scale):
+    if is_base_layer(element):
+        _draw_bitmap(canvas, element, left, top, scale)
+    else:
+        _draw_element(canvas, element, left, top, scale)
+
+
+def render_tile(page, z, x, y):
+    scale = get_scale(z)
+    size = TILE_SIZE * SUPERSAMPLE
+    left = x * TILE_SIZE / scale
+    top = y * TILE_SIZE / scale
+    right = left + TILE_SIZE / scale
+    bottom = top + TILE_SIZE / scale
+
+    paper = colors.to_rgba(swatch_color(page.paper_swatch)) or WHITE
+    image = Image.new('RGBA', (size, size), paper)
+
+    spec = patterns.get_spec(
+        page.pattern_type,
+        page.pattern_options,
+        swatch_color(page.paper_swatch),
+        swatch_color(page.pattern_swatch),
+    )
+    if spec is not None:
+        patterns.draw(image, left, top, scale * SUPERSAMPLE, spec)
+
+    elements = Element.objects \
+        .filter(owner_id=page.owner_id, page=page, is_hidden=False, is_html_element=False) \
+        .filter(overlaps(left, top, right, bottom) | Q(min_x__isnull=True)) \
+        .defer('raw_points', 'lod_points', 'canvas_data_url')
+
+    canvas = Image.new('RGBA', (size, size), CLEAR)
+    for element in order_elements(page, elements):
+        draw_element(canvas, element, left, top, scale * SUPERSAMPLE)
+
+    image.alpha_composite(canvas)
+    image = image.reduce(SUPERSAMPLE)
+
+    output = io.BytesIO()
+    image.save(output, 'PNG', optimize=True)
+    return output.getvalue()
+
+
+def _drop_old_versions(page_dir, version):
+    for path in page_dir.iterdir():
+        if path.name != version:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Renders a tile into the cache, unless it is already there. Tiles of
+# older versions of the page are removed with the first tile of a new one.
+def store_tile(page, version, z, x, y):
+    path = tile_path(page.uid, version, z, x, y)
+    if path.exists():
+        return path
+
+    version_dir = path.parent.parent
+    if not version_dir.exists():
+        version_dir.mkdir(parents=True, exist_ok=True)
+        _drop_old_versions(version_dir.parent, version)
+
+    blobs.write_file(path, render_tile(page, z, x, y))
+    return path
@@ -0,0 +1,244 @@
+import hashlib
+import hmac
+import json
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from . import colors, freehand
+from .bounds import base_bounds, transform_coords
+from .choices import LineEndStyles, Tools
+
+
+LINE_TOOLS = [Tools.PEN, Tools.MARKER, Tools.HIGHLIGHTER]
+
+ELLIPSE_SEGMENTS = 64
+
+WHITE = (255, 255, 255, 255)
+CLEAR = (0, 0, 0, 0)
+
+
+# Compaction bakes erased strokes into a cached bitmap element, marked with
+# this setting, at the start of the page.
+BASE_LAYER_SETTING = 'isBaseLayer'
+
+
+def is_base_layer(element):
+    return (
+        element.tool == Tools.IMAGE
+        and isinstance(element.settings, dict)
+        and element.settings.get(BASE_LAYER_SETTING) is True
+    )
+
+
+def swatch_color(swatch):
+    return swatch.swatch if swatch is not None else None
+
+
+# Loads what page_version needs from the elements along with the pages,
+# so listing page versions does not cost a query per page.
+def with_element_stats(queryset):
+    return queryset.annotate(
+        element_count=Count('elements'),
+        elements_updated_at=Max('elements__updated_at'),
+    )
+
+
+def _element_stats(page):
+    if hasattr(page, 'element_count'):
+        return {'count': page.element_count, 'updated_at': page.elements_updated_at}
+
+    return page.elements.aggregate(count=Count('uid'), updated_at=Max('updated_at'))
+
+
+# Changes whenever anything drawn on the page does. It is signed with the
+# secret key, so a URL carrying it is only known to whoever can read the
+# page. `renderer` keeps versions of different outputs apart.
+def page_version(page, renderer):
+    elements = _element_stats(page)
+    content = json.dumps([
+        renderer,
+        str(page.uid),
+        [str(uid) for uid in page.element_order],
+        page.pattern_type,
+        page.pattern_options,
+        swatch_color(page.paper_swatch),
+        swatch_color(page.pattern_swatch),
+        elements['count'],
+        elements['updated_at'].isoformat() if elements['updated_at'] else None,
+    ], sort_keys=True)
+
+    return hmac.new(settings.SECRET_KEY.encode(), content.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def order_elements(page, elements):
+    order = {uid: i for i, uid in enumerate(page.element_order)}
+    return sorted(elements, key=lambda element: (order.get(element.uid, len(order)), element.created_at))
+
+
+def _number(value, default):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        return value
+
+    return default
+
+
+def get_composition(element, canvas_settings):
+    composition = canvas_settings.get('composition')
+    if isinstance(composition, str):
+        return composition
+
+    if element.tool in (Tools.ERASER, Tools.CLEAR_ALL):
+        return 'destination-out'
+
+    if element.tool == Tools.MARKER:
+        return 'multiply'
+
+    return 'source-over'
+
+
+def _coords(points):
+    try:
+        coords = np.array([[point['x'], point['y']] for point in points], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if len(coords) == 0 or not np.isfinite(coords).all():
+        return None
+
+    return coords
+
+
+def _pairs(value):
+    try:
+        coords = np.array([pair[:2] for pair in value], dtype=np.float64)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+    if coords.ndim != 2 or len(coords) == 0 or not np.isfinite(coords).all():
+        return None
+
+    return coords
+
+
+def _ellipse(min_x, min_y, max_x, max_y):
+    angles = np.linspace(0, 2 * math.pi, ELLIPSE_SEGMENTS, endpoint=False)
+    return np.column_stack([
+        (min_x + max_x) / 2 + np.cos(angles) * (max_x - min_x) / 2,
+        (min_y + max_y) / 2 + np.sin(angles) * (max_y - min_y) / 2,
+    ])
+
+
+def _rectangle(min_x, min_y, max_x, max_y):
+    return np.array([[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]])
+
+
+# Returns the element as a list of (coords, fill, stroke, line_width,
+# closed) shapes in page coordinates, drawn in order.
+def _element_shapes(element, points, canvas_settings):
+    opacity = _number(canvas_settings.get('opacity'), 1)
+    stroke = colors.to_rgba(canvas_settings.get('strokeColor'), opacity)
+    fill = colors.to_rgba(canvas_settings.get('fillColor'), opacity)
+    line_size = _number(canvas_settings.get('lineSize'), 1)
+    element_settings = element.settings if isinstance(element.settings, dict) else {}
+
+    coords = _coords(points) if isinstance(points, list) else None
+
+    if element.tool in LINE_TOOLS:
+        smooth = canvas_settings.get('smoothPoints')
+        outlines = None
+        if isinstance(smooth, dict):
+            outlines = _pairs(smooth.get('stroke') or []), _pairs(smooth.get('path') or [])
+        elif isinstance(points, list):
+            # Built from the freehand options when the client did not send
+            # the outline.
+            outlines = freehand.outline_points(points, canvas_settings)
+
+        if outlines is not None:
+            outline, path = (part if part is None or len(part) > 0 else None for part in outlines)
+            shapes = []
+            if outline is not None and stroke is not None:
+                shapes.append((outline, stroke, None, 0, True))
+            if path is not None:
+                # A transparent fill punches the inside out of the stroke.
+                shapes.append((path, fill or CLEAR, None, 0, True))
+            return shapes
+
+        if coords is None or stroke is None:
+            return []
+
+        return [(coords, None, stroke, line_size, False)]
+
+    if coords is None:
+        return []
+
+    min_x, min_y = coords.min(axis=0)
+    max_x, max_y = coords.max(axis=0)
+
+    if element.tool == Tools.CIRCLE:
+        return [(_ellipse(min_x, min_y, max_x, max_y), fill, stroke, line_size, True)]
+
+    if element.tool == Tools.RECTANGLE:
+        return [(_rectangle(min_x, min_y, max_x, max_y), fill, stroke, line_size, True)]
+
+    if element.tool == Tools.TRIANGLE and len(coords) >= 3:
+        return [(coords[:3], fill, stroke, line_size, True)]
+
+    if element.tool == Tools.LINE and len(coords) >= 2:
+        shapes = []
+        # Drawn twice, like the client: a wider stroke, then the fill on top.
+        for color, width in ((stroke, line_size * 1.5), (fill, line_size)):
+            if color is None:
+                continue
+
+            shapes.append((coords[[0, -1]], None, color, width, False))
+            style = element_settings.get('lineEndStyle')
+            if style == LineEndStyles.ARROW:
+                for i in range(len(coords) - 2, 0, -1):
+                    target = coords[0] if len(coords) > 4 and i <= 2 else coords[-1]
+                    shapes.append((np.array([target, coords[i]]), None, color, width, False))
+            elif style in (LineEndStyles.SQUARE, LineEndStyles.CIRCLE):
+                for i in range(1, len(coords) - 1, 2):
+                    (x0, y0), (x1, y1) = coords[i], coords[i + 1]
+                    if style == LineEndStyles.SQUARE:
+                        end = _rectangle(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+                    else:
+                        radius = math.hypot(x1 - x0, y1 - y0) / 2
+                        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+                        end = _ellipse(cx - radius, cy - radius, cx + radius, cy + radius)
+                    shapes.append((end, color, None, 0, True))
+        return shapes
+
+    if element.tool == Tools.BLOB:
+        return [(coords, fill, stroke or fill, line_size, True)]
+
+    if element.tool == Tools.ERASER:
+        return [(coords, None, WHITE, line_size, False)]
+
+    if element.tool == Tools.CUT and element_settings.get('isCompletedCut'):
+        return [(coords, WHITE, None, 0, True)]
+
+    return []
+
+
+def canvas_settings_of(element):
+    return element.canvas_settings if isinstance(element.canvas_settings, dict) else {}
+
+
+# The element's shapes in page coordinates, with its transform applied.
+def get_shapes(element, points=None):
+    canvas_settings = canvas_settings_of(element)
+    if points is None:
+        points = element.get_points()
+
+    shapes = _element_shapes(element, points, canvas_settings)
+    bounds = base_bounds(points, element.dimensions, canvas_settings)
+    if bounds is None:
+        return shapes
+
+    return [
+        (transform_coords(coords, element.transform, bounds), fill, stroke, line_width, closed)
+        for coords, fill, stroke, line_width, closed in shapes
+    ]
@@ -1,13 +1,30 @@
 import graphene
+import numpy as np
 from django.db.models import Q
+from graphene.utils.str_converters import to_snake_case
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLInt
+from graphql.utilities import value_from_ast
+
+from api.loaders import get_loader
+from api.optimizer import Optimized, OptimizedConnectionField, collect_node_fields, get_nested_info, is_prefetched
+from api.pagination import KeysetConnectionField
+from api.permissions import IsOwner, IsOwnerOrPublic, login_required
+from . import blobs, export, patterns, raster
+from .bounds import overlaps
+from .compaction import mark_for_compaction
+from .ingest import append_element_points, batch_save_elements
+from .patches import patch_elements
+from .render import with_element_stats
+from .simplify import rdp_mask
+from .models import Palette, PaletteCollection, PaletteSwatch, Room, Bookshelf, Notebook, Page, PageSession, Element
+from .ordering import append_to_order, remove_from_order
+
+
+class RoomNode(Optimized, IsOwner, DjangoObjectType):
+    bookshelves = OptimizedConnectionField(lambda: BookshelfNode, required=True)
 
-from api.permissions import IsOwner, login_required
-from .models import Palette, PaletteCollection, PaletteSwatch, Room, Bookshelf, Notebook, Page, Element
-
-
-class RoomNode(IsOwner, DjangoObjectType):
     class Meta:
         model = Room
         filter_fields = ['uid']
@@ -15,7 +32,9 @@ class RoomNode(IsOwner, DjangoObjectType):
         convert_choices_to_enum = False
 
 
-class BookshelfNode(IsOwner, DjangoObjectType):
+class BookshelfNode(Optimized, IsOwner, DjangoObjectType):
+    notebooks = OptimizedConnectionField(lambda: NotebookNode, required=True)
+
     class Meta:
         model = Bookshelf
         filter_fields = ['uid', 'room']
@@ -23,7 +42,9 @@ class BookshelfNode(IsOwner, DjangoObjectType):
         convert_choices_to_enum = False
 
 
-class NotebookNode(IsOwner, DjangoObjectType):
+class NotebookNode(Optimized, IsOwner, DjangoObjectType):
+    pages = OptimizedConnectionField(lambda: PageNode, required=True)
+
     class Meta:
         model = Notebook
         filter_fields = ['uid', 'bookshelf']
@@ -31,15 +52,134 @@ class NotebookNode(IsOwner, DjangoObjectType):
         convert_choices_to_enum = False
 
 
-class PageNode(IsOwner, DjangoObjectType):
+def session_field(field_type, name):
+    def resolve(page, info):
+        return getattr(page.get_session(), name)
+
+    return field_type(required=True, resolver=resolve)
+
+
+class PageNode(Optimized, IsOwner, DjangoObjectType):
+    elements = OptimizedConnectionField(lambda: ElementNode, required=True)
+
+    # Toolbar state now lives on PageSession; kept here for older clients.
+    selected_tool = session_field(graphene.Int, 'selected_tool')
+    selected_tool_size = session_field(graphene.Int, 'selected_tool_size')
+    selected_line_end_style = session_field(graphene.Int, 'selected_line_end_style')
+    selected_line_end_side = session_field(graphene.Int, 'selected_line_end_side')
+    is_debug_mode = session_field(graphene.Boolean, 'is_debug_mode')
+    is_paste_mode = session_field(graphene.Boolean, 'is_paste_mode')
+    is_add_image_mode = session_field(graphene.Boolean, 'is_add_image_mode')
+    is_interactive_edit_mode = session_field(graphene.Boolean, 'is_interactive_edit_mode')
+    is_textbox_edit_mode = session_field(graphene.Boolean, 'is_textbox_edit_mode')
+    is_ruler_mode = session_field(graphene.Boolean, 'is_ruler_mode')
+
+    tile_url = graphene.String(
+        required=True,
+        description='URL template of the rendered page tiles, with {z}, {x} and {y} placeholders.'
+    )
+
+    pattern_url = graphene.String(
+        format=graphene.String(default_value='svg', description='svg or png.'),
+        description='URL of one repeat of the page background, or null for solid pages.'
+    )
+
+    svg = graphene.String(required=True, description='The page rendered as an SVG document.')
+    svg_url = graphene.String(required=True, description='URL of the page rendered as SVG.')
+
+    field_dependencies = {
+        **{name: ['session'] for name in PageSession.FIELDS},
+        'tile_url': ['element_order', 'pattern_type', 'pattern_options', 'paper_swatch', 'pattern_swatch'],
+        'pattern_url': ['pattern_type', 'pattern_options', 'paper_swatch', 'pattern_swatch'],
+        'svg': ['element_order', 'pattern_type', 'pattern_options', 'paper_swatch', 'pattern_swatch'],
+        'svg_url': ['element_order', 'pattern_type', 'pattern_options', 'paper_swatch', 'pattern_swatch'],
+    }
+
+    # Fields resolved from the page version.
+    versioned_fields = ['tile_url', 'svg', 'svg_url']
+
     class Meta:
         model = Page
         filter_fields = ['uid', 'notebook']
+        exclude = ['needs_compaction']
         interfaces = (graphene.relay.Node, )
         convert_choices_to_enum = False
 
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        queryset = super().get_queryset(queryset, info)
+        if is_prefetched(queryset):
+            return queryset
+
+        fields = [to_snake_case(name) for name in collect_node_fields(info)]
+        if not set(fields).isdisjoint(cls.versioned_fields):
+            queryset = with_element_stats(queryset)
+
+        return queryset
+
+    def resolve_canvas_data_url(self, info):
+        return blobs.to_url(self.canvas_data_url, info.context)
+
+    def resolve_tile_url(self, info):
+        return raster.tile_url(self, info.context)
+
+    def resolve_svg(self, info):
+        return export.get_svg(self)
+
+    def resolve_svg_url(self, info):
+        return export.export_url(self, info.context)
+
+    def resolve_pattern_url(self, info, format='svg'):
+        if format not in patterns.RENDERERS:
+            raise Exception(f'Unsupported pattern format: {format}')
+
+        spec = patterns.get_spec(
+            self.pattern_type,
+            self.pattern_options,
+            self.paper_swatch.swatch if self.paper_swatch_id else None,
+            self.pattern_swatch.swatch if self.pattern_swatch_id else None,
+        )
+        if spec is None:
+            return None
+
+        return patterns.to_url(spec, format, info.context)
+
+
+class PageSessionNode(Optimized, IsOwner, DjangoObjectType):
+    class Meta:
+        model = PageSession
+        filter_fields = ['page']
+        interfaces = (graphene.relay.Node, )
+        convert_choices_to_enum = False
+
+
+def points_dependencies(info, field_nodes):
+    # Only read the LOD column when every selection asks for a LOD level.
+    # Every row stores one, so the points columns are never needed then.
+    for field_node in field_nodes:
+        arguments = {
+            argument.name.value: value_from_ast(argument.value, GraphQLInt, info.variable_values)
+            for argument in field_node.arguments
+            if argument.name.value == 'lod'
+        }
+        if not arguments.get('lod'):
+            return ['points', 'packed_points']
+
+    return ['lod_points']
+
+
+class ElementNode(Optimized, IsOwner, DjangoObjectType):
+    points = graphene.JSONString(
+        required=True,
+        lod=graphene.Int(description='0 for full resolution, 1 for 1/4 and 2 for 1/16 of the points.'),
+        tolerance=graphene.Float(description='Simplify the returned points to this tolerance in pixels.'),
+    )
+
+    field_dependencies = {
+        'points': points_dependencies,
+    }
+    keyset_ordering = ('page_id', 'created_at', 'uid')
 
-class ElementNode(IsOwner, DjangoObjectType):
     class Meta:
         model = Element
         filter_fields = {
@@ -48,11 +188,26 @@ class ElementNode(IsOwner, DjangoObjectType):
             'is_html_element': ['exact'],
             'is_hidden': ['exact'],
         }
+        exclude = ['packed_points', 'raw_points', 'lod_points']
         interfaces = (graphene.relay.Node, )
         convert_choices_to_enum = False
 
+    def resolve_points(self, info, lod=0, tolerance=None):
+        points = self.get_points(lod=lod or 0)
+        if tolerance is None or not isinstance(points, list) or len(points) < 3:
+            return points
+
+        coords = np.array([[point['x'], point['y']] for point in points], dtype=np.float64)
+        keep = rdp_mask(coords, tolerance)
+        return [point for point, kept in zip(points, keep.tolist()) if kept]
+
+    def resolve_canvas_data_url(self, info):
+        return blobs.to_url(self.canvas_data_url, info.context)
+
+
+class PaletteCollectionNode(Optimized, IsOwner, DjangoObjectType):
+    palettes = OptimizedConnectionField(lambda: PaletteNode, required=True)
 
-class PaletteCollectionNode(IsOwner, DjangoObjectType):
     class Meta:
         model = PaletteCollection
         filter_fields = ['uid']
@@ -60,29 +215,26 @@ class PaletteCollectionNode(IsOwner, DjangoObjectType):
         convert_choices_to_enum = False
 
 
-class PaletteNode(DjangoObjectType):
+class PaletteNode(Optimized, IsOwnerOrPublic, DjangoObjectType):
+    collections = OptimizedConnectionField(PaletteCollectionNode, required=True)
+    swatches = OptimizedConnectionField(lambda: PaletteSwatchNode, required=True)
+
     class Meta:
         model = Palette
         filter_fields = ['uid']
         interfaces = (graphene.relay.Node, )
         convert_choices_to_enum = False
 
-    @classmethod
-    def get_queryset(cls, queryset, info):
-        return queryset.filter(Q(owner=info.context.user) | Q(is_public=True))
 
+class PaletteSwatchNode(Optimized, IsOwnerOrPublic, DjangoObjectType):
+    public_lookup = 'palette__is_public'
 
-class PaletteSwatchNode(DjangoObjectType):
     class Meta:
         model = PaletteSwatch
         filter_fields = ['uid']
         interfaces = (graphene.relay.Node, )
         convert_choices_to_enum = False
 
-    @classmethod
-    def get_queryset(cls, queryset, info):
-        return queryset.filter(Q(owner=info.context.user) | Q(palette__is_public=True))
-
 class CreateRoom(graphene.relay.ClientIDMutation):
     room = graphene.Field(RoomNode)
 
@@ -175,13 +327,11 @@ class UpdateNotebook(graphene.relay.ClientIDMutation):
                 continue
 
             if k == 'bookshelf_uid':
-                current_shelf = notebook.bookshelf
-                current_shelf.notebook_order.remove(notebook.uid)
-                current_shelf.save()
-
                 new_bookshelf = Bookshelf.objects.get(uid=v)
-                new_bookshelf.notebook_order.append(notebook.uid)
-                new_bookshelf.save()
+                remove_from_order(Bookshelf, notebook.bookshelf_id, 'notebook_order', notebook.uid)
+                append_to_order(Bookshelf, new_bookshelf.uid, 'notebook_order', notebook.uid)
+
+                new_bookshelf.refresh_from_db(fields=['notebook_order', 'updated_at'])
                 notebook.bookshelf = new_bookshelf
                 continue
 
@@ -239,11 +389,16 @@ class CreatePage(graphene.relay.ClientIDMutation):
             owner=info.context.user,
             notebook=notebook,
         )
+        session = page.get_session()
 
         for k, v in input.items():
             if k == 'notebook_uid':
                 continue
 
+            if k in PageSession.FIELDS:
+                setattr(session, k, v)
+                continue
+
             if k == 'paper_swatch_uid':
                 page.paper_swatch = PaletteSwatch.objects.get(uid=v)
                 continue
@@ -263,6 +418,7 @@ class CreatePage(graphene.relay.ClientIDMutation):
             setattr(page, k, v)
 
         page.save()
+        session.save()
 
         return CreatePage(page=page)
 
@@ -295,45 +451,79 @@ class UpdatePage(graphene.relay.ClientIDMutation):
     @classmethod
     @login_required
     def mutate_and_get_payload(cls, root, info, **input):
-        page = Page.objects.get(uid=input['uid'])
-
+        page = Page.objects.select_related('session').get(uid=input['uid'])
+
+        # Toolbar state is routed to the page's session, so toggles from
+        # older clients no longer rewrite the page row.
+        session_fields = {k: v for k, v in input.items() if k in PageSession.FIELDS}
+        if len(session_fields) > 0:
+            session = page.get_session()
+            for k, v in session_fields.items():
+                setattr(session, k, v)
+            session.save()
+
+        fields = {}
         for k, v in input.items():
-            if k == 'uid':
-                continue
-
             if k == 'notebook_uid':
-                current_notebook = page.notebook
-                current_notebook.page_order.remove(page.uid)
-                current_notebook.save()
-
                 new_notebook = Notebook.objects.get(uid=v)
-                new_notebook.page_order.append(page.uid)
-                new_notebook.save()
+                remove_from_order(Notebook, page.notebook_id, 'page_order', page.uid)
+                append_to_order(Notebook, new_notebook.uid, 'page_order', page.uid)
 
+                new_notebook.refresh_from_db(fields=['page_order', 'updated_at'])
                 page.notebook = new_notebook
+                page.save(update_fields=['notebook', 'updated_at'])
                 continue
 
-            if k == 'paper_swatch_uid':
-                page.paper_swatch = PaletteSwatch.objects.get(uid=v)
+            if k in ['paper_swatch_uid', 'pattern_swatch_uid', 'fill_swatch_uid', 'stroke_swatch_uid']:
+                swatch = PaletteSwatch.objects.only('uid').get(uid=v)
+                fields[k.replace('_uid', '_id')] = swatch.uid
                 continue
 
-            if k == 'pattern_swatch_uid':
-                page.pattern_swatch = PaletteSwatch.objects.get(uid=v)
+            if k == 'canvas_data_url':
+                fields[k] = blobs.to_key(v)
                 continue
 
-            if k == 'fill_swatch_uid':
-                page.fill_swatch = PaletteSwatch.objects.get(uid=v)
-                continue
+            if k in ['pattern_type', 'pattern_options']:
+                fields[k] = v
 
-            if k == 'stroke_swatch_uid':
-                page.stroke_swatch = PaletteSwatch.objects.get(uid=v)
-                continue
+        # Only the changed columns are written.
+        if len(fields) > 0:
+            for k, v in fields.items():
+                setattr(page, k, v)
+            page.save()
 
-            setattr(page, k, v)
+        return UpdatePage(page=page)
 
-        page.save()
 
-        return UpdatePage(page=page)
+class UpdatePageSession(graphene.relay.ClientIDMutation):
+    class Input:
+        page_uid = graphene.UUID(required=True)
+        selected_tool = graphene.Int(required=False)
+        selected_tool_size = graphene.Int(required=False)
+        selected_line_end_style = graphene.Int(required=False)
+        selected_line_end_side = graphene.Int(required=False)
+        is_debug_mode = graphene.Boolean(required=False)
+        is_paste_mode = graphene.Boolean(required=False)
+        is_add_image_mode = graphene.Boolean(required=False)
+        is_interactive_edit_mode = graphene.Boolean(required=False)
+        is_textbox_edit_mode = graphene.Boolean(required=False)
+        is_ruler_mode = graphene.Boolean(required=False)
+
+    page_session = graphene.Field(PageSessionNode)
+
+    @classmethod
+    @login_required
+    def mutate_and_get_payload(cls, root, info, **input):
+        session = PageSession.objects.get(
+            page_id=input['page_uid'],
+            owner=info.context.user,
+        )
+        for k, v in input.items():
+            if k in PageSession.FIELDS:
+                setattr(session, k, v)
+        session.save()
+
+        return UpdatePageSession(page_session=session)
 
 
 class DeletePage(graphene.relay.ClientIDMutation):
@@ -356,37 +546,33 @@ class BatchSaveElements(graphene.relay.ClientIDMutation):
         elements = graphene.List(graphene.JSONString, required=True)
 
     elements = graphene.List(ElementNode)
+    compacted_uids = graphene.List(
+        graphene.UUID,
+        description='Elements that were not saved because page compaction removed them.'
+    )
 
     @classmethod
     @login_required
     def mutate_and_get_payload(cls, root, info, **input):
-        elements = []
-        for input_element in input['elements']:
-            element_uid = input_element.get('uid', None)
-            if element_uid is not None:
-                element = Element.objects.get(uid=element_uid)
-            else:
-                page = Page.objects.get(uid=input_element['page_uid'])
-                element = Element.objects.create(
-                    owner=info.context.user,
-                    page=page,
-                    tool=input_element['tool'],
-                    points=input_element['points'],
-                )
-
-            for k, v in input_element.items():
-                if k == 'uid':
-                    continue
-
-                if k == 'page_uid':
-                    continue
-
-                setattr(element, k, v)
-
-            element.save()
-            elements.append(element)
-
-        return BatchSaveElements(elements=elements)
+        elements = batch_save_elements(info.context.user, input['elements'])
+
+        saved = {element.uid for element in elements}
+        compacted_uids = [
+            element['uid']
+            for element in input['elements']
+            if element.get('uid') is not None and Element._meta.pk.to_python(element['uid']) not in saved
+        ]
+
+        page_uids = [element.page_id for element in elements]
+        pages = get_loader(info, PageNode).load_many(
+            page_uids,
+            get_nested_info(info, 'elements', 'page')
+        )
+        for element, page in zip(elements, pages):
+            if page is not None:
+                element.page = page
+
+        return BatchSaveElements(elements=elements, compacted_uids=compacted_uids)
 
 class CreateElement(graphene.relay.ClientIDMutation):
     class Input:
@@ -428,10 +614,86 @@ class CreateElement(graphene.relay.ClientIDMutation):
             setattr(element, k, v)
 
         element.save()
+        mark_for_compaction([page.uid])
 
         return CreateElement(element=element)
 
 
+class AppendElementPoints(graphene.relay.ClientIDMutation):
+    class Input:
+        uid = graphene.UUID(required=True)
+        points = graphene.JSONString(required=True)
+        from_index = graphene.Int(required=True)
+        is_final = graphene.Boolean(required=False)
+
+    uid = graphene.UUID()
+    points_count = graphene.Int()
+    element = graphene.Field(ElementNode)
+
+    @classmethod
+    @login_required
+    def mutate_and_get_payload(cls, root, info, **input):
+        points_count = append_element_points(
+            info.context.user,
+            input['uid'],
+            input['points'],
+            input['from_index'],
+            input.get('is_final', False),
+        )
+
+        return AppendElementPoints(uid=input['uid'], points_count=points_count)
+
+    def resolve_element(self, info):
+        return get_loader(info, ElementNode).load(self.uid, info)
+
+
+class PatchElement(graphene.relay.ClientIDMutation):
+    class Input:
+        uid = graphene.UUID(required=True)
+        operations = graphene.JSONString(required=True)
+
+    uid = graphene.UUID()
+    element = graphene.Field(ElementNode)
+
+    @classmethod
+    @login_required
+    def mutate_and_get_payload(cls, root, info, **input):
+        uids = patch_elements(info.context.user, [(input['uid'], input['operations'])])
+        if len(uids) == 0:
+            raise Element.DoesNotExist(f'Element {input["uid"]} does not exist.')
+
+        return PatchElement(uid=input['uid'])
+
+    def resolve_element(self, info):
+        return get_loader(info, ElementNode).load(self.uid, info)
+
+
+class ElementPatch(graphene.InputObjectType):
+    uid = graphene.UUID(required=True)
+    operations = graphene.JSONString(required=True)
+
+
+class PatchElements(graphene.relay.ClientIDMutation):
+    class Input:
+        patches = graphene.List(graphene.NonNull(ElementPatch), required=True)
+
+    uids = graphene.List(graphene.UUID)
+    elements = graphene.List(ElementNode)
+
+    @classmethod
+    @login_required
+    def mutate_and_get_payload(cls, root, info, **input):
+        uids = patch_elements(
+            info.context.user,
+            [(patch.uid, patch.operations) for patch in input['patches']],
+        )
+
+        return PatchElements(uids=uids)
+
+    def resolve_elements(self, info):
+        return get_loader(info, ElementNode).load_many(self.uids, info)
+
+
 class UpdateElement(graphene.relay.ClientIDMutation):
     class Input:
         uid = graphene.UUID(required=True)
@@ -453,21 +715,18 @@ class UpdateElement(graphene.relay.ClientIDMutation):
     @classmethod
     @login_required
     def mutate_and_get_payload(cls, root, info, **input):
-        element = Element.objects.get(uid=input['uid'])
+        element = Element.objects.get(uid=input['uid'], owner=info.context.user)
 
         for k, v in input.items():
             if k == 'uid':
                 continue
 
             if k == 'page_uid':
-                current_page = element.page
-                current_page.element_order.remove(element.uid)
-                current_page.save()
-
                 new_page = Page.objects.get(uid=v)
-                new_page.element_order.append(element.uid)
-                new_page.save()
+                remove_from_order(Page, element.page_id, 'element_order', element.uid)
+                append_to_order(Page, new_page.uid, 'element_order', element.uid)
 
+                new_page.refresh_from_db(fields=['element_order', 'updated_at'])
                 element.page = new_page
                 continue
 
@@ -487,7 +746,7 @@ class DeleteElement(graphene.relay.ClientIDMutation):
     @classmethod
     @login_required
     def mutate_and_get_payload(cls, root, info, **input):
-        element = Element.objects.get(uid=input['uid'])
+        element = Element.objects.get(uid=input['uid'], owner=info.context.user)
         element['is_hidden'] = True
         element.save()
 
@@ -604,15 +863,14 @@ class UpdatePaletteSwatch(graphene.relay.ClientIDMutation):
     def mutate_and_get_payload(cls, root, info, **input):
         swatch = PaletteSwatch.objects.get(uid=input['uid'])
 
-        if swatch.owner != info.context.user:
+        if swatch.owner_id != info.context.user.pk:
             raise Exception('You do not have permission to update this palette.')
 
-        for k, v in input.items():
-            if k == 'uid':
-                continue
-            setattr(swatch, k, v)
-
-        swatch.save()
+        # Color picker drags arrive every ~100ms; each is a narrow UPDATE of
+        # the swatch column.
+        if 'swatch' in input:
+            swatch.swatch = input['swatch']
+            swatch.save()
 
         return UpdatePaletteSwatch(swatch=swatch)
 
@@ -636,6 +894,13 @@ class DeletePaletteSwatch(graphene.relay.ClientIDMutation):
         return DeletePaletteSwatch(swatch=swatch)
 
 
+class ViewportRect(graphene.InputObjectType):
+    min_x = graphene.Float(required=True)
+    min_y = graphene.Float(required=True)
+    max_x = graphene.Float(required=True)
+    max_y = graphene.Float(required=True)
+
+
 class CoreQuery(graphene.ObjectType):
     room = graphene.relay.Node.Field(RoomNode)
     my_rooms = DjangoFilterConnectionField(RoomNode)
@@ -648,9 +913,16 @@ class CoreQuery(graphene.ObjectType):
 
     page = graphene.relay.Node.Field(PageNode)
     my_pages = DjangoFilterConnectionField(PageNode)
+    page_session = graphene.relay.Node.Field(PageSessionNode)
 
     element = graphene.relay.Node.Field(ElementNode)
-    my_elements = DjangoFilterConnectionField(ElementNode)
+    my_elements = KeysetConnectionField(ElementNode)
+    elements_in_viewport = graphene.List(
+        graphene.NonNull(ElementNode),
+        required=True,
+        page_uid=graphene.UUID(required=True),
+        rect=ViewportRect(required=True),
+    )
 
     palette_collection = graphene.relay.Node.Field(PaletteCollectionNode)
     my_palette_collection = DjangoFilterConnectionField(PaletteCollectionNode)
@@ -661,6 +933,18 @@ class CoreQuery(graphene.ObjectType):
     palette_swatch = graphene.relay.Node.Field(PaletteSwatchNode)
     my_palette_swatchs = DjangoFilterConnectionField(PaletteSwatchNode)
 
+    def resolve_elements_in_viewport(self, info, page_uid, rect):
+        # Elements without a bounding box (HTML elements, empty strokes)
+        # are always returned, as their extent is only known client-side.
+        # ElementNode.get_queryset scopes this to the user, which keeps it
+        # to one partition.
+        queryset = Element.objects \
+            .filter(page__uid=page_uid, is_hidden=False) \
+            .filter(overlaps(rect.min_x, rect.min_y, rect.max_x, rect.max_y) | Q(min_x__isnull=True)) \
+            .order_by('created_at', 'uid')
+
+        return ElementNode.get_queryset(queryset, info)
+
 
 class CoreMutation(graphene.ObjectType):
     # create_room = CreateRoom.Field()
@@ -674,10 +958,14 @@ class CoreMutation(graphene.ObjectType):
 
     create_page = CreatePage.Field()
     update_page = UpdatePage.Field()
+    update_page_session = UpdatePageSession.Field()
     delete_page = DeletePage.Field()
 
     create_element = CreateElement.Field()
     update_element = UpdateElement.Field()
+    append_element_points = AppendElementPoints.Field()
+    patch_element = PatchElement.Field()
+    patch_elements = PatchElements.Field()
     delete_element = DeleteElement.Field()
     batch_save_elements = BatchSaveElements.Field()
 
@@ -0,0 +1,76 @@
+import numpy as np
+from django.conf import settings
+
+from .choices import Tools
+
+
+def segment_distances(coords, start, end):
+    inner = coords[start + 1:end]
+    a = coords[start]
+    b = coords[end]
+
+    direction = b - a
+    length = np.hypot(*direction)
+    if length == 0:
+        return np.hypot(*(inner - a).T)
+
+    return np.abs(
+        direction[0] * (inner[:, 1] - a[1]) - direction[1] * (inner[:, 0] - a[0])
+    ) / length
+
+
+# Ramer–Douglas–Peucker over an (n, 2) array. Each segment's distances are
+# computed in one vectorized pass; returns a mask of points to keep.
+def rdp_mask(coords, tolerance):
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(coords) - 1)]
+    while len(stack) > 0:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        distances = segment_distances(coords, start, end)
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return keep
+
+
+def get_tolerance(tool):
+    try:
+        name = Tools(tool).name
+    except ValueError:
+        return None
+
+    return settings.ELEMENT_SIMPLIFY_TOLERANCE.get(name)
+
+
+# Returns the simplified points for a freehand stroke, or None when the
+# stroke is left as-is (disabled, other tool, too short or malformed).
+def simplify_points(tool, points):
+    if not settings.ELEMENT_SIMPLIFY:
+        return None
+
+    tolerance = get_tolerance(tool)
+    if tolerance is None or not isinstance(points, list) or len(points) < 3:
+        return None
+
+    try:
+        coords = np.array([[point['x'], point['y']] for point in points], dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if not np.isfinite(coords).all():
+        return None
+
+    keep = rdp_mask(coords, tolerance)
+    if keep.all():
+        return None
+
+    return [point for point, kept in zip(points, keep.tolist()) if kept]
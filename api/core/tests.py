@@ -1,3 +1,1669 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_relay import to_global_id
+from PIL import Image
+
+from api.schema import schema
+from users.models import User
+from . import blobs, compaction, export, freehand, patterns, raster
+from . import lod as lod_codec
+from . import points as points_codec
+from .bounds import element_bounds
+from .choices import ArchiveReasons, PatternTypes, Tools
+from .compaction import compact_page
+from .ingest import append_element_points, batch_save_elements
+from .models import ArchivedElement, Element, Notebook, Page, PageSession, PaletteSwatch
+from .patches import patch_elements
+from .purge import purge_hidden_elements
+from .ordering import append_to_order, remove_from_order, remove_many_from_order
+from .uuids import uuid7
+
+
+MY_NOTEBOOKS = '''
+query MyNotebooks {
+  myNotebooks {
+    edges {
+      node {
+        bookshelf { uid }
+        uid
+        title
+        pageOrder
+        pages {
+          edges {
+            node {
+              uid
+              updatedAt
+              notebook { uid }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+MY_PAGES = '''
+query MyPages {
+  myPages {
+    edges {
+      node {
+        notebook { uid }
+        uid
+        elementOrder
+        paperSwatch { uid palette { uid } }
+        patternSwatch { uid palette { uid } }
+        fillSwatch { uid palette { uid } }
+        strokeSwatch { uid palette { uid } }
+        patternType
+        selectedTool
+      }
+    }
+  }
+}
+'''
+
+
+class QueryCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='reader', email='reader@fiary.app')
+        self.notebook = Notebook.objects.create(
+            owner=self.user,
+            bookshelf=self.user.bookshelves.get(),
+        )
+        self.swatch = self.user.palette_swatches.first()
+
+    def create_pages(self, count):
+        for _ in range(count):
+            Page.objects.create(
+                owner=self.user,
+                notebook=self.notebook,
+                paper_swatch=self.swatch,
+                pattern_swatch=self.swatch,
+                fill_swatch=self.swatch,
+                stroke_swatch=self.swatch,
+            )
+
+    def count_queries(self, query):
+        request = RequestFactory().post('/graphql/')
+        request.user = self.user
+
+        with CaptureQueriesContext(connection) as context:
+            result = schema.execute(query, context_value=request)
+
+        self.assertIsNone(result.errors)
+        return len(context.captured_queries)
+
+    def assertBoundedQueries(self, query, max_queries):
+        self.create_pages(1)
+        few_pages = self.count_queries(query)
+
+        self.create_pages(39)
+        many_pages = self.count_queries(query)
+
+        self.assertEqual(few_pages, many_pages)
+        self.assertLessEqual(many_pages, max_queries)
+
+    # The connection's COUNT(*), the root rows, then one query per selected
+    # relation: bookshelves, pages and their notebooks.
+    def test_my_notebooks(self):
+        self.assertBoundedQueries(MY_NOTEBOOKS, 5)
+
+    # The connection's COUNT(*), the root rows, notebooks, then a swatch and
+    # a palette query for each of the four swatch relations.
+    def test_my_pages(self):
+        self.assertBoundedQueries(MY_PAGES, 11)
+
+
+NODE = '''
+query Node($id: ID!) {
+  %s(id: $id) { uid }
+}
+'''
+
+MY_ELEMENTS = '''
+query MyElements($pageUid: UUID, $isHtmlElement: Boolean, $isHidden: Boolean) {
+  myElements(page_Uid: $pageUid, isHtmlElement: $isHtmlElement, isHidden: $isHidden, first: 50) {
+    edges { node { uid tool points } }
+  }
+}
+'''
+
+ELEMENTS_IN_VIEWPORT = '''
+query ElementsInViewport($pageUid: UUID!) {
+  elementsInViewport(pageUid: $pageUid, rect: {minX: 0, minY: 0, maxX: 100, maxY: 100}) { uid }
+}
+'''
+
+# Root fields with their nested connections, so the prefetches are
+# planned too.
+MY_LISTS = {
+    'myRooms': 'uid bookshelves { edges { node { uid } } }',
+    'myBookshelves': 'uid notebooks { edges { node { uid } } }',
+    'myNotebooks': 'uid pages { edges { node { uid } } }',
+    'myPages': 'uid selectedTool paperSwatch { uid }',
+    'myPaletteCollection': 'uid palettes { edges { node { uid } } }',
+    'myPalettes': 'uid swatches { edges { node { uid } } }',
+    'myPaletteSwatchs': 'uid palette { uid }',
+}
+
+
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create(username=f'planner{i}', email=f'planner{i}@fiary.app')
+            for i in range(3)
+        ]
+        for user in self.users:
+            notebook = Notebook.objects.create(owner=user, bookshelf=user.bookshelves.get())
+            for _ in range(3):
+                page = Page.objects.create(owner=user, notebook=notebook)
+                Element.objects.bulk_create([
+                    Element(
+                        owner=user,
+                        page=page,
+                        tool=Tools.PEN,
+                        points=[{'x': i, 'y': i}, {'x': i + 10, 'y': i + 10}],
+                        min_x=i,
+                        min_y=i,
+                        max_x=i + 10,
+                        max_y=i + 10,
+                        is_hidden=i % 4 == 0,
+                        is_html_element=i % 5 == 0,
+                    )
+                    for i in range(20)
+                ])
+
+        self.user = self.users[0]
+        self.page = self.user.pages.first()
+        self.element = self.page.elements.first()
+
+    def seq_scans(self, plan):
+        scans = []
+        if plan.get('Node Type') == 'Seq Scan':
+            scans.append(plan['Relation Name'])
+
+        for child in plan.get('Plans', []):
+            scans.extend(self.seq_scans(child))
+
+        return scans
+
+    # The seeded tables are tiny, so sequential scans are priced out: a
+    # plan that still scans a whole table has no index it could use.
+    def assertNoSeqScans(self, query, variables=None):
+        request = RequestFactory().post('/graphql/')
+        request.user = self.user
+
+        with CaptureQueriesContext(connection) as context:
+            result = schema.execute(query, variables=variables, context_value=request)
+
+        self.assertIsNone(result.errors)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                for captured in context.captured_queries:
+                    if not captured['sql'].startswith('SELECT'):
+                        continue
+
+                    cursor.execute(f'EXPLAIN (FORMAT JSON) {captured["sql"]}')
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+
+                    with self.subTest(sql=captured['sql']):
+                        self.assertEqual(self.seq_scans(plan[0]['Plan']), [])
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def test_nodes(self):
+        nodes = {
+            'room': ('RoomNode', self.user.rooms.get().uid),
+            'bookshelf': ('BookshelfNode', self.user.bookshelves.get().uid),
+            'notebook': ('NotebookNode', self.user.notebooks.get().uid),
+            'page': ('PageNode', self.page.uid),
+            'pageSession': ('PageSessionNode', self.page.uid),
+            'element': ('ElementNode', self.element.uid),
+            'paletteCollection': ('PaletteCollectionNode', self.user.palette_collection.uid),
+            'palette': ('PaletteNode', self.user.palettes.first().uid),
+            'paletteSwatch': ('PaletteSwatchNode', self.user.palette_swatches.first().uid),
+        }
+        for field, (node, uid) in nodes.items():
+            with self.subTest(field=field):
+                query = NODE % field
+                if field == 'pageSession':
+                    query = query.replace('{ uid }', '{ selectedTool }')
+
+                self.assertNoSeqScans(query, {'id': to_global_id(node, str(uid))})
+
+    def test_my_lists(self):
+        for field, selection in MY_LISTS.items():
+            with self.subTest(field=field):
+                self.assertNoSeqScans(f'query {{ {field} {{ edges {{ node {{ {selection} }} }} }} }}')
+
+    def test_my_elements(self):
+        page_uid = str(self.page.uid)
+        for variables in (
+            {},
+            {'pageUid': page_uid},
+            {'pageUid': page_uid, 'isHtmlElement': False},
+            {'pageUid': page_uid, 'isHidden': False},
+        ):
+            with self.subTest(variables=variables):
+                self.assertNoSeqScans(MY_ELEMENTS, variables)
+
+    def test_elements_in_viewport(self):
+        self.assertNoSeqScans(ELEMENTS_IN_VIEWPORT, {'pageUid': str(self.page.uid)})
+
+
+POINTS = [{'x': 0, 'y': 0, 'pressure': 0.5}, {'x': 10, 'y': 5, 'pressure': 0.5}, {'x': 20, 'y': 0, 'pressure': 0.5}]
+
+
+class PageTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='writer', email='writer@fiary.app')
+        self.notebook = Notebook.objects.create(owner=self.user, bookshelf=self.user.bookshelves.get())
+        self.page = Page.objects.create(owner=self.user, notebook=self.notebook)
+
+    def execute(self, query, variables=None, user=None):
+        request = RequestFactory().post('/graphql/')
+        request.user = user or self.user
+        return schema.execute(query, variables=variables, context_value=request)
+
+    def element_input(self, **fields):
+        return {
+            'page_uid': str(self.page.uid),
+            'tool': Tools.PEN,
+            'points': POINTS,
+            'settings': {},
+            'transform': {},
+            'dimensions': {},
+            'canvas_settings': {'lineSize': 2},
+            **fields,
+        }
+
+
+class BatchSaveElementsTest(PageTestCase):
+    def test_creates_in_order(self):
+        elements = batch_save_elements(self.user, [self.element_input(), self.element_input()])
+
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.element_order, [element.uid for element in elements])
+        self.assertEqual(Element.objects.filter(page=self.page).count(), 2)
+
+    def test_updates_only_given_fields(self):
+        element, = batch_save_elements(self.user, [self.element_input()])
+
+        batch_save_elements(self.user, [{'uid': str(element.uid), 'is_hidden': True}])
+
+        element.refresh_from_db()
+        self.assertTrue(element.is_hidden)
+        self.assertEqual(element.tool, Tools.PEN)
+
+    def test_rejects_other_users_page(self):
+        other = User.objects.create(username='other', email='other@fiary.app')
+
+        with self.assertRaises(Page.DoesNotExist):
+            batch_save_elements(other, [self.element_input()])
+
+        self.assertFalse(Element.objects.filter(page=self.page).exists())
+
+    def test_batch_is_atomic(self):
+        with self.assertRaises(Element.DoesNotExist):
+            batch_save_elements(self.user, [
+                self.element_input(),
+                {'uid': str(uuid.uuid4()), 'is_hidden': True},
+            ])
+
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.element_order, [])
+        self.assertFalse(Element.objects.filter(page=self.page).exists())
+
+
+class PointsCodecTest(TestCase):
+    def test_round_trip(self):
+        points = [
+            {'x': 12.34, 'y': -5.67, 'pressure': 0.512},
+            {'x': 1000.5, 'y': 2000.25, 'pressure': 1},
+            {'x': -3.01, 'y': 0, 'pressure': 0},
+        ]
+        self.assertEqual(points_codec.decode(points_codec.encode(points)), points)
+
+        xy = [{'x': i * 0.5, 'y': -i * 1.25} for i in range(100)]
+        self.assertEqual(points_codec.decode(points_codec.encode(xy)), xy)
+
+    def test_rounds_to_grid(self):
+        decoded, = points_codec.decode(points_codec.encode([{'x': 1.23456, 'y': 7.891011, 'pressure': 0.12345}]))
+
+        self.assertAlmostEqual(decoded['x'], 1.23456, delta=0.005)
+        self.assertAlmostEqual(decoded['y'], 7.891011, delta=0.005)
+        self.assertAlmostEqual(decoded['pressure'], 0.12345, delta=0.0005)
+
+    def test_leaves_unpackable_points(self):
+        for points in (
+            [],
+            None,
+            [{'x': 0, 'y': 0, 'extra': 1}],
+            [{'x': float('nan'), 'y': 0}],
+            [{'x': 0, 'y': 0}, {'x': 0, 'y': 0, 'pressure': 1}],
+            [{'x': 'a', 'y': 0}],
+        ):
+            with self.subTest(points=points):
+                self.assertIsNone(points_codec.encode(points))
+
+    def test_json_by_default(self):
+        element = Element(tool=Tools.PEN, points=POINTS)
+        element.pack_points()
+
+        self.assertEqual(element.points, POINTS)
+        self.assertIsNone(element.packed_points)
+
+    @override_settings(ELEMENT_POINTS_FORMAT='packed')
+    def test_packed_when_enabled(self):
+        element = Element(tool=Tools.PEN, points=POINTS)
+        element.pack_points()
+
+        self.assertIsNone(element.points)
+        self.assertEqual(element.get_points(), POINTS)
+
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+PNG_DATA_URL = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+
+class MediaTestCase(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(
+            BLOB_ROOT=os.path.join(media_root, 'blobs'),
+            RASTER_ROOT=os.path.join(media_root, 'tiles'),
+            EXPORT_ROOT=os.path.join(media_root, 'exports'),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class BlobTest(MediaTestCase):
+    def test_data_url_is_stored_once(self):
+        key = blobs.to_key(PNG_DATA_URL)
+
+        self.assertTrue(blobs.is_key(key))
+        self.assertTrue(key.endswith('.png'))
+        self.assertEqual(blobs.blob_path(key).read_bytes(), PNG)
+        self.assertEqual(blobs.to_key(PNG_DATA_URL), key)
+        self.assertEqual(blobs.to_key(key), key)
+        self.assertEqual(blobs.to_key(f'https://api.fiary.app/blobs/{key}'), key)
+
+    def test_leaves_other_values(self):
+        for value in (None, '', 'data:image/png,notbase64', 'https://example.com/a.png'):
+            with self.subTest(value=value):
+                self.assertEqual(blobs.to_key(value), value)
+
+    def test_served_immutable_with_cors(self):
+        key = blobs.to_key(PNG_DATA_URL)
+        origin = 'https://www.fiary.app'
+
+        response = self.client.get(f'/blobs/{key}', HTTP_ORIGIN=origin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), PNG)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Access-Control-Allow-Origin'], origin)
+
+        response = self.client.get(f'/blobs/{key}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(f'/blobs/{"0" * 64}.png').status_code, 404)
+
+    def test_saved_elements_resolve_to_blob_urls(self):
+        element, = batch_save_elements(self.user, [self.element_input(canvas_data_url=PNG_DATA_URL)])
+        key = blobs.to_key(PNG_DATA_URL)
+        self.assertEqual(Element.objects.get(uid=element.uid).canvas_data_url, key)
+
+        result = self.execute(
+            'query Node($id: ID!) { element(id: $id) { canvasDataUrl } }',
+            {'id': to_global_id('ElementNode', str(element.uid))},
+        )
+        self.assertIsNone(result.errors)
+        self.assertTrue(result.data['element']['canvasDataUrl'].endswith(f'/blobs/{key}'))
+
+    def test_backfill_counts_failures(self):
+        Page.objects.filter(uid=self.page.uid).update(canvas_data_url=PNG_DATA_URL)
+        broken = Page.objects.create(owner=self.user, notebook=self.notebook)
+        Page.objects.filter(uid=broken.uid).update(canvas_data_url='data:image/png,notbase64')
+
+        output = io.StringIO()
+        call_command('backfill_canvas_blobs', stdout=output)
+
+        self.assertIn('Page: moved 1 canvas data urls, 1 could not be decoded', output.getvalue())
+        self.assertTrue(blobs.is_key(Page.objects.get(uid=self.page.uid).canvas_data_url))
+        self.assertEqual(Page.objects.get(uid=broken.uid).canvas_data_url, 'data:image/png,notbase64')
+
+
+MY_PAGE_ELEMENTS = '''
+query MyElements($pageUid: UUID) {
+  myElements(page_Uid: $pageUid, first: 50) {
+    edges { node { %s } }
+  }
+}
+'''
+
+
+class DeferredColumnsTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        batch_save_elements(self.user, [self.element_input() for _ in range(3)])
+
+    def element_queries(self, selection):
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(MY_PAGE_ELEMENTS % selection, {'pageUid': str(self.page.uid)})
+
+        self.assertIsNone(result.errors)
+        return result, [query['sql'] for query in context.captured_queries if 'FROM "core_element"' in query['sql']]
+
+    def test_unselected_columns_are_deferred(self):
+        result, queries = self.element_queries('uid tool')
+
+        self.assertEqual(len(result.data['myElements']['edges']), 3)
+        self.assertEqual(len(queries), 1)
+        for column in ('points', 'packed_points', 'settings', 'canvas_data_url', 'stroke_svg_path'):
+            self.assertNotIn(f'"core_element"."{column}"', queries[0])
+
+    def test_selected_columns_load_in_one_query(self):
+        result, queries = self.element_queries('uid points settings')
+
+        self.assertEqual(len(queries), 1)
+        for edge in result.data['myElements']['edges']:
+            self.assertEqual(json.loads(edge['node']['points']), POINTS)
+
+
+class RelationLoaderTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(3):
+            notebook = Notebook.objects.create(owner=self.user, bookshelf=self.notebook.bookshelf)
+            Page.objects.create(owner=self.user, notebook=notebook)
+
+    def notebook_queries(self, query):
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(query)
+
+        self.assertIsNone(result.errors)
+        return result, [q for q in context.captured_queries if 'FROM "core_notebook"' in q['sql']]
+
+    # With no prefetch planned, every page's notebook still comes from one
+    # batched loader query.
+    def test_unprefetched_relations_are_batched(self):
+        with mock.patch('api.optimizer.get_prefetches', return_value=[]):
+            result, queries = self.notebook_queries('query { myPages { edges { node { uid notebook { uid } } } } }')
+
+        self.assertEqual(len(result.data['myPages']['edges']), 4)
+        self.assertEqual(len(queries), 1)
+
+    def test_root_lookups_are_batched(self):
+        first, second = Page.objects.filter(owner=self.user)[:2]
+        query = '''
+        query Pages($a: ID!, $b: ID!) {
+          a: page(id: $a) { uid }
+          b: page(id: $b) { uid }
+        }
+        '''
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(query, {
+                'a': to_global_id('PageNode', str(first.uid)),
+                'b': to_global_id('PageNode', str(second.uid)),
+            })
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data, {'a': {'uid': str(first.uid)}, 'b': {'uid': str(second.uid)}})
+        self.assertEqual(len([q for q in context.captured_queries if 'FROM "core_page"' in q['sql']]), 1)
+
+
+MY_ELEMENTS_PAGE = '''
+query MyElements($pageUid: UUID, $first: Int, $after: String, $last: Int, $before: String) {
+  myElements(page_Uid: $pageUid, first: $first, after: $after, last: $last, before: $before) {
+    edges { cursor node { uid } }
+    pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+  }
+}
+'''
+
+
+class KeysetPaginationTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        batch_save_elements(self.user, [self.element_input() for _ in range(5)])
+        self.uids = [
+            str(uid)
+            for uid in Element.objects.filter(page=self.page).order_by('created_at', 'uid').values_list('uid', flat=True)
+        ]
+
+    def fetch(self, **variables):
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(MY_ELEMENTS_PAGE, {'pageUid': str(self.page.uid), **variables})
+
+        self.assertIsNone(result.errors)
+        for query in context.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+        connection_ = result.data['myElements']
+        return [edge['node']['uid'] for edge in connection_['edges']], connection_['pageInfo']
+
+    def test_forward(self):
+        seen = []
+        after = None
+        while True:
+            uids, page_info = self.fetch(first=2, after=after)
+            seen.extend(uids)
+            if not page_info['hasNextPage']:
+                break
+
+            after = page_info['endCursor']
+
+        self.assertEqual(seen, self.uids)
+
+    def test_backward(self):
+        uids, page_info = self.fetch(last=2)
+        self.assertEqual(uids, self.uids[-2:])
+        self.assertTrue(page_info['hasPreviousPage'])
+
+        uids, page_info = self.fetch(last=2, before=page_info['startCursor'])
+        self.assertEqual(uids, self.uids[1:3])
+
+    def test_invalid_cursor(self):
+        result = self.execute(MY_ELEMENTS_PAGE, {'first': 2, 'after': 'not-a-cursor'})
+        self.assertIn('Invalid cursor', str(result.errors[0]))
+
+
+VIEWPORT = '''
+query ElementsInViewport($pageUid: UUID!, $rect: ViewportRect!) {
+  elementsInViewport(pageUid: $pageUid, rect: $rect) { uid }
+}
+'''
+
+
+class BoundsTest(PageTestCase):
+    def test_points_padded_by_line_size(self):
+        self.assertEqual(element_bounds(POINTS, {}, {}, {'lineSize': 2}, False), [-1, -1, 21, 6])
+
+    def test_transform(self):
+        square = [{'x': 0, 'y': 0}, {'x': 10, 'y': 10}]
+        for transform, expected in (
+            ({'translate': [5, -5]}, [5, -5, 15, 5]),
+            ({'scale': [2, 3]}, [-5, -10, 15, 20]),
+            ({'rotate': 45}, [5 - 50 ** 0.5, 5 - 50 ** 0.5, 5 + 50 ** 0.5, 5 + 50 ** 0.5]),
+        ):
+            with self.subTest(transform=transform):
+                for actual, value in zip(element_bounds(square, {}, transform, {}, False), expected):
+                    self.assertAlmostEqual(actual, value)
+
+    def test_malformed_transform_is_ignored(self):
+        first, second, third = batch_save_elements(self.user, [
+            self.element_input(transform={'translate': 5}),
+            self.element_input(transform={'translate': [1], 'scale': [2, 2, 2]}),
+            self.element_input(transform={'rotate': '45'}),
+        ])
+        expected = element_bounds(POINTS, {}, {}, {'lineSize': 2}, False)
+        for element in (first, second, third):
+            element.refresh_from_db()
+            self.assertEqual([element.min_x, element.min_y, element.max_x, element.max_y], expected)
+
+    def test_outer_dimensions_win(self):
+        dimensions = {'outerMinX': 1, 'outerMinY': 2, 'outerMaxX': 3, 'outerMaxY': 4}
+        self.assertEqual(element_bounds(POINTS, dimensions, {}, {}, False), [1, 2, 3, 4])
+
+    def test_unknown_extent(self):
+        self.assertIsNone(element_bounds(POINTS, {}, {}, {}, True))
+        self.assertIsNone(element_bounds([], {}, {}, {}, False))
+        self.assertIsNone(element_bounds([{'x': 'a'}], {}, {}, {}, False))
+
+    def test_viewport(self):
+        inside, outside, moved, html, hidden = batch_save_elements(self.user, [
+            self.element_input(),
+            self.element_input(points=[{'x': 500, 'y': 500}, {'x': 510, 'y': 510}]),
+            self.element_input(points=[{'x': 500, 'y': 500}, {'x': 510, 'y': 510}], transform={'translate': [-450, -450]}),
+            self.element_input(is_html_element=True),
+            self.element_input(is_hidden=True),
+        ])
+
+        result = self.execute(VIEWPORT, {
+            'pageUid': str(self.page.uid),
+            'rect': {'minX': 0, 'minY': 0, 'maxX': 100, 'maxY': 100},
+        })
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(
+            {element['uid'] for element in result.data['elementsInViewport']},
+            {str(inside.uid), str(moved.uid), str(html.uid)},
+        )
+
+
+class OrderingTest(PageTestCase):
+    def order(self):
+        return Page.objects.values_list('element_order', flat=True).get(uid=self.page.uid)
+
+    def test_append_and_remove(self):
+        a, b, c, d = [uuid.uuid4() for _ in range(4)]
+
+        append_to_order(Page, self.page.uid, 'element_order', a)
+        append_to_order(Page, self.page.uid, 'element_order', b, c, d)
+        self.assertEqual(self.order(), [a, b, c, d])
+
+        remove_from_order(Page, self.page.uid, 'element_order', b)
+        self.assertEqual(self.order(), [a, c, d])
+
+        remove_many_from_order(Page, self.page.uid, 'element_order', [d, a])
+        self.assertEqual(self.order(), [c])
+
+        self.assertEqual(append_to_order(Page, self.page.uid, 'element_order'), 0)
+        self.assertEqual(remove_many_from_order(Page, self.page.uid, 'element_order', []), 0)
+
+    # Appends made from stale copies of the page both land.
+    def test_does_not_overwrite_concurrent_appends(self):
+        stale = Page.objects.get(uid=self.page.uid)
+        first, second = uuid.uuid4(), uuid.uuid4()
+
+        append_to_order(Page, self.page.uid, 'element_order', first)
+        append_to_order(Page, stale.uid, 'element_order', second)
+        stale.save()
+
+        self.assertEqual(self.order(), [first, second])
+
+
+class TrackedSaveTest(PageTestCase):
+    def saved_columns(self, instance):
+        with CaptureQueriesContext(connection) as context:
+            instance.save()
+
+        update, = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        columns = update.split(' SET ', 1)[1].split(' WHERE ', 1)[0]
+        return {column.split(' = ')[0].split('.')[-1].strip('"') for column in columns.split(', "')}
+
+    def test_saves_changed_columns(self):
+        page = Page.objects.get(uid=self.page.uid)
+        page.pattern_type = page.pattern_type
+        self.assertEqual(self.saved_columns(page), {'updated_at'})
+
+        page.pattern_options = {'size': 20}
+        self.assertEqual(self.saved_columns(page), {'pattern_options', 'updated_at'})
+
+        # Saved columns are the new baseline.
+        self.assertEqual(self.saved_columns(page), {'updated_at'})
+
+    def test_detects_top_level_changes_in_place(self):
+        page = Page.objects.get(uid=self.page.uid)
+        page.element_order.append(uuid.uuid4())
+        self.assertEqual(self.saved_columns(page), {'element_order', 'updated_at'})
+
+        element, = batch_save_elements(self.user, [self.element_input()])
+        element = Element.objects.get(uid=element.uid)
+        element.settings['color'] = 'red'
+        self.assertIn('settings', self.saved_columns(element))
+        self.assertEqual(Element.objects.get(uid=element.uid).settings, {'color': 'red'})
+
+    def test_leaves_columns_changed_elsewhere(self):
+        stale = Page.objects.get(uid=self.page.uid)
+        Page.objects.filter(uid=self.page.uid).update(pattern_options={'size': 30})
+
+        stale.notebook = self.notebook
+        stale.save()
+
+        self.assertEqual(Page.objects.get(uid=self.page.uid).pattern_options, {'size': 30})
+
+    def test_snapshot_is_shallow(self):
+        batch_save_elements(self.user, [self.element_input()])
+        element = Element.objects.get(page=self.page)
+
+        self.assertIsNot(element._snapshot['points'], element.points)
+        self.assertIs(element._snapshot['points'][0], element.points[0])
+
+
+UPDATE_PAGE_TOOL = '''
+mutation UpdatePage($uid: UUID!) {
+  updatePage(input: {uid: $uid, selectedTool: 3, isRulerMode: true}) { page { uid } }
+}
+'''
+
+UPDATE_SWATCH = '''
+mutation Swatch($uid: UUID!, $swatch: JSONString!) {
+  updatePaletteSwatch(input: {uid: $uid, swatch: $swatch}) { swatch { uid } }
+}
+'''
+
+
+class NarrowWriteTest(PageTestCase):
+    def updates(self, context, table):
+        return [q['sql'] for q in context.captured_queries if q['sql'].startswith(f'UPDATE "{table}"')]
+
+    # Toolbar inputs of the old UpdatePage only touch the session row.
+    def test_update_page_toolbar_state(self):
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(UPDATE_PAGE_TOOL, {'uid': str(self.page.uid)})
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(self.updates(context, 'core_page'), [])
+        self.assertEqual(len(self.updates(context, 'core_pagesession')), 1)
+
+        session = PageSession.objects.get(page=self.page)
+        self.assertEqual(session.selected_tool, 3)
+        self.assertTrue(session.is_ruler_mode)
+
+    def test_update_swatch_writes_the_swatch_column(self):
+        swatch = self.user.palette_swatches.first()
+        color = {'r': 2, 'g': 2, 'b': 2, 'a': 1}
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(UPDATE_SWATCH, {'uid': str(swatch.uid), 'swatch': json.dumps(color)})
+
+        self.assertIsNone(result.errors)
+        update, = self.updates(context, 'core_paletteswatch')
+        self.assertEqual(update.split(' SET ', 1)[1].split(' WHERE ', 1)[0].count(' = '), 2)
+        self.assertEqual(PaletteSwatch.objects.get(uid=swatch.uid).swatch, color)
+
+
+APPEND = '''
+mutation Append($uid: UUID!, $points: JSONString!, $fromIndex: Int!, $isFinal: Boolean) {
+  appendElementPoints(input: {uid: $uid, points: $points, fromIndex: $fromIndex, isFinal: $isFinal}) { pointsCount }
+}
+'''
+
+
+def zigzag(start, count):
+    return [{'x': float(i), 'y': float(10 * (i % 2)), 'pressure': 0.5} for i in range(start, start + count)]
+
+
+class AppendElementPointsTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.element, = batch_save_elements(self.user, [
+            self.element_input(
+                points=zigzag(0, 4),
+                transform={'scale': [2, 2]},
+                canvas_settings={'lineSize': 2, 'freehandOptions': {'size': 4}},
+            ),
+        ])
+
+    def append(self, points, from_index):
+        return self.execute(APPEND, {
+            'uid': str(self.element.uid),
+            'points': json.dumps(points),
+            'fromIndex': from_index,
+        })
+
+    # Appends touch the row once, in SQL, and leave the derived columns for
+    # later.
+    def test_appends_in_sql_and_marks_stale(self):
+        with CaptureQueriesContext(connection) as context:
+            result = self.append(zigzag(4, 60), 4)
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['appendElementPoints']['pointsCount'], 64)
+        self.assertEqual(
+            [q['sql'].split(' ', 1)[0] for q in context.captured_queries if 'core_element' in q['sql']],
+            ['UPDATE'],
+        )
+
+        element = Element.objects.get(uid=self.element.uid)
+        self.assertTrue(element.is_stale)
+        self.assertEqual(element.get_points(), zigzag(0, 64))
+        self.assertEqual(element.get_points(lod=1), zigzag(0, 64))
+        self.assertIsNone(element.lod_points)
+        self.assertIsNone(element.stroke_svg_path)
+        self.assertIsNone(element.min_x)
+
+    def test_final_append_rebuilds_derived_columns(self):
+        self.append(zigzag(4, 30), 4)
+        result = self.execute(APPEND, {
+            'uid': str(self.element.uid),
+            'points': json.dumps(zigzag(34, 30)),
+            'fromIndex': 34,
+            'isFinal': True,
+        })
+
+        self.assertIsNone(result.errors)
+        element = Element.objects.get(uid=self.element.uid)
+        self.assertFalse(element.is_stale)
+        self.assertEqual(element.get_points(), zigzag(0, 64))
+        self.assertEqual(element.get_points(lod=1), lod_codec.decode(lod_codec.build(zigzag(0, 64)), 1))
+        self.assertIsNotNone(element.stroke_svg_path)
+        self.assertNotEqual(element.stroke_svg_path, self.element.stroke_svg_path)
+
+        # Bounds follow the element's transform, not just its translation.
+        expected = element_bounds(zigzag(0, 64), {}, {'scale': [2, 2]}, element.canvas_settings, False)
+        self.assertEqual([element.min_x, element.min_y, element.max_x, element.max_y], expected)
+
+    def test_next_save_rebuilds_derived_columns(self):
+        self.append(zigzag(4, 60), 4)
+        batch_save_elements(self.user, [{'uid': str(self.element.uid), 'is_hidden': False}])
+
+        element = Element.objects.get(uid=self.element.uid)
+        self.assertFalse(element.is_stale)
+        self.assertIsNotNone(element.lod_points)
+        self.assertIsNotNone(element.stroke_svg_path)
+        self.assertIsNotNone(element.min_x)
+
+        self.append(zigzag(64, 2), 64)
+        element = Element.objects.get(uid=self.element.uid)
+        element.is_hidden = True
+        element.save()
+
+        element = Element.objects.get(uid=self.element.uid)
+        self.assertFalse(element.is_stale)
+        self.assertEqual(len(element.get_points(lod=0)), 66)
+        self.assertIsNotNone(element.lod_points)
+
+    def test_conflict(self):
+        self.assertIsNone(self.append(zigzag(4, 2), 4).errors)
+
+        # A retried chunk is rejected, not appended twice.
+        result = self.append(zigzag(4, 2), 4)
+        self.assertIn('Conflict', str(result.errors[0]))
+        self.assertIn('has 6 points', str(result.errors[0]))
+        self.assertEqual(len(Element.objects.get(uid=self.element.uid).get_points()), 6)
+
+    def test_other_owner(self):
+        other = User.objects.create(username='other', email='other@fiary.app')
+        result = self.execute(APPEND, {
+            'uid': str(self.element.uid),
+            'points': json.dumps(zigzag(4, 2)),
+            'fromIndex': 4,
+        }, user=other)
+
+        self.assertIsNotNone(result.errors)
+        self.assertEqual(len(Element.objects.get(uid=self.element.uid).get_points()), 4)
+
+    @override_settings(ELEMENT_POINTS_FORMAT='packed')
+    def test_packed(self):
+        batch_save_elements(self.user, [{'uid': str(self.element.uid), 'points': zigzag(0, 4)}])
+        self.assertIsNotNone(Element.objects.get(uid=self.element.uid).packed_points)
+
+        # Unpacked once, then appended to in SQL.
+        self.assertIsNone(self.append(zigzag(4, 2), 4).errors)
+        self.assertIsNone(self.append(zigzag(6, 2), 6).errors)
+
+        element = Element.objects.get(uid=self.element.uid)
+        self.assertEqual(element.points, zigzag(0, 8))
+        self.assertIsNone(element.packed_points)
+
+        element.save()
+        element = Element.objects.get(uid=self.element.uid)
+        self.assertIsNone(element.points)
+        self.assertEqual(element.get_points(), zigzag(0, 8))
+
+
+PATCH = '''
+mutation Patch($uid: UUID!, $operations: JSONString!) {
+  patchElement(input: {uid: $uid, operations: $operations}) { uid }
+}
+'''
+
+
+class PatchElementsTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.element, self.other = batch_save_elements(self.user, [
+            self.element_input(
+                transform={'translate': [10, 20]},
+                settings={'colors': ['red', 'blue'], 'image': {'src': 'a'}},
+            ),
+            self.element_input(transform={'translate': [0, 0]}),
+        ])
+
+    def patch(self, operations, element=None):
+        return self.execute(PATCH, {
+            'uid': str((element or self.element).uid),
+            'operations': json.dumps(operations),
+        })
+
+    def reload(self):
+        return Element.objects.get(uid=self.element.uid)
+
+    def test_add_inserts_into_arrays(self):
+        result = self.patch([
+            {'op': 'add', 'path': '/settings/colors/1', 'value': 'green'},
+            {'op': 'add', 'path': '/settings/colors/-', 'value': 'black'},
+            {'op': 'add', 'path': '/settings/colors/4', 'value': 'white'},
+        ])
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(self.reload().settings['colors'], ['red', 'green', 'blue', 'black', 'white'])
+
+    def test_replace_and_remove(self):
+        result = self.patch([
+            {'op': 'replace', 'path': '/settings/colors/0', 'value': 'pink'},
+            {'op': 'remove', 'path': '/settings/colors/1'},
+            {'op': 'add', 'path': '/settings/width', 'value': 3},
+            {'op': 'merge', 'path': '/settings/image', 'value': {'alt': 'b'}},
+        ])
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(self.reload().settings, {
+            'colors': ['pink'],
+            'image': {'src': 'a', 'alt': 'b'},
+            'width': 3,
+        })
+
+    def test_missing_paths_fail(self):
+        for operation in [
+            {'op': 'add', 'path': '/settings/missing/key', 'value': 1},
+            {'op': 'replace', 'path': '/settings/missing', 'value': 1},
+            {'op': 'remove', 'path': '/settings/colors/2'},
+            {'op': 'add', 'path': '/settings/colors/3', 'value': 'x'},
+            {'op': 'replace', 'path': '/settings/colors/-', 'value': 'x'},
+        ]:
+            with self.subTest(operation=operation):
+                result = self.patch([
+                    {'op': 'add', 'path': '/settings/width', 'value': 1},
+                    operation,
+                ])
+
+                self.assertIn('does not exist', str(result.errors[0]))
+                # The whole patch is rolled back.
+                self.assertNotIn('width', self.reload().settings)
+
+    def test_translate_shifts_bounds(self):
+        before = self.reload()
+        result = self.patch([{'op': 'replace', 'path': '/transform/translate', 'value': [15, 10]}])
+
+        self.assertIsNone(result.errors)
+        element = self.reload()
+        self.assertEqual(element.min_x, before.min_x + 5)
+        self.assertEqual(element.max_y, before.max_y - 10)
+
+    def test_other_owner(self):
+        other = User.objects.create(username='other', email='other@fiary.app')
+        result = self.execute(PATCH, {
+            'uid': str(self.element.uid),
+            'operations': json.dumps([{'op': 'add', 'path': '/settings/width', 'value': 1}]),
+        }, user=other)
+
+        self.assertIsNotNone(result.errors)
+        self.assertNotIn('width', self.reload().settings)
+
+    def test_bulk_shares_one_update(self):
+        patches = [
+            {'uid': str(element.uid), 'operations': json.dumps([
+                {'op': 'replace', 'path': '/transform/translate/0', 'value': x},
+            ])}
+            for element, x in ((self.element, 1), (self.other, 2))
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.execute('''
+                mutation Patch($patches: [ElementPatch!]!) {
+                  patchElements(input: {patches: $patches}) { uids }
+                }
+            ''', {'patches': patches})
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(self.reload().transform['translate'], [1, 20])
+        self.assertEqual(Element.objects.get(uid=self.other.uid).transform['translate'], [2, 0])
+
+
+# A straight run of points with a little noise, which RDP collapses.
+NOISY = [{'x': float(i), 'y': 0.01 * (i % 2), 'pressure': 0.123456789} for i in range(50)]
+
+
+class SimplifyTest(PageTestCase):
+    def test_off_by_default(self):
+        element, = batch_save_elements(self.user, [self.element_input(points=NOISY)])
+
+        element = Element.objects.get(uid=element.uid)
+        self.assertEqual(element.get_points(), NOISY)
+        self.assertIsNone(element.raw_points)
+
+    @override_settings(ELEMENT_SIMPLIFY=True)
+    def test_keeps_raw_points(self):
+        element, = batch_save_elements(self.user, [self.element_input(points=NOISY)])
+
+        element = Element.objects.get(uid=element.uid)
+        self.assertEqual(element.get_points(), [NOISY[0], NOISY[-1]])
+        # Raw points are kept exactly, not quantized.
+        self.assertEqual(element.get_raw_points(), NOISY)
+
+    @override_settings(ELEMENT_SIMPLIFY=True)
+    def test_append_counts_raw_points(self):
+        element, = batch_save_elements(self.user, [self.element_input(points=NOISY[:30])])
+
+        self.assertEqual(append_element_points(self.user, element.uid, NOISY[30:], 30), 50)
+        with self.assertRaisesMessage(Exception, 'Conflict'):
+            append_element_points(self.user, element.uid, NOISY[30:], 2)
+
+        # Simplified again once the stroke is saved.
+        element = Element.objects.get(uid=element.uid)
+        self.assertEqual(element.get_raw_points(), NOISY)
+        element.save()
+
+        element = Element.objects.get(uid=element.uid)
+        self.assertEqual(element.get_raw_points(), NOISY)
+        self.assertEqual(len(element.get_points()), 2)
+
+    @override_settings(ELEMENT_SIMPLIFY=True)
+    def test_unsimplified_update_clears_raw_points(self):
+        element, = batch_save_elements(self.user, [self.element_input(points=NOISY)])
+        batch_save_elements(self.user, [{'uid': str(element.uid), 'points': POINTS}])
+
+        element = Element.objects.get(uid=element.uid)
+        self.assertIsNone(element.raw_points)
+        self.assertEqual(element.get_raw_points(), element.get_points())
+
+    def test_reads_packed_raw_points(self):
+        self.assertEqual(
+            points_codec.decode_raw(points_codec.encode(POINTS)),
+            points_codec.decode(points_codec.encode(POINTS)),
+        )
+
+
+class LodTest(PageTestCase):
+    def test_levels(self):
+        points = zigzag(0, 64)
+        data = lod_codec.build(points)
+
+        self.assertEqual(len(lod_codec.decode(data, 1)), 16)
+        self.assertEqual(len(lod_codec.decode(data, 2)), 4)
+        # Levels past the last one return the coarsest.
+        self.assertEqual(lod_codec.decode(data, 5), lod_codec.decode(data, 2))
+        self.assertEqual(lod_codec.decode(data, 2)[0], points[0])
+        self.assertEqual(lod_codec.decode(data, 2)[-1], points[-1])
+
+    def test_unrankable_points_are_stored_as_is(self):
+        extra = [{**point, 'tilt': 1} for point in zigzag(0, 8)]
+        for points in (None, [], [{'x': 'a'}], extra[:1]):
+            with self.subTest(points=points):
+                self.assertEqual(lod_codec.decode(lod_codec.build(points), 1), points)
+
+        self.assertEqual(lod_codec.decode(lod_codec.build(extra), 1), [extra[0], extra[-1]])
+
+    def test_lod_reads_no_points_columns(self):
+        extra = [{**point, 'tilt': 1} for point in zigzag(0, 8)]
+        batch_save_elements(self.user, [
+            self.element_input(points=zigzag(0, 64)),
+            self.element_input(points=extra),
+            self.element_input(tool=Tools.RECTANGLE, points=[]),
+        ])
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(MY_PAGE_ELEMENTS % 'points(lod: 1)', {'pageUid': str(self.page.uid)})
+
+        self.assertIsNone(result.errors)
+        queries = [query['sql'] for query in context.captured_queries if 'FROM "core_element"' in query['sql']]
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"core_element"."points"', queries[0])
+        self.assertEqual(
+            [len(json.loads(edge['node']['points'])) for edge in result.data['myElements']['edges']],
+            [16, 2, 0],
+        )
+
+
+MY_PAGE_FIELDS = '''
+query MyPages {
+  myPages(first: 20) {
+    edges { node { %s } }
+  }
+}
+'''
+
+
+class RasterTest(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        batch_save_elements(self.user, [self.element_input(
+            points=zigzag(0, 20),
+            canvas_settings={'lineSize': 2, 'strokeColor': {'r': 0, 'g': 0, 'b': 0}},
+        )])
+        self.page = Page.objects.get(uid=self.page.uid)
+
+    def tile(self, version, z, x, y):
+        return self.client.get(f'/tiles/{self.page.uid}/{version}/{z}/{x}/{y}.png')
+
+    def test_renders_and_caches_tiles(self):
+        version = raster.get_version(self.page)
+        z = settings.RASTER_BASE_ZOOM
+
+        response = self.tile(version, z, 0, 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        image = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (raster.TILE_SIZE, raster.TILE_SIZE))
+        # The stroke is drawn over the white paper.
+        self.assertNotEqual(image.convert('L').getextrema(), (255, 255))
+        self.assertTrue(raster.tile_path(self.page.uid, version, z, 0, 0).exists())
+
+        self.assertEqual(self.tile(version, z, 0, 0).status_code, 200)
+
+    def test_version_changes_with_elements(self):
+        version = raster.get_version(self.page)
+        batch_save_elements(self.user, [self.element_input(points=zigzag(20, 20))])
+
+        self.assertNotEqual(raster.get_version(self.page), version)
+        self.assertEqual(self.tile(version, 2, 0, 0).status_code, 404)
+        self.assertEqual(self.tile('0' * 32, 2, 0, 0).status_code, 404)
+        self.assertEqual(self.tile(raster.get_version(self.page), 99, 0, 0).status_code, 404)
+
+    def test_versions_load_with_pages(self):
+        for _ in range(3):
+            page = Page.objects.create(owner=self.user, notebook=self.notebook)
+            batch_save_elements(self.user, [self.element_input(page_uid=str(page.uid))])
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(MY_PAGE_FIELDS % 'uid tileUrl svgUrl')
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(result.data['myPages']['edges']), 4)
+        self.assertFalse(any('core_element' in query['sql'] and 'core_page' not in query['sql'] for query in context.captured_queries))
+
+        urls = {edge['node']['uid']: edge['node']['tileUrl'] for edge in result.data['myPages']['edges']}
+        self.assertIn(raster.get_version(self.page), urls[str(self.page.uid)])
+
+
+class PatternDrawTest(TestCase):
+    def spec(self, spacing):
+        return patterns.get_spec(PatternTypes.DOTS, {str(PatternTypes.DOTS): {'spacing': spacing, 'lineSize': 1}}, None, {'r': 0, 'g': 0, 'b': 0})
+
+    def test_spacing_is_clamped(self):
+        self.assertEqual(self.spec(0.001).spacing, patterns.MIN_SPACING)
+        self.assertIsNone(patterns.parse(patterns.to_string(self.spec(0.001)._replace(spacing=0.5))))
+
+    def test_dense_patterns_are_filled_flat(self):
+        spec = self.spec(4)
+        image = Image.new('RGBA', (512, 512), (255, 255, 255, 255))
+        patterns.draw(image, 0, 0, 1 / 64, spec)
+
+        # Every pixel gets the same blend instead of millions of dots.
+        self.assertEqual(len(set(image.getdata())), 1)
+        self.assertNotEqual(image.getpixel((0, 0)), (255, 255, 255, 255))
+
+
+class PatternViewTest(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        patterns._load_cached.cache_clear()
+        self.spec = patterns.get_spec(PatternTypes.SQUARES, None, {'r': 255, 'g': 255, 'b': 255}, {'r': 0, 'g': 0, 'b': 255})
+
+    def test_serves_patterns(self):
+        for extension, content_type in (('svg', 'image/svg+xml'), ('png', 'image/png')):
+            with self.subTest(extension=extension):
+                response = self.client.get(patterns.to_url(self.spec, extension))
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+                cached = self.client.get(patterns.to_url(self.spec, extension), HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(cached.status_code, 304)
+
+    def test_only_canonical_specs(self):
+        url = patterns.to_url(self.spec, 'svg')
+
+        self.assertEqual(self.client.get(url.replace('_30_', '_30.0_')).status_code, 404)
+        self.assertEqual(self.client.get(url.replace('_30_', '_0.001_')).status_code, 404)
+        self.assertEqual(self.client.get('/patterns/9_30_1_50_none_none.svg').status_code, 404)
+
+    def test_cache_is_bounded(self):
+        for spacing in range(10, 10 + settings.PATTERN_CACHE_SIZE + 5):
+            self.client.get(patterns.to_url(self.spec._replace(spacing=spacing), 'svg'))
+
+        self.assertEqual(patterns._load_cached.cache_info().currsize, settings.PATTERN_CACHE_SIZE)
+        # Nothing is written to disk.
+        self.assertEqual(os.listdir(os.path.dirname(settings.RASTER_ROOT)), [])
+
+    def test_png_size_is_capped(self):
+        spec = self.spec._replace(pattern_type=PatternTypes.ISOMETRIC, spacing=patterns.MAX_SPACING)
+        image = Image.open(io.BytesIO(patterns.render_png(spec)))
+
+        self.assertEqual(image.size, (settings.PATTERN_PNG_MAX_SIZE, settings.PATTERN_PNG_MAX_SIZE // 2))
+
+
+class SvgExportTest(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stroke, = batch_save_elements(self.user, [self.element_input(
+            points=zigzag(0, 20),
+            canvas_settings={'lineSize': 2, 'strokeColor': {'r': 255, 'g': 0, 'b': 0}},
+        )])
+        self.page = Page.objects.get(uid=self.page.uid)
+
+    def test_export(self):
+        version = export.get_version(self.page)
+        response = self.client.get(f'/pages/{self.page.uid}/{version}.svg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        svg = b''.join(response.streaming_content).decode()
+        self.assertTrue(svg.startswith('<svg xmlns="http://www.w3.org/2000/svg"'))
+        self.assertIn('rgb(255,0,0)', svg)
+        self.assertEqual(svg, export.get_svg(self.page))
+
+        self.assertEqual(self.client.get(f'/pages/{self.page.uid}/{"0" * 32}.svg').status_code, 404)
+
+    def test_erasers_mask_earlier_elements(self):
+        batch_save_elements(self.user, [self.element_input(tool=Tools.ERASER, points=zigzag(0, 5))])
+
+        svg = export.get_svg(Page.objects.get(uid=self.page.uid))
+        self.assertIn('<g mask="url(#erase-1)">', svg)
+        self.assertLess(svg.index('rgb(255,0,0)'), svg.index('<mask id="erase-1"'))
+
+    def test_old_versions_are_dropped(self):
+        old = export.store_svg(self.page, export.get_version(self.page))
+        batch_save_elements(self.user, [{'uid': str(self.stroke.uid), 'is_hidden': True}])
+
+        new = export.store_svg(self.page, export.get_version(self.page))
+        self.assertNotEqual(old, new)
+        self.assertFalse(old.exists())
+        self.assertNotIn('rgb(255,0,0)', new.read_text())
+
+    # Images are inlined, so a saved export does not point back at the API.
+    def test_images_are_inlined(self):
+        batch_save_elements(self.user, [self.element_input(
+            tool=Tools.IMAGE,
+            points=[],
+            dimensions={'outerMinX': 0, 'outerMinY': 0, 'outerMaxX': 40, 'outerMaxY': 30},
+            canvas_data_url=PNG_DATA_URL,
+        )])
+
+        svg = export.get_svg(Page.objects.get(uid=self.page.uid))
+        self.assertIn(f'href="{PNG_DATA_URL}"', svg)
+        self.assertNotIn('/blobs/', svg)
+
+    def test_svg_field(self):
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(MY_PAGE_FIELDS % 'svg')
+
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['myPages']['edges'][0]['node']['svg'], export.get_svg(self.page))
+        # The version came with the page; only the drawing read elements.
+        self.assertFalse(any('MAX(' in query['sql'] and 'core_page' not in query['sql'] for query in context.captured_queries))
+
+
+class FreehandTest(PageTestCase):
+    OPTIONS = {'size': 8, 'thinning': 0, 'smoothing': 0.5, 'streamline': 0, 'simulatePressure': False, 'last': True}
+
+    def test_constant_width_line(self):
+        points = [{'x': float(x), 'y': 0.0, 'pressure': 0.5} for x in range(0, 101, 5)]
+        outline = freehand.get_stroke(points, self.OPTIONS)
+
+        self.assertGreater(len(outline), 10)
+        self.assertAlmostEqual(outline[:, 1].max(), 4, delta=0.1)
+        self.assertAlmostEqual(outline[:, 1].min(), -4, delta=0.1)
+        # The round caps reach past the ends by the radius.
+        self.assertAlmostEqual(outline[:, 0].min(), -4, delta=0.5)
+        self.assertAlmostEqual(outline[:, 0].max(), 104, delta=0.5)
+
+    def test_tapered_start(self):
+        points = [{'x': float(x), 'y': 0.0, 'pressure': 0.5} for x in range(0, 101, 5)]
+        outline = freehand.get_stroke(points, {**self.OPTIONS, 'start': {'taper': 50}})
+
+        # No cap before the first point, and the stroke is narrow near it.
+        self.assertAlmostEqual(outline[:, 0].min(), 0, delta=0.5)
+        near_start = outline[outline[:, 0] < 10]
+        self.assertLess(abs(near_start[:, 1]).max(), 2)
+        self.assertAlmostEqual(outline[:, 1].max(), 4, delta=0.1)
+
+    def test_dot(self):
+        outline = freehand.get_stroke([{'x': 10.0, 'y': 10.0, 'pressure': 0.5}], self.OPTIONS)
+
+        # Like perfect-freehand, a lone point is drawn as a dot from the
+        # point to one pixel past it, with round caps of the radius.
+        self.assertGreater(len(outline), 4)
+        self.assertTrue((outline.min(axis=0) > 5.5).all())
+        self.assertTrue((outline.max(axis=0) < 15.5).all())
+        self.assertTrue((outline.max(axis=0) - outline.min(axis=0) > 8).all())
+
+    def test_svg_path(self):
+        path = freehand.svg_path(np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 10.0]]))
+
+        self.assertEqual(path, 'M 0 0 Q 0 0 5 0 10 0 10 5 10 10 5 5 Z')
+        self.assertEqual(freehand.svg_path(np.zeros((0, 2))), '')
+
+    def test_element_outlines(self):
+        points = zigzag(0, 10)
+
+        self.assertIsNone(freehand.element_outlines(points, {}))
+        self.assertIsNone(freehand.element_outlines(points, {'freehandOptions': {'size': 'big'}}))
+        self.assertIsNone(freehand.element_outlines([], {'freehandOptions': self.OPTIONS}))
+
+        stroke, path = freehand.element_outlines(points, {'freehandOptions': self.OPTIONS})
+        self.assertTrue(stroke.startswith('M ') and stroke.endswith(' Z'))
+        self.assertNotEqual(stroke, path)
+
+    def test_outlines_follow_writes(self):
+        canvas_settings = {'lineSize': 2, 'freehandOptions': self.OPTIONS}
+        pen, rectangle = batch_save_elements(self.user, [
+            self.element_input(points=zigzag(0, 10), canvas_settings=canvas_settings),
+            self.element_input(tool=Tools.RECTANGLE, points=zigzag(0, 10), canvas_settings=canvas_settings),
+        ])
+
+        pen = Element.objects.get(uid=pen.uid)
+        self.assertEqual(
+            (pen.stroke_svg_path, pen.path_svg_path),
+            freehand.element_outlines(zigzag(0, 10), canvas_settings),
+        )
+        self.assertIsNone(Element.objects.get(uid=rectangle.uid).stroke_svg_path)
+
+        patch_elements(self.user, [(pen.uid, [
+            {'op': 'replace', 'path': '/canvas_settings/freehandOptions/size', 'value': 16},
+        ])])
+        patched = Element.objects.get(uid=pen.uid)
+        self.assertEqual(
+            (patched.stroke_svg_path, patched.path_svg_path),
+            freehand.element_outlines(zigzag(0, 10), patched.canvas_settings),
+        )
+        self.assertNotEqual(patched.stroke_svg_path, pen.stroke_svg_path)
+
+
+def stroke(start, end):
+    return [{'x': float(x), 'y': float(x % 2), 'pressure': 0.5} for x in range(start, end + 1)]
+
+
+class CompactionTest(MediaTestCase):
+    def save(self, tool, points):
+        element, = batch_save_elements(self.user, [self.element_input(
+            tool=tool,
+            points=points,
+            canvas_settings={'lineSize': 2, 'strokeColor': {'r': 0, 'g': 0, 'b': 0}},
+        )])
+        return element
+
+    def setUp(self):
+        super().setUp()
+        self.far = self.save(Tools.PEN, stroke(200, 220))
+        self.under = self.save(Tools.PEN, stroke(18, 35))
+        self.erased = self.save(Tools.PEN, stroke(0, 20))
+        self.eraser = self.save(Tools.ERASER, stroke(0, 6))
+        self.after = self.save(Tools.PEN, stroke(0, 40))
+
+    def test_bakes_only_what_erasers_reach(self):
+        result = compact_page(self.page.uid)
+
+        # `under` is not erased, but is below a baked stroke, so it has to
+        # move into the base layer with it.
+        self.assertEqual(result.baked, 3)
+        self.assertEqual(
+            set(Element.objects.filter(page=self.page).values_list('uid', flat=True)),
+            {self.far.uid, self.after.uid, result.base_layer.uid},
+        )
+        page = Page.objects.get(uid=self.page.uid)
+        self.assertEqual(page.element_order, [result.base_layer.uid, self.far.uid, self.after.uid])
+        self.assertEqual(
+            set(ArchivedElement.objects.filter(reason=ArchiveReasons.BAKED).values_list('uid', flat=True)),
+            {self.under.uid, self.erased.uid, self.eraser.uid},
+        )
+
+    def test_clear_all(self):
+        clear = self.save(Tools.CLEAR_ALL, [])
+        result = compact_page(self.page.uid)
+
+        self.assertEqual(result.cleared, 6)
+        self.assertEqual(Page.objects.get(uid=self.page.uid).element_order, [])
+        self.assertIn(clear.uid, ArchivedElement.objects.filter(reason=ArchiveReasons.CLEARED).values_list('uid', flat=True))
+
+    def test_saves_of_compacted_elements_are_skipped(self):
+        compact_page(self.page.uid)
+
+        result = self.execute('''
+            mutation Save($elements: [JSONString]!) {
+              batchSaveElements(input: {elements: $elements}) { elements { uid } compactedUids }
+            }
+        ''', {'elements': [
+            json.dumps({'uid': str(self.erased.uid), 'is_hidden': True}),
+            json.dumps({'uid': str(self.after.uid), 'is_hidden': True}),
+        ]})
+
+        self.assertIsNone(result.errors)
+        payload = result.data['batchSaveElements']
+        self.assertEqual(payload['elements'], [{'uid': str(self.after.uid)}])
+        self.assertEqual(payload['compactedUids'], [str(self.erased.uid)])
+
+        with self.assertRaises(Element.DoesNotExist):
+            batch_save_elements(self.user, [{'uid': str(uuid.uuid4()), 'is_hidden': True}])
+
+    @override_settings(COMPACTION_THRESHOLD=5)
+    def test_saves_mark_pages_past_the_threshold(self):
+        self.assertFalse(Page.objects.get(uid=self.page.uid).needs_compaction)
+
+        self.save(Tools.PEN, stroke(300, 320))
+        self.assertTrue(Page.objects.get(uid=self.page.uid).needs_compaction)
+
+    @override_settings(COMPACTION_THRESHOLD=5, COMPACTION_IDLE_SECONDS=60)
+    def test_pending_pages_are_compacted_once_idle(self):
+        self.save(Tools.PEN, stroke(300, 320))
+
+        # Still being drawn on.
+        call_command('compact_pages', '--pending', stdout=io.StringIO())
+        self.assertTrue(Page.objects.get(uid=self.page.uid).needs_compaction)
+        self.assertEqual(ArchivedElement.objects.count(), 0)
+
+        Element.objects.filter(page=self.page).update(updated_at=timezone.now() - timedelta(minutes=5))
+        call_command('compact_pages', '--pending', stdout=io.StringIO())
+
+        page = Page.objects.get(uid=self.page.uid)
+        self.assertFalse(page.needs_compaction)
+        self.assertEqual(ArchivedElement.objects.filter(reason=ArchiveReasons.BAKED).count(), 3)
+
+    def test_command_archive_flag(self):
+        call_command('compact_pages', '--no-archive', stdout=io.StringIO())
+
+        self.assertEqual(ArchivedElement.objects.count(), 0)
+        self.assertFalse(Element.objects.filter(uid=self.erased.uid).exists())
+
+
+class PurgeTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old, self.older, self.recent, self.visible = batch_save_elements(self.user, [
+            self.element_input(is_hidden=True),
+            self.element_input(is_hidden=True),
+            self.element_input(is_hidden=True),
+            self.element_input(),
+        ])
+        Element.objects \
+            .filter(uid__in=[self.old.uid, self.older.uid, self.visible.uid]) \
+            .update(updated_at=timezone.now() - timedelta(days=60))
+
+    def purge(self, **kwargs):
+        return list(purge_hidden_elements(duty_cycle=1, **kwargs))
+
+    def test_purges_old_hidden_elements(self):
+        chunks = self.purge()
+
+        self.assertEqual(sum(chunk.removed for chunk in chunks), 2)
+        self.assertEqual(
+            set(Element.objects.values_list('uid', flat=True)),
+            {self.recent.uid, self.visible.uid},
+        )
+        self.assertEqual(Page.objects.get(uid=self.page.uid).element_order, [self.recent.uid, self.visible.uid])
+        archived = ArchivedElement.objects.get(uid=self.old.uid)
+        self.assertEqual(archived.reason, ArchiveReasons.HIDDEN)
+        self.assertEqual(archived.data['is_hidden'], True)
+
+    def test_chunks_resume_by_uid(self):
+        # Stopping after the first chunk, like an interrupted run.
+        first = next(purge_hidden_elements(chunk_size=1, duty_cycle=1))
+        self.assertEqual(first.removed, 1)
+        self.assertEqual(first.last_uid, min(self.old.uid, self.older.uid))
+
+        rest = self.purge(chunk_size=1, after=first.last_uid, archive=False)
+        self.assertEqual([chunk.removed for chunk in rest], [1])
+        self.assertEqual(ArchivedElement.objects.count(), 1)
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('purge_hidden_elements', '--duty-cycle', '1', '--retention-days', '0', stdout=output)
+
+        self.assertIn('Removed 3 hidden elements', output.getvalue())
+        self.assertEqual(list(Element.objects.values_list('uid', flat=True)), [self.visible.uid])
+
+    def test_rejects_bad_duty_cycle(self):
+        with self.assertRaisesMessage(Exception, 'duty_cycle'):
+            list(purge_hidden_elements(duty_cycle=0))
+
+
+class UuidTest(PageTestCase):
+    def test_uuid7_layout(self):
+        before = time.time_ns() // 1_000_000
+        key = uuid7()
+        after = time.time_ns() // 1_000_000
+
+        self.assertEqual(key.version, 7)
+        self.assertEqual(key.variant, uuid.RFC_4122)
+        self.assertTrue(before <= key.int >> 80 <= after)
+
+    def test_uuid7_is_strictly_increasing(self):
+        keys = [uuid7() for _ in range(10000)]
+
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_same_millisecond_and_clock_going_back(self):
+        with mock.patch('core.uuids.time.time_ns', return_value=1_700_000_000_000 * 1_000_000):
+            first = uuid7()
+            keys = [uuid7() for _ in range(5000)]
+
+        with mock.patch('core.uuids.time.time_ns', return_value=1_600_000_000_000 * 1_000_000):
+            earlier = uuid7()
+
+        # The sequence overflows into the next millisecond, and a clock
+        # going back keeps counting up from the last key.
+        self.assertEqual([first] + keys, sorted([first] + keys))
+        self.assertGreater(keys[-1].int >> 80, first.int >> 80)
+        self.assertGreater(earlier, keys[-1])
+
+    def test_new_rows_use_the_setting(self):
+        self.assertEqual(self.page.uid.version, 7)
+
+        with override_settings(UUID_GENERATOR='uuid.uuid4'):
+            page = Page.objects.create(owner=self.user, notebook=self.notebook)
+
+        self.assertEqual(page.uid.version, 4)
+        self.assertEqual(Page.objects.get(uid=page.uid), page)
+
+
+UPDATE_ELEMENT = '''
+mutation UpdateElement($uid: UUID!) {
+  updateElement(input: {uid: $uid, isHidden: true}) { element { uid isHidden } }
+}
+'''
+
+
+class PartitionTest(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create(username='other', email='other@fiary.app')
+        other_page = Page.objects.create(
+            owner=self.other,
+            notebook=Notebook.objects.create(owner=self.other, bookshelf=self.other.bookshelves.get()),
+        )
+        for owner, page in ((self.user, self.page), (self.other, other_page)):
+            Element.objects.bulk_create([
+                Element(owner=owner, page=page, tool=Tools.PEN, points=POINTS, min_x=0, min_y=0, max_x=20, max_y=5)
+                for _ in range(5)
+            ])
+
+        self.element = self.user.elements.first()
+
+    def partitions(self, plan):
+        names = set()
+        if plan.get('Relation Name', '').startswith(f'{Element._meta.db_table}_p'):
+            names.add(plan['Relation Name'])
+
+        for child in plan.get('Plans', []):
+            names.update(self.partitions(child))
+
+        return names
+
+    # The element partitions each captured SELECT on the element table
+    # would read.
+    def scanned_partitions(self, context):
+        scanned = []
+        with connection.cursor() as cursor:
+            for captured in context.captured_queries:
+                if not captured['sql'].startswith('SELECT') or f'FROM "{Element._meta.db_table}"' not in captured['sql']:
+                    continue
+
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {captured["sql"]}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                scanned.append(self.partitions(plan[0]['Plan']))
+
+        return scanned
+
+    def assertOnePartition(self, context):
+        scanned = self.scanned_partitions(context)
+
+        self.assertGreater(len(scanned), 0)
+        for partitions in scanned:
+            self.assertEqual(len(partitions), 1)
+
+    def test_rows_land_in_their_owners_partition(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT owner_id, tableoid::regclass::text, satisfies_hash_partition('
+                f"'{Element._meta.db_table}'::regclass, 16, substring(tableoid::regclass::text from '[0-9]+$')::int, owner_id) "
+                f'FROM {Element._meta.db_table}'
+            )
+            rows = cursor.fetchall()
+
+        self.assertEqual(len(rows), 10)
+        self.assertTrue(all(matches for owner_id, partition, matches in rows))
+        for user in (self.user, self.other):
+            self.assertEqual(len({partition for owner_id, partition, matches in rows if owner_id == user.pk}), 1)
+
+    def test_owner_scoped_queries_read_one_partition(self):
+        with CaptureQueriesContext(connection) as context:
+            self.execute(ELEMENTS_IN_VIEWPORT, {'pageUid': str(self.page.uid)})
+        self.assertOnePartition(context)
+
+        with CaptureQueriesContext(connection) as context:
+            list(export.generate_svg(self.page))
+        self.assertOnePartition(context)
+
+        with CaptureQueriesContext(connection) as context:
+            raster.render_tile(self.page, settings.RASTER_BASE_ZOOM, 0, 0)
+        self.assertOnePartition(context)
+
+        with CaptureQueriesContext(connection) as context:
+            compaction.is_idle(self.page)
+        self.assertOnePartition(context)
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.execute(UPDATE_ELEMENT, {'uid': str(self.element.uid)})
+        self.assertIsNone(result.errors)
+        self.assertTrue(result.data['updateElement']['element']['isHidden'])
+        self.assertOnePartition(context)
+
+    def test_purge_reads_every_partition(self):
+        self.user.elements.update(is_hidden=True, updated_at=timezone.now() - timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as context:
+            next(purge_hidden_elements(retention=timedelta(0), chunk_size=2, duty_cycle=1, archive=False))
+
+        self.assertEqual(len(self.scanned_partitions(context)[0]), 16)
+
+    def test_update_element_is_scoped_to_the_owner(self):
+        result = self.execute(UPDATE_ELEMENT, {'uid': str(self.element.uid)}, user=self.other)
+
+        self.assertIsNotNone(result.errors)
+        self.element.refresh_from_db()
+        self.assertFalse(self.element.is_hidden)
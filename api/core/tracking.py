@@ -0,0 +1,72 @@
+# JSON and array values are copied one level deep, which is cheap even for
+# long point lists. Reassigning a column or changing its top-level items
+# (appending, setting a key) marks it dirty; edits nested deeper, such as
+# `transform['translate'][0] = 5`, need the column reassigned or named in
+# `update_fields`.
+def _snapshot_value(value):
+    if isinstance(value, dict):
+        return dict(value)
+
+    if isinstance(value, list):
+        return list(value)
+
+    return value
+
+
+# Remembers the column values an instance was loaded with, so that a bare
+# `save()` only writes the columns that actually changed (plus `updated_at`).
+# Unsaved instances and explicit `update_fields` are saved as usual.
+class Tracked:
+    always_update_fields = ['updated_at']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot()
+        return instance
+
+    def snapshot(self, fields=None):
+        if not hasattr(self, '_snapshot'):
+            self._snapshot = {}
+
+        for field in self._meta.concrete_fields:
+            if fields is not None and field.name not in fields and field.attname not in fields:
+                continue
+
+            if field.attname in self.__dict__:
+                self._snapshot[field.attname] = _snapshot_value(self.__dict__[field.attname])
+
+    def get_dirty_fields(self):
+        if self._state.adding or not hasattr(self, '_snapshot'):
+            return [field.name for field in self._meta.concrete_fields]
+
+        missing = object()
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and self._snapshot.get(field.attname, missing) != self.__dict__[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        is_tracked = (
+            not self._state.adding
+            and hasattr(self, '_snapshot')
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert', False)
+        )
+        if is_tracked:
+            dirty = set(self.get_dirty_fields())
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and (field.name in dirty or field.name in self.always_update_fields)
+            ]
+
+        super().save(*args, **kwargs)
+        self.snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.snapshot(fields)
@@ -1,3 +1,100 @@
-from django.shortcuts import render
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from . import blobs, export, patterns, raster
+from .models import Page
+
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _immutable(request, etag, get_response):
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = get_response()
+
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def _immutable_file(request, path, etag):
+    return _immutable(request, etag, lambda: FileResponse(open(path, 'rb')))
+
+
+@require_GET
+def blob(request, key):
+    if not blobs.is_key(key):
+        raise Http404()
+
+    path = blobs.blob_path(key)
+    if not path.exists():
+        raise Http404()
+
+    return _immutable_file(request, path, f'"{key}"')
+
+
+# Tile URLs carry the page version, so a cached tile never changes; a tile
+# is only rendered when its version is still the page's current one.
+@require_GET
+def page_tile(request, uid, version, z, x, y):
+    z, x, y = int(z), int(x), int(y)
+    if not raster.is_zoom(z):
+        raise Http404()
+
+    path = raster.tile_path(uid, version, z, x, y)
+    if not path.exists():
+        page = Page.objects \
+            .select_related('paper_swatch', 'pattern_swatch') \
+            .filter(uid=uid) \
+            .first()
+        if page is None or raster.get_version(page) != version:
+            raise Http404()
+
+        path = raster.store_tile(page, version, z, x, y)
+
+    return _immutable_file(request, path, f'"{version}-{z}-{x}-{y}"')
+
+
+# Like page tiles, an export URL carries the page version it was made from.
+@require_GET
+def page_svg(request, uid, version):
+    path = export.export_path(uid, version)
+    if not path.exists():
+        page = Page.objects \
+            .select_related('paper_swatch', 'pattern_swatch') \
+            .filter(uid=uid) \
+            .first()
+        if page is None or export.get_version(page) != version:
+            raise Http404()
+
+        path = export.store_svg(page, version)
+
+    return _immutable(
+        request,
+        f'"{version}"',
+        lambda: FileResponse(open(path, 'rb'), content_type='image/svg+xml'),
+    )
+
+
+PATTERN_CONTENT_TYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+
+# Pattern URLs spell out everything the tile depends on, so any page with
+# the same pattern, options and colors shares one URL and one cached tile.
+@require_GET
+def pattern(request, spec, extension):
+    data = patterns.get_pattern(spec, extension)
+    if data is None:
+        raise Http404()
+
+    etag = f'"{patterns.get_key(patterns.parse(spec))}.{extension}"'
+    return _immutable(
+        request,
+        etag,
+        lambda: HttpResponse(data, content_type=PATTERN_CONTENT_TYPES[extension]),
+    )
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.4 on 2026-10-18 12:31
+
+import core.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_rename_id_user_uid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="uid",
+            field=models.UUIDField(
+                default=core.uuids.new_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -1,14 +1,14 @@
-import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.dispatch import receiver
 from core.choices import PaletteTypes
 
 from core.models import Bookshelf, Notebook, Page, PaletteCollection, Room
+from core.uuids import new_uuid
 
 
 class User(AbstractUser):
-    uid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uid = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     email = models.EmailField(
         blank=False,
         max_length=254,
@@ -24,8 +24,7 @@ def save_from_user(sender, instance, created, **kwargs):
     if not created:
         return
 
-    room = Room.objects.create(owner=instance)
-    room.save()
+    Room.objects.create(owner=instance)
 
     paletteCollection = PaletteCollection.objects.create(owner=instance)
     paletteCollection.save()
@@ -2,11 +2,12 @@ import graphene
 from graphene_django.types import DjangoObjectType
 import graphql_jwt
 from social_django.utils import load_strategy, load_backend
+from api.optimizer import Optimized
 from api.permissions import IsAuthenticated
 from .models import User
 
 
-class UserNode(IsAuthenticated, DjangoObjectType):
+class UserNode(Optimized, IsAuthenticated, DjangoObjectType):
     class Meta():
         model = User
         filter_fields = ["uid", "username"]
@@ -69,6 +69,8 @@ export default class BaseElement {
 
     if (this.canvasDataUrl) {
       const image = new Image();
+      // Keeps the page canvas this is drawn on exportable.
+      image.crossOrigin = "anonymous";
       image.onload = () => {
         this.cachedCanvasImage = image;
       };
@@ -415,6 +415,9 @@ export const useCoreStore = defineStore("core", () => {
       }
 
       const image = new Image();
+      // Blob URLs are on the API origin; without CORS the image would taint
+      // the canvas and break toDataURL().
+      image.crossOrigin = "anonymous";
       image.onload = () => {
         pages.value[page.uid].canvasImage = image;
         resolve(pages.value[page.uid]);